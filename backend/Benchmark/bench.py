@@ -0,0 +1,269 @@
+"""
+Microbenchmark cho các đường xử lý chạy nhiều nhất của backend, dùng MongoDB/MQTT giả lập
+trong bộ nhớ (Benchmark.stand_ins).
+
+Chạy từ thư mục backend:
+
+    python -m Benchmark.bench --json bench.json
+    python -m Benchmark.bench --baseline bench.json   # so sánh, exit code 1 nếu có regression
+
+Mỗi benchmark đo thời gian từng lần gọi (p50/p95/p99) và bộ nhớ cấp phát đỉnh mỗi lần gọi
+(tracemalloc, đo trong một lượt riêng để không làm sai lệch thời gian).
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from Benchmark.stand_ins import InMemoryCollection, install_mqtt_stand_in
+from Simulator.load_report import percentile
+
+BENCH_USERNAME = "bench-home"
+BENCH_KEY = "bench-key"
+
+
+class Benchmark:
+    """Một benchmark: `run` là coroutine function, `setup` (không tính giờ) chạy trước mỗi lần gọi."""
+
+    def __init__(self, name: str, run, setup=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+
+
+async def _timed(benchmark: Benchmark, iterations: int) -> list:
+    timings = []
+    # Như timeit: tắt GC khi đo để các lần thu gom ngẫu nhiên không làm nhiễu kết quả
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(iterations):
+            if benchmark.setup is not None:
+                benchmark.setup()
+            started = time.perf_counter_ns()
+            await benchmark.run()
+            timings.append(time.perf_counter_ns() - started)
+    finally:
+        gc.enable()
+    return timings
+
+
+async def _allocations(benchmark: Benchmark, iterations: int) -> list:
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            if benchmark.setup is not None:
+                benchmark.setup()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await benchmark.run()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+async def measure(benchmark: Benchmark, iterations: int, warmup: int, alloc_iterations: int) -> dict:
+    await _timed(benchmark, warmup)
+    timings = [ns / 1000 for ns in await _timed(benchmark, iterations)]
+    peaks = await _allocations(benchmark, alloc_iterations)
+    mean = sum(timings) / len(timings)
+    return {
+        "iterations": iterations,
+        "mean_us": round(mean, 2),
+        "p50_us": round(percentile(timings, 50), 2),
+        "p95_us": round(percentile(timings, 95), 2),
+        "p99_us": round(percentile(timings, 99), 2),
+        "ops_per_s": round(1e6 / mean, 1),
+        "alloc_peak_kb": round(percentile(peaks, 50) / 1024, 2),
+    }
+
+
+async def build_fixture(leds: int, fans: int, users: int, logs_per_user: int):
+    """Tạo phiên với thiết bị giả lập và các DAL trên collection trong bộ nhớ."""
+    install_mqtt_stand_in()
+    import app_state
+    from ws_hub import hub
+    from Device import fan_controller, led_controller, sensor_controller
+    from MongoDB.User.user_dal import UserDAL
+    from MongoDB.UserLog.user_log_dal import UserLogDAL
+
+    hub.bind_loop(asyncio.get_running_loop())
+    session = app_state.UserSession(1, BENCH_USERNAME)
+    for n in range(1, leds + 1):
+        session.led_devices[f"dadn-led-{n}"] = led_controller.LEDDevice(
+            f"dadn-led-{n}", f"Đèn {n}", "0", BENCH_USERNAME, BENCH_KEY
+        )
+    for n in range(1, fans + 1):
+        session.fan_devices[f"dadn-fan-{n}"] = fan_controller.FanDevice(
+            f"dadn-fan-{n}", f"Quạt {n}", 50, BENCH_USERNAME, BENCH_KEY
+        )
+    for feed_id in ("dadn-temp", "dadn-light", "dadn-humi"):
+        session.sensor_devices[feed_id] = sensor_controller.SensorDevice(
+            feed_id, sensor_controller.get_sensor_description(feed_id), 30.5,
+            sensor_controller.get_sensor_unit(feed_id), BENCH_USERNAME, BENCH_KEY
+        )
+
+    user_dal = UserDAL(InMemoryCollection("user", unique=("email", "no")))
+    for no in range(1, users + 1):
+        await user_dal.create_user(
+            name=f"User {no}", email=f"user{no}@example.com", password="secret",
+            username_adafruit=BENCH_USERNAME, key_adafruit=BENCH_KEY, no=no,
+        )
+
+    user_log_dal = UserLogDAL(InMemoryCollection("user_log"))
+    started = datetime.utcnow() - timedelta(days=1)
+    for i in range(logs_per_user):
+        for no in range(1, min(users, 10) + 1):
+            await user_log_dal.create_log(
+                user_no=no, activity="Bật đèn", status="Success",
+                device_name=f"dadn-led-{i % max(leds, 1) + 1}", timestamp=started + timedelta(seconds=i),
+            )
+    return session, user_dal, user_log_dal
+
+
+async def build_benchmarks(session, user_dal, user_log_dal) -> list:
+    import main
+    from Device import fan_controller, led_controller, sensor_controller
+
+    led_id = next(iter(session.led_devices))
+    fan_id = next(iter(session.fan_devices))
+
+    async def control_led():
+        status = "1" if session.led_devices[led_id].status == "0" else "0"
+        await led_controller.control_led(led_id, status, confirm=False, session=session)
+
+    fan_actions = {"increase": "decrease", "decrease": "increase"}
+    fan_state = {"action": "increase"}
+
+    async def control_fan():
+        fan_state["action"] = fan_actions[fan_state["action"]]
+        await fan_controller.control_fan(fan_id, fan_state["action"], confirm=False, session=session)
+
+    async def get_sensor_value():
+        await sensor_controller.get_sensor_value("dadn-temp", session=session)
+
+    async def ws_snapshot():
+        # websocket.send_json serialize bằng json.dumps
+        json.dumps(main.build_status_snapshot(session))
+
+    # Như GET /api/logs: trang đầu, rồi trang sau theo cursor (keyset) của trang đầu
+    _, next_cursor = await user_log_dal.find_logs(limit=100, user_no=1)
+
+    async def find_logs_first_page():
+        await user_log_dal.find_logs(limit=100, user_no=1)
+
+    async def find_logs_next_page():
+        await user_log_dal.find_logs(limit=100, user_no=1, cursor=next_cursor)
+
+    email = "user1@example.com"
+
+    async def get_user_by_email():
+        await user_dal.get_user_by_email(email)
+
+    return [
+        Benchmark("control_led", control_led),
+        Benchmark("control_fan", control_fan),
+        Benchmark("get_sensor_value", get_sensor_value),
+        Benchmark("ws_snapshot", ws_snapshot),
+        Benchmark("user_log.find_logs[first]", find_logs_first_page),
+        Benchmark("user_log.find_logs[cursor]", find_logs_next_page),
+        Benchmark("user.get_user_by_email[cached]", get_user_by_email),
+        Benchmark("user.get_user_by_email[uncached]", get_user_by_email, setup=lambda: user_dal.cache.invalidate(1)),
+    ]
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_us: float = 1.0) -> list:
+    """So sánh p50 và bộ nhớ cấp phát với baseline; trả về danh sách thay đổi của từng benchmark."""
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        time_ratio = current["p50_us"] / previous["p50_us"] if previous["p50_us"] else 1.0
+        alloc_ratio = current["alloc_peak_kb"] / previous["alloc_peak_kb"] if previous["alloc_peak_kb"] else 1.0
+        # Chênh lệch dưới min_delta_us hoặc 1 KB coi là nhiễu (benchmark rất ngắn dao động mạnh theo %)
+        time_regressed = time_ratio > 1 + threshold and current["p50_us"] - previous["p50_us"] > min_delta_us
+        alloc_regressed = alloc_ratio > 1 + threshold and current["alloc_peak_kb"] - previous["alloc_peak_kb"] > 1
+        rows.append({
+            "name": name,
+            "p50_change": round(time_ratio - 1, 3),
+            "alloc_change": round(alloc_ratio - 1, 3),
+            "regression": time_regressed or alloc_regressed,
+        })
+    return rows
+
+
+def format_results(results: dict, comparison: list = None) -> str:
+    changes = {row["name"]: row for row in comparison or []}
+    lines = [f"{'benchmark':34} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'ops/s':>11} {'alloc KB':>9}"]
+    for name, result in results.items():
+        line = (
+            f"{name:34} {result['p50_us']:>10} {result['p95_us']:>10} {result['p99_us']:>10} "
+            f"{result['ops_per_s']:>11} {result['alloc_peak_kb']:>9}"
+        )
+        row = changes.get(name)
+        if row is not None:
+            line += f"  p50 {row['p50_change']:+.1%} alloc {row['alloc_change']:+.1%}"
+            if row["regression"]:
+                line += "  REGRESSION"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+async def run(args) -> dict:
+    session, user_dal, user_log_dal = await build_fixture(args.leds, args.fans, args.users, args.logs_per_user)
+    results = {}
+    for benchmark in await build_benchmarks(session, user_dal, user_log_dal):
+        if args.filter and args.filter not in benchmark.name:
+            continue
+        results[benchmark.name] = await measure(benchmark, args.iterations, args.warmup, args.alloc_iterations)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": datetime.utcnow().isoformat(),
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark REST/DAL với MongoDB và MQTT giả lập.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--alloc-iterations", type=int, default=50)
+    parser.add_argument("--filter", help="chỉ chạy benchmark có tên chứa chuỗi này")
+    parser.add_argument("--leds", type=int, default=4)
+    parser.add_argument("--fans", type=int, default=2)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--logs-per-user", type=int, default=200)
+    parser.add_argument("--json", help="ghi kết quả JSON ra file (dùng làm baseline)")
+    parser.add_argument("--baseline", help="file JSON kết quả trước đó để so sánh")
+    parser.add_argument("--threshold", type=float, default=0.25, help="mức tăng tối đa được chấp nhận (0.25 = 25%%)")
+    parser.add_argument("--min-delta-us", type=float, default=1.0, help="mức tăng p50 tuyệt đối tối thiểu để coi là regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(report["results"], json.load(f)["results"], args.threshold, args.min_delta_us)
+        report["comparison"] = comparison
+    print(format_results(report["results"], comparison))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if comparison and any(row["regression"] for row in comparison):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Load test end-to-end: nhiều client WebSocket và REST đồng thời vào một backend.
+
+Mặc định harness tự chạy broker MQTT + thiết bị giả lập (Simulator) trong process này và khởi
+động backend với MongoDB trong bộ nhớ (Benchmark.stand_in_server) ở một process con, rồi:
+
+- đăng nhập mỗi home một lần, mở `--ws-clients` kết nối /ws chia đều cho các home;
+- gửi request REST theo phân phối Poisson với tổng `--rps`, tỉ lệ theo `--mix`
+  (login, control = điều khiển LED/quạt, logs = liệt kê log, sensor = đọc cảm biến);
+- đo latency từng loại request, độ trễ message cảm biến từ lúc thiết bị publish tới lúc client
+  WebSocket nhận (giá trị cảm biến là thời điểm publish), số kết nối bị rớt và RSS của backend.
+
+    python -m Benchmark.load_client --homes 20 --ws-clients 2000 --rps 200 --duration 60
+
+Với `--url` harness dùng backend đang chạy sẵn (phải trỏ tới broker in ra khi khởi động).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from Benchmark.stand_in_server import STAND_IN_PASSWORD, raise_file_limit, stand_in_email
+from Simulator.broker import LocalBroker
+from Simulator.devices import DeviceSimulator
+from Simulator.load_report import percentile
+
+DEFAULT_MIX = "login=1,control=6,logs=2,sensor=4"
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"login", "control", "logs", "sensor"}
+    if unknown:
+        raise ValueError(f"Loại request không hỗ trợ: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def summarize(values: list) -> dict:
+    return {f"p{p}": None if not values else round(percentile(values, p), 2) for p in (50, 95, 99)}
+
+
+def process_rss_mb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+class LoadStats:
+    def __init__(self):
+        self.requests = {}  # loại request -> list latency ms
+        self.errors = {}
+        self.ws_connected = 0
+        self.ws_opened = 0
+        self.ws_failed = 0  # không kết nối được
+        self.ws_dropped = 0  # bị đóng trước khi kết thúc test
+        self.ws_connect_ms = []
+        self.ws_messages = 0
+        self.ws_lag_ms = []
+        self.ws_resnapshots = 0
+        self.timeline = []
+
+    def record_request(self, kind: str, latency_ms: float, ok: bool):
+        if ok:
+            self.requests.setdefault(kind, []).append(latency_ms)
+        else:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def record_message(self, message: dict, received_at: float):
+        self.ws_messages += 1
+        if message.get("type") == "snapshot":
+            self.ws_resnapshots += 1
+            return
+        for value in message.get("sensor_values", {}).values():
+            try:
+                self.ws_lag_ms.append((received_at - float(value)) * 1000)
+            except (TypeError, ValueError):
+                pass
+
+
+class LoadGenerator:
+    def __init__(self, args, base_url: str, stats: LoadStats):
+        self.args = args
+        self.base_url = base_url.rstrip("/")
+        self.ws_url = self.base_url.replace("http", "ws", 1) + "/ws"
+        self.stats = stats
+        self.mix = parse_mix(args.mix)
+        self.stopping = False
+        self.http = None
+        self.ws_http = None
+
+    async def _request(self, kind: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            async with self.http.request(method, self.base_url + path, **kwargs) as response:
+                await response.read()
+                ok = response.status < 400
+        except Exception:
+            ok = False
+        self.stats.record_request(kind, (time.perf_counter() - started) * 1000, ok)
+        return ok
+
+    async def login(self, user_no: int):
+        return await self._request(
+            "login", "POST", "/init-adafruit-connection",
+            json={"email": stand_in_email(user_no), "password": STAND_IN_PASSWORD},
+        )
+
+    async def _random_request(self):
+        user_no = random.randint(1, self.args.homes)
+        kind = random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if kind == "login":
+            await self.login(user_no)
+        elif kind == "control":
+            if random.random() < 0.5:
+                path = f"/led/dadn-led-{random.randint(1, max(1, self.args.leds))}/{random.choice('01')}"
+            else:
+                path = f"/fan/dadn-fan-{random.randint(1, max(1, self.args.fans))}/{random.choice(['increase', 'decrease'])}"
+            await self._request("control", "POST", path, params={"user_no": user_no})
+        elif kind == "logs":
+            await self._request("logs", "GET", f"/api/logs/user/{user_no}", params={"limit": 50})
+        else:
+            feed = random.choice(["dadn-temp", "dadn-light", "dadn-humi"])
+            await self._request("sensor", "GET", f"/sensor/{feed}", params={"user_no": user_no})
+
+    async def rest_load(self, duration: float):
+        """Gửi request theo tiến trình Poisson (open loop) để không che giấu độ trễ khi server chậm."""
+        tasks = set()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            await asyncio.sleep(random.expovariate(self.args.rps))
+            task = asyncio.create_task(self._random_request())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def websocket_client(self, user_no: int, semaphore: asyncio.Semaphore, ready: asyncio.Event):
+        started = time.perf_counter()
+        try:
+            async with semaphore:
+                websocket = await self.ws_http.ws_connect(f"{self.ws_url}?user_no={user_no}&deltas=1", heartbeat=None)
+        except Exception:
+            self.stats.ws_failed += 1
+            return
+        self.stats.ws_connect_ms.append((time.perf_counter() - started) * 1000)
+        self.stats.ws_opened += 1
+        self.stats.ws_connected += 1
+        try:
+            first = True
+            async for msg in websocket:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    break
+                if first:
+                    first = False  # snapshot đầu tiên không tính là gửi lại
+                    continue
+                if ready.is_set():
+                    self.stats.record_message(json.loads(msg.data), time.time())
+        except Exception:
+            pass
+        finally:
+            self.stats.ws_connected -= 1
+            if not self.stopping:
+                self.stats.ws_dropped += 1
+            await websocket.close()
+
+    async def sample(self, pid, interval: float, started: float):
+        while True:
+            self.stats.timeline.append({
+                "t": round(time.monotonic() - started, 1),
+                "rss_mb": process_rss_mb(pid) if pid else None,
+                "ws_connected": self.stats.ws_connected,
+                "ws_messages": self.stats.ws_messages,
+                "requests": sum(len(values) for values in self.stats.requests.values()),
+            })
+            await asyncio.sleep(interval)
+
+    async def run(self, pid=None):
+        connector = aiohttp.TCPConnector(limit=self.args.http_connections)
+        self.http = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+        # WebSocket giữ kết nối suốt test nên dùng session riêng, không giới hạn số kết nối
+        self.ws_http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0), timeout=aiohttp.ClientTimeout(sock_connect=30)
+        )
+        started = time.monotonic()
+        sampler = asyncio.create_task(self.sample(pid, self.args.sample_interval, started))
+        ready = asyncio.Event()
+        try:
+            # Mỗi home cần một phiên đăng nhập trước khi mở WebSocket
+            await asyncio.gather(*(self.login(no) for no in range(1, self.args.homes + 1)))
+            self.stats.requests.pop("login", None)
+            semaphore = asyncio.Semaphore(self.args.connect_concurrency)
+            clients = [
+                asyncio.create_task(self.websocket_client(i % self.args.homes + 1, semaphore, ready))
+                for i in range(self.args.ws_clients)
+            ]
+            while self.stats.ws_opened + self.stats.ws_failed < self.args.ws_clients:
+                await asyncio.sleep(0.1)
+            ready.set()
+            await self.rest_load(self.args.duration)
+            self.stopping = True
+            for client in clients:
+                client.cancel()
+            await asyncio.gather(*clients, return_exceptions=True)
+        finally:
+            self.stopping = True
+            sampler.cancel()
+            await self.http.close()
+            await self.ws_http.close()
+
+
+def start_server(args, broker: LocalBroker):
+    env = dict(
+        os.environ,
+        MQTT_BROKER_HOST=broker.host,
+        MQTT_BROKER_PORT=str(broker.mqtt_port),
+        MQTT_BROKER_SECURE="0",
+        ADAFRUIT_API_URL=broker.api_url,
+    )
+    command = [
+        sys.executable, "-m", "Benchmark.stand_in_server",
+        "--port", str(args.port), "--users", str(args.homes),
+    ]
+    # Backend in log cho từng message MQTT; bỏ đi để không ghi ra terminal
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+
+
+async def wait_ready(base_url: str, server, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as http:
+        while time.monotonic() < deadline:
+            if server is not None and server.poll() is not None:
+                raise RuntimeError(f"Backend đã dừng (exit code {server.returncode})")
+            try:
+                async with http.get(f"{base_url}/mqtt/publish-stats") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError("Backend không sẵn sàng")
+
+
+async def run_load(args) -> dict:
+    broker = LocalBroker(mqtt_port=args.mqtt_port, http_port=args.http_port)
+    await broker.start()
+    simulator = DeviceSimulator(broker, leds=args.leds, fans=args.fans, rate=args.rate, timestamp_values=True)
+    for _ in range(args.homes):
+        simulator.add_home()
+    simulator.start()
+    server = None
+    if args.url:
+        base_url = args.url
+        print(f"MQTT_BROKER_HOST={broker.host} MQTT_BROKER_PORT={broker.mqtt_port} MQTT_BROKER_SECURE=0 "
+              f"ADAFRUIT_API_URL={broker.api_url}", file=sys.stderr)
+    else:
+        server = start_server(args, broker)
+        base_url = f"http://127.0.0.1:{args.port}"
+    stats = LoadStats()
+    try:
+        await wait_ready(base_url, server)
+        await LoadGenerator(args, base_url, stats).run(server.pid if server else None)
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        await simulator.stop()
+        await broker.stop()
+
+    rss = [point["rss_mb"] for point in stats.timeline if point["rss_mb"] is not None]
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "verbose")},
+        "requests": {
+            kind: {
+                "count": len(stats.requests.get(kind, [])),
+                "errors": stats.errors.get(kind, 0),
+                **summarize(stats.requests.get(kind, [])),
+            }
+            for kind in sorted(set(stats.requests) | set(stats.errors))
+        },
+        "websocket": {
+            "opened": stats.ws_opened,
+            "failed": stats.ws_failed,
+            "dropped": stats.ws_dropped,
+            "connect_ms": summarize(stats.ws_connect_ms),
+            "messages": stats.ws_messages,
+            "resnapshots": stats.ws_resnapshots,
+            "lag_ms": summarize(stats.ws_lag_ms),
+        },
+        "server": {"rss_mb_start": rss[0] if rss else None, "rss_mb_max": max(rss) if rss else None},
+        "timeline": stats.timeline,
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'request':10} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for kind, row in report["requests"].items():
+        lines.append(
+            f"{kind:10} {row['count']:>7} {row['errors']:>7} {str(row['p50']):>9} {str(row['p95']):>9} {str(row['p99']):>9}"
+        )
+    ws = report["websocket"]
+    lines.append(
+        f"websocket: opened={ws['opened']} failed={ws['failed']} dropped={ws['dropped']} "
+        f"messages={ws['messages']} resnapshots={ws['resnapshots']}"
+    )
+    lines.append(f"  connect ms: {ws['connect_ms']}")
+    lines.append(f"  sensor lag ms: {ws['lag_ms']}")
+    server = report["server"]
+    lines.append(f"server RSS MB: start={server['rss_mb_start']} max={server['rss_mb_max']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test WebSocket + REST cho backend với dịch vụ giả lập.")
+    parser.add_argument("--homes", type=int, default=10)
+    parser.add_argument("--leds", type=int, default=2)
+    parser.add_argument("--fans", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=1.0, help="message/giây cho mỗi feed giả lập")
+    parser.add_argument("--ws-clients", type=int, default=500)
+    parser.add_argument("--connect-concurrency", type=int, default=100, help="số WebSocket mở đồng thời")
+    parser.add_argument("--rps", type=float, default=50, help="tổng số request REST mỗi giây")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"tỉ lệ các loại request (mặc định {DEFAULT_MIX})")
+    parser.add_argument("--http-connections", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8765, help="port của backend được khởi động")
+    parser.add_argument("--mqtt-port", type=int, default=0)
+    parser.add_argument("--http-port", type=int, default=0)
+    parser.add_argument("--url", help="dùng backend đang chạy, ví dụ http://localhost:8000")
+    parser.add_argument("--json", help="ghi báo cáo JSON (kèm timeline RSS) ra file")
+    parser.add_argument("--verbose", action="store_true", help="hiện stderr của backend")
+    args = parser.parse_args()
+    parse_mix(args.mix)
+    raise_file_limit()
+
+    report = asyncio.run(run_load(args))
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
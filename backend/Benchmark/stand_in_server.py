@@ -0,0 +1,94 @@
+"""
+Chạy backend (main.app) với MongoDB trong bộ nhớ, dùng cho load test.
+
+MQTT và danh sách feed lấy theo biến môi trường như bình thường (MQTT_BROKER_HOST/PORT/SECURE,
+ADAFRUIT_API_URL), thường trỏ tới broker của Simulator. User `user{i}@example.com` (mật khẩu
+"secret", i = 1..--users) được tạo sẵn với tài khoản Adafruit `sim-home-{i}`.
+
+    python -m Benchmark.stand_in_server --port 8000 --users 10
+"""
+import argparse
+import logging
+import os
+import resource
+
+STAND_IN_PASSWORD = "secret"
+
+
+def stand_in_email(no: int) -> str:
+    return f"user{no}@example.com"
+
+
+def stand_in_username(no: int) -> str:
+    return f"sim-home-{no}"
+
+
+def raise_file_limit():
+    """Nâng giới hạn file descriptor lên mức tối đa cho phép (mỗi WebSocket dùng một fd)."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def make_init_db(users: int, logs_per_user: int, max_docs: int):
+    async def init_stand_in_db():
+        """Thay init_db: tạo các DAL trên collection trong bộ nhớ, không có client MongoDB."""
+        from datetime import datetime, timedelta
+        from MongoDB import server_mongo
+        from MongoDB.User.user_dal import UserDAL
+        from MongoDB.UserLog.user_log_dal import UserLogDAL
+        from MongoDB.SensorReading.sensor_reading_dal import SensorReadingDAL
+        from MongoDB.Scene.scene_dal import SceneDAL
+        from Benchmark.stand_ins import InMemoryCollection
+
+        user_dal = UserDAL(InMemoryCollection("user", unique=("email", "no")), InMemoryCollection("counters"))
+        for no in range(1, users + 1):
+            await user_dal.create_user(
+                name=f"User {no}", email=stand_in_email(no), password=STAND_IN_PASSWORD,
+                username_adafruit=stand_in_username(no), key_adafruit="sim-key", no=no,
+            )
+        await user_dal.init_counter()
+
+        user_log_dal = UserLogDAL(InMemoryCollection("user_log", max_docs=max_docs))
+        started = datetime.utcnow() - timedelta(days=1)
+        for no in range(1, users + 1):
+            for i in range(logs_per_user):
+                await user_log_dal.create_log(
+                    user_no=no, activity="Bật đèn", status="Success",
+                    device_name="dadn-led-1", timestamp=started + timedelta(seconds=i),
+                )
+
+        server_mongo.user_dal = user_dal
+        server_mongo.user_log_dal = user_log_dal
+        server_mongo.sensor_reading_dal = SensorReadingDAL(InMemoryCollection("sensor_reading", max_docs=max_docs))
+        server_mongo.scene_dal = SceneDAL(InMemoryCollection("scene"))
+        return None
+
+    return init_stand_in_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy backend với MongoDB giả lập trong bộ nhớ.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--logs-per-user", type=int, default=200)
+    parser.add_argument("--max-docs", type=int, default=50000, help="số document tối đa của user_log/sensor_reading")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    raise_file_limit()
+    # Broker local không có quota như Adafruit IO; đặt trước khi import các module backend
+    os.environ.setdefault("ADAFRUIT_PUBLISH_RATE", "1000")
+    os.environ.setdefault("ADAFRUIT_PUBLISH_BURST", "1000")
+
+    import uvicorn
+    import main as backend
+
+    backend.init_db = make_init_db(args.users, args.logs_per_user, args.max_docs)
+    logging.getLogger().setLevel(args.log_level.upper())
+    uvicorn.run(backend.app, host=args.host, port=args.port, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Stand-in trong bộ nhớ cho MongoDB (collection kiểu Motor) và kết nối MQTT, dùng cho benchmark
+và load test mà không cần MongoDB/Adafruit IO thật.
+
+Chỉ hỗ trợ tập con API mà các DAL đang dùng: find (sort/skip/limit/batch_size/to_list/async for),
+find_one, insert_one/insert_many, update_one, find_one_and_update, delete_one, count_documents;
+filter gồm so sánh bằng, $lt/$lte/$gt/$gte/$ne/$in/$exists, $or/$and; field có thể là đường dẫn
+dạng "meta.feed".
+"""
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import mqtt_service
+from publish_queue import PublishResult, TokenBucket
+
+_MISSING = object()
+
+_OPERATORS = {
+    "$lt": lambda value, arg: value is not _MISSING and value < arg,
+    "$lte": lambda value, arg: value is not _MISSING and value <= arg,
+    "$gt": lambda value, arg: value is not _MISSING and value > arg,
+    "$gte": lambda value, arg: value is not _MISSING and value >= arg,
+    "$ne": lambda value, arg: value != arg,
+    "$in": lambda value, arg: value in arg,
+    "$exists": lambda value, arg: (value is not _MISSING) == bool(arg),
+}
+
+
+def _get(doc: dict, field: str):
+    value = doc
+    for part in field.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif field == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict) and condition and next(iter(condition)).startswith("$"):
+            value = _get(doc, field)
+            if not all(_OPERATORS[op](value, arg) for op, arg in condition.items()):
+                return False
+        elif _get(doc, field) != condition:
+            return False
+    return True
+
+
+def _sort_spec(key_or_list, direction=None) -> list:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    return list(key_or_list)
+
+
+def _sorted(docs: list, spec: list) -> list:
+    # Sắp xếp ổn định theo từng khóa, từ khóa cuối lên khóa đầu
+    for field, direction in reversed(spec):
+        docs = sorted(docs, key=lambda doc: doc.get(field), reverse=direction < 0)
+    return docs
+
+
+def _project(doc: dict, projection) -> dict:
+    if projection is None:
+        return dict(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    included = [field for field, flag in projection.items() if flag]
+    if not included:
+        return {key: value for key, value in doc.items() if projection.get(key, 1)}
+    fields = set(included)
+    if projection.get("_id", 1):
+        fields.add("_id")
+    return {key: value for key, value in doc.items() if key in fields}
+
+
+def _apply_update(doc: dict, update: dict):
+    for op, fields in update.items():
+        for field, value in fields.items():
+            if op == "$set":
+                doc[field] = value
+            elif op == "$setOnInsert":
+                pass  # đã áp dụng khi upsert
+            elif op == "$inc":
+                doc[field] = doc.get(field, 0) + value
+            elif op == "$max":
+                doc[field] = value if field not in doc else max(doc[field], value)
+            elif op == "$unset":
+                doc.pop(field, None)
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported by the stand-in")
+
+
+class _Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class InMemoryCursor:
+    def __init__(self, collection: "InMemoryCollection", query: dict, projection=None):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+        self._docs = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, n: int):
+        self._skip = n
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def batch_size(self, n: int):
+        return self
+
+    def _evaluate(self) -> list:
+        docs = [doc for doc in self._collection._docs.values() if matches(doc, self._query)]
+        if self._sort:
+            docs = _sorted(docs, self._sort)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [_project(doc, self._projection) for doc in docs]
+
+    async def to_list(self, length=None):
+        docs = self._evaluate()
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        self._docs = iter(self._evaluate())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class InMemoryCollection:
+    """Collection MongoDB trong bộ nhớ với API async giống Motor (tham số session bị bỏ qua)."""
+
+    def __init__(self, name: str, unique: tuple = (), max_docs: int = None):
+        self.name = name
+        self._docs = {}  # _id -> document, theo thứ tự insert
+        self._unique = unique  # các trường unique (ví dụ email), kiểm tra khi insert
+        self.max_docs = max_docs  # giới hạn kiểu capped collection, bỏ document cũ nhất
+
+    def _check_unique(self, doc: dict):
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"duplicate _id {doc['_id']}")
+        for field in self._unique:
+            if field in doc and any(other.get(field) == doc[field] for other in self._docs.values()):
+                raise DuplicateKeyError(f"duplicate {field} {doc[field]}")
+
+    def _insert(self, doc: dict):
+        doc = dict(doc)
+        doc.setdefault("_id", ObjectId())
+        self._check_unique(doc)
+        self._docs[doc["_id"]] = doc
+        if self.max_docs is not None and len(self._docs) > self.max_docs:
+            del self._docs[next(iter(self._docs))]
+        return doc["_id"]
+
+    def _first(self, query: dict, sort=None):
+        docs = (doc for doc in self._docs.values() if matches(doc, query or {}))
+        if sort:
+            docs = iter(_sorted(list(docs), _sort_spec(sort)))
+        return next(docs, None)
+
+    def find(self, filter=None, projection=None, session=None, **kwargs) -> InMemoryCursor:
+        return InMemoryCursor(self, filter, projection)
+
+    async def find_one(self, filter=None, projection=None, sort=None, session=None, **kwargs):
+        doc = self._first(filter, sort)
+        return None if doc is None else _project(doc, projection)
+
+    async def insert_one(self, document: dict, session=None, **kwargs):
+        return _Result(inserted_id=self._insert(document), acknowledged=True)
+
+    async def insert_many(self, documents, ordered: bool = True, session=None, **kwargs):
+        return _Result(inserted_ids=[self._insert(document) for document in documents], acknowledged=True)
+
+    def _upsert_doc(self, filter: dict, update: dict) -> dict:
+        doc = {field: value for field, value in filter.items() if not field.startswith("$") and not isinstance(value, dict)}
+        doc.update(update.get("$setOnInsert", {}))
+        return doc
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False, session=None, **kwargs):
+        doc = self._first(filter)
+        if doc is None:
+            if not upsert:
+                return _Result(matched_count=0, modified_count=0, upserted_id=None)
+            new_doc = self._upsert_doc(filter, update)
+            _apply_update(new_doc, update)
+            return _Result(matched_count=0, modified_count=0, upserted_id=self._insert(new_doc))
+        _apply_update(doc, update)
+        return _Result(matched_count=1, modified_count=1, upserted_id=None)
+
+    async def find_one_and_update(
+        self, filter: dict, update: dict, projection=None, upsert: bool = False,
+        return_document=ReturnDocument.BEFORE, session=None, **kwargs
+    ):
+        doc = self._first(filter)
+        if doc is None:
+            if not upsert:
+                return None
+            new_doc = self._upsert_doc(filter, update)
+            _apply_update(new_doc, update)
+            doc_id = self._insert(new_doc)
+            return _project(self._docs[doc_id], projection) if return_document == ReturnDocument.AFTER else None
+        before = dict(doc)
+        _apply_update(doc, update)
+        return _project(doc if return_document == ReturnDocument.AFTER else before, projection)
+
+    async def delete_one(self, filter: dict, session=None, **kwargs):
+        doc = self._first(filter)
+        if doc is not None:
+            del self._docs[doc["_id"]]
+        return _Result(deleted_count=0 if doc is None else 1)
+
+    async def count_documents(self, filter: dict, session=None, **kwargs) -> int:
+        return sum(1 for doc in self._docs.values() if matches(doc, filter))
+
+    async def create_indexes(self, indexes, **kwargs):
+        return [index.document["name"] for index in indexes]
+
+
+class InMemoryConnection(mqtt_service.MQTTConnection):
+    """
+    Kết nối MQTT giả lập: dùng lại đăng ký feed, hàng đợi publish và cập nhật giá trị của
+    MQTTConnection nhưng không mở socket; mọi publish được ack ngay.
+    """
+
+    def __init__(self, username, key, listeners=()):
+        super().__init__(username, key, listeners)
+        # Không giới hạn tốc độ để đo chi phí xử lý chứ không phải quota Adafruit
+        self.publisher.bucket = TokenBucket(rate=1e9, capacity=10**9)
+        self.publishes = 0
+
+    def ensure_connected(self):
+        with self._connect_lock:
+            if self._started:
+                return
+            self._started = True
+            self.online = True
+            self.publisher.set_online(True)
+
+    async def publish_async(self, feed_id, value, qos=mqtt_service.MQTT_PUBLISH_QOS,
+                            timeout=mqtt_service.MQTT_PUBLISH_TIMEOUT, confirm=False):
+        self.publishes += 1
+        return PublishResult(True, confirmed=True if confirm else None, latency_ms=0.0)
+
+    def receive(self, feed_id, value):
+        """Giả lập message từ broker (chạy trên event loop, không qua thread mạng)."""
+        self.message(self.client, feed_id, str(value))
+
+    def close(self):
+        self.publisher.close()
+        self._closing.set()
+
+
+def install_mqtt_stand_in():
+    """Cho connection manager global dùng kết nối giả lập; gọi trước khi tạo thiết bị."""
+    mqtt_service.connection_manager.connection_class = InMemoryConnection
+    return mqtt_service.connection_manager
+
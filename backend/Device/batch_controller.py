@@ -0,0 +1,99 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+import app_state
+from adafruit_feeds import feed_kind
+from Device.fan_controller import is_valid_fan_action, next_fan_value
+
+# LED nhận "0"/"1" như /led/{id}/{status}, thêm "on"/"off" cho dễ đọc trong scene
+LED_ACTIONS = {"0": "0", "1": "1", "off": "0", "on": "1"}
+
+
+class DeviceCommand(BaseModel):
+    device_id: str
+    action: str  # LED: 0/1/on/off; Fan: on/off/increase/decrease/0-100
+
+
+class BatchRequest(BaseModel):
+    commands: list[DeviceCommand]
+    confirm: bool = False  # chờ giá trị quay lại qua subscription
+
+
+def validate_action(command: DeviceCommand) -> Optional[str]:
+    """Kiểm tra cú pháp action theo loại thiết bị (không cần thiết bị đã được khởi tạo)."""
+    kind = feed_kind(command.device_id)
+    if kind == "led":
+        return None if command.action in LED_ACTIONS else "invalid status"
+    if kind == "fan":
+        return None if is_valid_fan_action(command.action) else "invalid action"
+    return "unsupported device"
+
+
+def validate_commands(commands: list, session: app_state.UserSession) -> list:
+    """Kiểm tra toàn bộ lệnh trước khi publish, trả về danh sách lỗi (rỗng nếu hợp lệ)."""
+    errors = []
+    seen = set()
+    for command in commands:
+        error = validate_action(command)
+        if error is None and command.device_id not in session.led_devices and command.device_id not in session.fan_devices:
+            error = "device not found"
+        if error is None and command.device_id in seen:
+            error = "duplicate device"
+        seen.add(command.device_id)
+        if error is not None:
+            errors.append({"device_id": command.device_id, "action": command.action, "status": error})
+    return errors
+
+
+async def apply_command(command: DeviceCommand, session: app_state.UserSession, confirm: bool = False) -> dict:
+    """Publish một lệnh đã kiểm tra qua hàng đợi publish của thiết bị."""
+    if command.device_id in session.led_devices:
+        device = session.led_devices[command.device_id]
+        status = LED_ACTIONS[command.action]
+        result = await device.mqtt_service.submit(status, confirm=confirm)
+        if result.acked or result.queued:
+            device.status = status
+        return {
+            "device_id": command.device_id,
+            "success": result.acked,
+            "status": status,
+            "confirmed": result.confirmed,
+            "queued": result.queued,
+        }
+
+    device = session.fan_devices[command.device_id]
+    current_value = device.value
+    new_value = next_fan_value(current_value, command.action)
+    device.value = new_value
+    result = await device.mqtt_service.submit(str(new_value), confirm=confirm)
+    if not result.acked and not result.queued and device.value == new_value:
+        device.value = current_value
+    return {
+        "device_id": command.device_id,
+        "success": result.acked,
+        "status": "on" if new_value > 0 else "off",
+        "value": new_value,
+        "confirmed": result.confirmed,
+        "queued": result.queued,
+    }
+
+
+async def run_commands(commands: list, session: app_state.UserSession, confirm: bool = False) -> dict:
+    """
+    Kiểm tra tất cả lệnh rồi publish song song qua hàng đợi publish. Nếu có lệnh không hợp lệ thì
+    không publish lệnh nào và raise HTTPException 400 kèm lỗi của từng lệnh.
+    """
+    errors = validate_commands(commands, session)
+    if errors:
+        raise HTTPException(status_code=400, detail={"errors": errors})
+    results = await asyncio.gather(*(apply_command(command, session, confirm) for command in commands))
+    return {"success": all(result["success"] for result in results), "results": results}
+
+
+router = APIRouter()
+
+@router.post("/devices/batch")
+async def control_devices(request: BatchRequest, session: app_state.UserSession = Depends(app_state.get_user_session)):
+    """Điều khiển nhiều LED/quạt trong một request."""
+    return await run_commands(request.commands, session, request.confirm)
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import logging
+from typing import Callable, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Số thiết bị được khởi tạo đồng thời và thời gian chờ tối đa cho mỗi thiết bị
+DEVICE_INIT_CONCURRENCY = int(os.getenv("DEVICE_INIT_CONCURRENCY", "8"))
+DEVICE_INIT_TIMEOUT = float(os.getenv("DEVICE_INIT_TIMEOUT", "10"))
+
+
+def _disconnect_device(device):
+    if hasattr(device, 'mqtt_service') and device.mqtt_service:
+        device.mqtt_service.disconnect()
+
+
+def _discard_late_device(future: asyncio.Future):
+    # Thiết bị hoàn tất sau khi đã timeout: không dùng nữa nên hủy đăng ký feed
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        _disconnect_device(future.result())
+    except Exception as e:
+        logger.error(f"Error discarding late device: {e}")
+
+
+async def init_devices(
+    factories: Iterable[Tuple[str, Callable[[], object]]],
+    concurrency: int = DEVICE_INIT_CONCURRENCY,
+    timeout: float = DEVICE_INIT_TIMEOUT,
+    fatal: Tuple[type, ...] = (),
+):
+    """
+    Khởi tạo các thiết bị song song trong thread pool, không chặn event loop.
+
+    `factories` là danh sách (feed_id, hàm tạo thiết bị). Trả về
+    (dict feed_id -> thiết bị, danh sách lỗi dạng {"id", "error"}).
+    Lỗi thuộc kiểu trong `fatal` (vd. sai key Adafruit) làm hỏng cả lần khởi tạo:
+    các thiết bị đã tạo được ngắt kết nối và lỗi được raise lại.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def build(feed_id, factory):
+        await semaphore.acquire()
+        try:
+            future = loop.run_in_executor(None, factory)
+        except BaseException:
+            semaphore.release()
+            raise
+        # Trả slot khi thread thực sự xong (kể cả sau timeout), không để số thread kết nối vượt `concurrency`
+        future.add_done_callback(lambda _: semaphore.release())
+        try:
+            device = await asyncio.wait_for(asyncio.shield(future), timeout)
+            return feed_id, device, None
+        except asyncio.TimeoutError:
+            future.add_done_callback(_discard_late_device)
+            logger.warning(f"Device {feed_id} timed out after {timeout}s")
+            return feed_id, None, f"Timeout sau {timeout}s"
+        except Exception as e:
+            logger.error(f"Error initializing device {feed_id}: {e}")
+            return feed_id, None, e if isinstance(e, fatal) else str(e)
+
+    results = await asyncio.gather(*(build(feed_id, factory) for feed_id, factory in factories))
+    errors = [error for _, _, error in results if isinstance(error, BaseException)]
+    if errors:
+        await disconnect_devices(device for _, device, error in results if error is None)
+        raise errors[0]
+    devices = {feed_id: device for feed_id, device, error in results if error is None}
+    failures = [{"id": feed_id, "error": error} for feed_id, _, error in results if error is not None]
+    return devices, failures
+
+
+async def disconnect_devices(devices: Iterable):
+    """Ngắt kết nối các thiết bị trong thread riêng để không chặn event loop."""
+    devices = list(devices)
+
+    def run():
+        for device in devices:
+            try:
+                _disconnect_device(device)
+            except Exception as e:
+                logger.error(f"Error disconnecting device {getattr(device, 'feed_id', device)}: {e}")
+
+    await asyncio.to_thread(run)
@@ -1,29 +1,23 @@
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
-import aiohttp
 import mqtt_service as mqtt
 import app_state
+from adafruit_feeds import feed_client
 import os
 
 class FanResponse(BaseModel):
     success: bool
     status: str
     value: int
+    confirmed: Optional[bool] = None  # giá trị đã quay lại từ Adafruit (khi confirm=true)
+    queued: bool = False  # mất kết nối MQTT, lệnh sẽ được gửi khi kết nối lại
 
 async def fetch_fan_feeds(username=None, key=None):
-    username = username
-    key = key
-    ADAFRUIT_FEEDS_URL = f"https://io.adafruit.com/api/v2/{username}/feeds"
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            ADAFRUIT_FEEDS_URL,
-            headers={"X-AIO-Key": key}
-        ) as response:
-            feeds = await response.json()
-            fan_feeds = [(feed["key"], feed["description"], feed["last_value"]) 
-                        for feed in feeds if feed["key"].startswith("dadn-fan")]
-            return fan_feeds
+    # Danh sách feed được tải một lần và cache, dùng chung cho LED/Fan/Sensor
+    feeds = await feed_client.get_device_feeds(username, key)
+    return [(feed["key"], feed["description"], feed["last_value"])
+            for feed in feeds["fan"]]
 
 class FanDevice:
     def __init__(self, feed_id: str, description: str, initial_value: str,
@@ -34,50 +28,67 @@ class FanDevice:
                                             username=username, key=key)
         self.value = int(initial_value)  # Lưu giá trị dạng số nguyên
 
+def is_valid_fan_action(action: str) -> bool:
+    return action in ("on", "off", "increase", "decrease") or (action.isdigit() and 0 <= int(action) <= 100)
+
+def next_fan_value(current_value: int, action: str):
+    """Tính mức quạt mới từ action, trả về None nếu action không hợp lệ."""
+    if action == "on":
+        return 50  # Mặc định bật ở mức 50%
+    if action == "off":
+        return 0
+    if action == "increase":
+        return min(100, current_value + 10)  # Tăng 10%, tối đa 100%
+    if action == "decrease":
+        return max(0, current_value - 10)  # Giảm 10%, tối thiểu 0%
+    if is_valid_fan_action(action):
+        return int(action)  # Đặt giá trị cụ thể
+    return None
+
 router = APIRouter()
 
 @router.get("/fan-devices")
-async def get_fan_devices():
+async def get_fan_devices(session: app_state.UserSession = Depends(app_state.get_user_session)):
     return {
         "devices": [
             {
                 "id": device_id,
                 "description": device.description,
-                "value": device.value
+                "value": device.value,
+                **device.mqtt_service.data_status(),
             }
-            for device_id, device in app_state.fan_devices.items()
+            for device_id, device in session.fan_devices.items()
         ]
     }
 
 @router.post("/fan/{device_id}/{action}", response_model=FanResponse)
-async def control_fan(device_id: str, action: str):
-    if device_id not in app_state.fan_devices:
+async def control_fan(
+    device_id: str,
+    action: str,
+    confirm: bool = Query(False, description="Chờ giá trị quay lại qua subscription"),
+    session: app_state.UserSession = Depends(app_state.get_user_session),
+):
+    if device_id not in session.fan_devices:
         return {"success": False, "status": "device not found", "value": 0}
     
-    device = app_state.fan_devices[device_id]
+    device = session.fan_devices[device_id]
     current_value = device.value
     
-    # Xử lý các action
-    if action == "on":
-        new_value = 50  # Mặc định bật ở mức 50%
-    elif action == "off":
-        new_value = 0
-    elif action == "increase":
-        new_value = min(100, current_value + 10)  # Tăng 10%, tối đa 100%
-    elif action == "decrease":
-        new_value = max(0, current_value - 10)  # Giảm 10%, tối thiểu 0%
-    elif action.isdigit() and 0 <= int(action) <= 100:
-        new_value = int(action)  # Đặt giá trị cụ thể
-    else:
+    new_value = next_fan_value(current_value, action)
+    if new_value is None:
         return {"success": False, "status": "invalid action", "value": current_value}
     
-    # Publish giá trị mới
-    success = device.mqtt_service.publish_data(str(new_value))
-    if success:
-        device.value = new_value
+    # Cập nhật ngay để các lệnh tiếp theo (ví dụ nhấn "increase" liên tục) tính từ giá trị mới,
+    # hàng đợi publish chỉ gửi giá trị cuối cùng
+    device.value = new_value
+    result = await device.mqtt_service.submit(str(new_value), confirm=confirm)
+    if not result.acked and not result.queued and device.value == new_value:
+        device.value = current_value
         
     return {
-        "success": success, 
+        "success": result.acked, 
         "status": "on" if new_value > 0 else "off", 
-        "value": new_value
+        "value": new_value,
+        "confirmed": result.confirmed,
+        "queued": result.queued,
     }
\ No newline at end of file
@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
-import aiohttp
 import mqtt_service as mqtt
 import app_state
+from adafruit_feeds import feed_client
 import os
 
 
 class LEDResponse(BaseModel):
     success: bool
     status: str
+    confirmed: Optional[bool] = None  # giá trị đã quay lại từ Adafruit (khi confirm=true)
+    queued: bool = False  # mất kết nối MQTT, lệnh sẽ được gửi khi kết nối lại
 
 class LEDDevice:
     def __init__(self, feed_id: str, description: str, initial_status: str, 
@@ -19,44 +22,41 @@ class LEDDevice:
         self.mqtt_service = mqtt.MQTTService(feed_id, initial_status, username, key)
 
 async def fetch_led_feeds(username=None, key=None):
-    username = username
-    key = key
-    ADAFRUIT_FEEDS_URL = f"https://io.adafruit.com/api/v2/{username}/feeds"
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            ADAFRUIT_FEEDS_URL,
-            headers={"X-AIO-Key": key}
-        ) as response:
-            feeds = await response.json()
-            led_feeds = [(feed["key"], feed["description"], feed["last_value"]) 
-                        for feed in feeds if feed["key"].startswith("dadn-led")]
-            return led_feeds
+    # Danh sách feed được tải một lần và cache, dùng chung cho LED/Fan/Sensor
+    feeds = await feed_client.get_device_feeds(username, key)
+    return [(feed["key"], feed["description"], feed["last_value"])
+            for feed in feeds["led"]]
 
 router = APIRouter()
 
 @router.get("/led-devices")
-async def get_led_devices():
+async def get_led_devices(session: app_state.UserSession = Depends(app_state.get_user_session)):
     return {
         "devices": [
             {
                 "id": device_id,
                 "description": device.description,
-                "status": device.status
+                "status": device.status,
+                **device.mqtt_service.data_status(),
             }
-            for device_id, device in app_state.led_devices.items()
+            for device_id, device in session.led_devices.items()
         ]
     }
 
 @router.post("/led/{device_id}/{status}", response_model=LEDResponse)
-async def control_led(device_id: str, status: str):
-    if device_id not in app_state.led_devices:
+async def control_led(
+    device_id: str,
+    status: str,
+    confirm: bool = Query(False, description="Chờ giá trị quay lại qua subscription"),
+    session: app_state.UserSession = Depends(app_state.get_user_session),
+):
+    if device_id not in session.led_devices:
         return {"success": False, "status": "device not found"}
     if status not in ['0', '1']:
         return {"success": False, "status": "invalid status"}
     
-    device = app_state.led_devices[device_id]
-    success = device.mqtt_service.publish_data(status)
-    if success:
+    device = session.led_devices[device_id]
+    result = await device.mqtt_service.submit(status, confirm=confirm)
+    if result.acked or result.queued:
         device.status = status
-    return {"success": success, "status": status}
\ No newline at end of file
+    return {"success": result.acked, "status": status, "confirmed": result.confirmed, "queued": result.queued}
\ No newline at end of file
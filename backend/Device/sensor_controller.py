@@ -1,10 +1,15 @@
 import os
-import aiohttp
-from fastapi import APIRouter
+import time
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, Optional
 import mqtt_service as mqtt
 import app_state
+from adafruit_feeds import feed_client
+from Device.sensor_history import history_store
+from MongoDB.server_mongo import get_sensor_reading_dal
+from MongoDB.SensorReading.sensor_reading_dal import SensorReadingDAL
 
 # Định nghĩa router
 router = APIRouter()
@@ -24,32 +29,25 @@ class SensorDevice:
         self.unit = unit
         self.mqtt_service = mqtt.MQTTService(feed_id, str(initial_value), 
                                             username=username, key=key)
+        self.history = history_store.get(username, feed_id)
+        if not len(self.history):
+            self.history.append(time.time(), float(initial_value))
 
 # Hàm lấy danh sách feed từ Adafruit
 async def fetch_sensor_feeds(username=None, key=None):
-    username = username
-    key = key
-    ADAFRUIT_FEEDS_URL = f"https://io.adafruit.com/api/v2/{username}/feeds"
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            ADAFRUIT_FEEDS_URL,
-            headers={"X-AIO-Key": key}
-        ) as response:
-            feeds = await response.json()
-            
-            # Lọc các feed sensor (nhiệt độ, ánh sáng, độ ẩm)
-            sensor_feeds = []
-            for feed in feeds:
-                feed_key = feed.get("key", "")
-                if feed_key in ["dadn-temp", "dadn-light", "dadn-humi"]:
-                    feed_id = feed_key
-                    description = get_sensor_description(feed_key)
-                    last_value = float(feed.get("last_value", "0"))
-                    unit = get_sensor_unit(feed_key)
-                    sensor_feeds.append((feed_id, description, last_value, unit))
-            
-            return sensor_feeds
+    # Danh sách feed được tải một lần và cache, dùng chung cho LED/Fan/Sensor
+    feeds = await feed_client.get_device_feeds(username, key)
+
+    # Các feed sensor (nhiệt độ, ánh sáng, độ ẩm) đã được lọc sẵn
+    sensor_feeds = []
+    for feed in feeds["sensor"]:
+        feed_id = feed["key"]
+        description = get_sensor_description(feed_id)
+        last_value = float(feed.get("last_value", "0"))
+        unit = get_sensor_unit(feed_id)
+        sensor_feeds.append((feed_id, description, last_value, unit))
+
+    return sensor_feeds
 
 def get_sensor_description(feed_key: str) -> str:
     descriptions = {
@@ -68,25 +66,26 @@ def get_sensor_unit(feed_key: str) -> str:
     return units.get(feed_key, "")
 
 @router.get("/sensor-devices")
-async def get_sensor_devices():
+async def get_sensor_devices(session: app_state.UserSession = Depends(app_state.get_user_session)):
     """Lấy danh sách các thiết bị cảm biến"""
     devices = []
-    for device_id, device in app_state.sensor_devices.items():
+    for device_id, device in session.sensor_devices.items():
         devices.append({
             "id": device_id,
             "description": device.description,
             "value": device.value,
-            "unit": device.unit
+            "unit": device.unit,
+            **device.mqtt_service.data_status(),
         })
     return {"devices": devices}
 
 @router.get("/sensor/{device_id}")
-async def get_sensor_value(device_id: str):
+async def get_sensor_value(device_id: str, session: app_state.UserSession = Depends(app_state.get_user_session)):
     """Lấy giá trị của một cảm biến cụ thể"""
-    if device_id not in app_state.sensor_devices:
+    if device_id not in session.sensor_devices:
         return {"success": False, "value": 0, "unit": ""}
     
-    device = app_state.sensor_devices[device_id]
+    device = session.sensor_devices[device_id]
     latest_value = device.mqtt_service.get_latest_data()
     
     try:
@@ -95,11 +94,69 @@ async def get_sensor_value(device_id: str):
         return {
             "success": True,
             "value": value,
-            "unit": device.unit
+            "unit": device.unit,
+            **device.mqtt_service.data_status(),
         }
     except (ValueError, TypeError):
         return {
             "success": False,
             "value": device.value,
             "unit": device.unit
-        }
\ No newline at end of file
+        }
+
+@router.get("/sensor/{device_id}/history")
+async def get_sensor_history(
+    device_id: str,
+    start: Optional[float] = Query(None, description="Unix timestamp bắt đầu (mặc định: 1 giờ trước)"),
+    end: Optional[float] = Query(None, description="Unix timestamp kết thúc (mặc định: hiện tại)"),
+    points: int = Query(60, ge=1, le=1000, description="Số điểm tối đa sau khi gộp"),
+    session: app_state.UserSession = Depends(app_state.get_user_session),
+):
+    """Lấy lịch sử cảm biến trong khoảng thời gian, gộp thành các bucket min/max/avg"""
+    if device_id not in session.sensor_devices:
+        return {"success": False, "unit": "", "points": []}
+
+    device = session.sensor_devices[device_id]
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 3600
+    return {
+        "success": True,
+        "unit": device.unit,
+        "start": start,
+        "end": end,
+        "points": device.history.query(start, end, points)
+    }
+
+@router.get("/sensor/{device_id}/readings")
+async def get_sensor_readings(
+    device_id: str,
+    start: Optional[float] = Query(None, description="Unix timestamp bắt đầu (mặc định: 24 giờ trước)"),
+    end: Optional[float] = Query(None, description="Unix timestamp kết thúc (mặc định: hiện tại)"),
+    limit: int = Query(1000, ge=1, le=10000, description="Số giá trị tối đa, mới nhất trước"),
+    session: app_state.UserSession = Depends(app_state.get_user_session),
+    sensor_reading_dal: SensorReadingDAL = Depends(get_sensor_reading_dal),
+):
+    """Lấy các giá trị cảm biến đã lưu trong MongoDB (không gộp), dùng cho khoảng thời gian dài"""
+    if device_id not in session.sensor_devices:
+        return {"success": False, "unit": "", "readings": []}
+
+    device = session.sensor_devices[device_id]
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 86400
+    readings = [
+        {"value": reading.value, "timestamp": reading.timestamp.replace(tzinfo=timezone.utc).timestamp()}
+        async for reading in sensor_reading_dal.get_readings(
+            session.username_adafruit,
+            device_id,
+            since=datetime.fromtimestamp(start, timezone.utc),
+            until=datetime.fromtimestamp(end, timezone.utc),
+            limit=limit,
+        )
+    ]
+    return {
+        "success": True,
+        "unit": device.unit,
+        "start": start,
+        "end": end,
+        "readings": readings
+    }
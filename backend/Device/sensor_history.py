@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from array import array
+from typing import Optional
+
+from adafruit_feeds import feed_kind
+
+# Số mẫu tối đa giữ cho mỗi cảm biến (mặc định ~11 giờ nếu 10 giây/mẫu)
+SENSOR_HISTORY_SIZE = int(os.getenv("SENSOR_HISTORY_SIZE", "4096"))
+
+
+class SensorHistory:
+    """Ring buffer kích thước cố định lưu các cặp (timestamp, value) của một cảm biến."""
+
+    def __init__(self, capacity: int = SENSOR_HISTORY_SIZE):
+        self.capacity = capacity
+        self._timestamps = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._start = 0  # vị trí vật lý của mẫu cũ nhất
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def _index(self, i: int) -> int:
+        return (self._start + i) % self.capacity
+
+    def append(self, timestamp: float, value: float):
+        with self._lock:
+            if self._count:
+                # Giữ timestamp không giảm để có thể tìm kiếm nhị phân
+                timestamp = max(timestamp, self._timestamps[self._index(self._count - 1)])
+            if self._count < self.capacity:
+                pos = self._index(self._count)
+                self._count += 1
+            else:
+                # Buffer đầy: ghi đè mẫu cũ nhất
+                pos = self._start
+                self._start = (self._start + 1) % self.capacity
+            self._timestamps[pos] = timestamp
+            self._values[pos] = value
+
+    def _bisect_left(self, timestamp: float) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamps[self._index(mid)] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, start: float, end: float, points: int) -> list:
+        """
+        Trả về các mẫu trong [start, end] được gộp thành tối đa `points` bucket
+        thời gian bằng nhau, mỗi bucket có min/max/avg/count.
+        """
+        if end <= start or points <= 0:
+            return []
+        width = (end - start) / points
+        buckets = {}
+        with self._lock:
+            i = self._bisect_left(start)
+            while i < self._count:
+                pos = self._index(i)
+                timestamp = self._timestamps[pos]
+                if timestamp > end:
+                    break
+                value = self._values[pos]
+                b = min(int((timestamp - start) / width), points - 1)
+                bucket = buckets.get(b)
+                if bucket is None:
+                    buckets[b] = [value, value, value, 1]
+                else:
+                    if value < bucket[0]:
+                        bucket[0] = value
+                    if value > bucket[1]:
+                        bucket[1] = value
+                    bucket[2] += value
+                    bucket[3] += 1
+                i += 1
+        return [
+            {
+                "t": start + (b + 0.5) * width,
+                "min": low,
+                "max": high,
+                "avg": total / count,
+                "count": count,
+            }
+            for b, (low, high, total, count) in sorted(buckets.items())
+        ]
+
+
+class SensorHistoryStore:
+    """Giữ một SensorHistory cho mỗi (username Adafruit, feed cảm biến)."""
+
+    def __init__(self, capacity: int = SENSOR_HISTORY_SIZE):
+        self.capacity = capacity
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def get(self, username: str, feed_id: str) -> SensorHistory:
+        key = (username, feed_id)
+        with self._lock:
+            history = self._histories.get(key)
+            if history is None:
+                history = self._histories[key] = SensorHistory(self.capacity)
+            return history
+
+    def find(self, username: str, feed_id: str) -> Optional[SensorHistory]:
+        with self._lock:
+            return self._histories.get((username, feed_id))
+
+    def discard(self, username: str):
+        """Bỏ toàn bộ lịch sử của một tài khoản (khi không còn phiên nào dùng)."""
+        with self._lock:
+            for key in [key for key in self._histories if key[0] == username]:
+                del self._histories[key]
+
+    def record(self, username: str, feed_id: str, payload, timestamp: Optional[float] = None):
+        """Listener cho MQTT: ghi lại giá trị của các feed cảm biến."""
+        if feed_kind(feed_id) != "sensor":
+            return
+        try:
+            value = float(payload)
+        except (TypeError, ValueError):
+            return
+        self.get(username, feed_id).append(timestamp or time.time(), value)
+
+
+history_store = SensorHistoryStore()
@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel
+import app_state
+from Device.batch_controller import run_commands, validate_action
+from MongoDB.Scene.scene_dal import Scene, SceneCommand, SceneDAL
+from MongoDB.server_mongo import get_scene_dal
+
+router = APIRouter(
+    prefix="/scenes",
+    tags=["scenes"]
+)
+
+class SaveSceneRequest(BaseModel):
+    commands: list[SceneCommand]
+
+def _owner(session: app_state.UserSession) -> int:
+    """Scene gắn với user_no của phiên (query `user_no` hoặc header `X-User-No`)."""
+    if session.user_no is None:
+        raise HTTPException(status_code=400, detail="Thiếu user_no.")
+    return session.user_no
+
+# === API Endpoints ===
+@router.get("") # Đường dẫn: "/api/scenes"
+async def list_scenes(
+    session: app_state.UserSession = Depends(app_state.get_user_session),
+    scene_dal: SceneDAL = Depends(get_scene_dal),
+) -> list[Scene]:
+    """Lấy danh sách scene của người dùng."""
+    return [scene async for scene in scene_dal.list_scenes(_owner(session))]
+
+@router.put("/{name}") # Đường dẫn: "/api/scenes/{name}"
+async def save_scene(
+    name: str,
+    request: SaveSceneRequest,
+    session: app_state.UserSession = Depends(app_state.get_user_session),
+    scene_dal: SceneDAL = Depends(get_scene_dal),
+) -> Scene:
+    """Tạo hoặc thay thế một scene. Các action được kiểm tra trước khi lưu."""
+    errors = [
+        {"device_id": command.device_id, "action": command.action, "status": error}
+        for command in request.commands
+        if (error := validate_action(command)) is not None
+    ]
+    if errors:
+        raise HTTPException(status_code=400, detail={"errors": errors})
+    return await scene_dal.save_scene(_owner(session), name, request.commands)
+
+@router.get("/{name}") # Đường dẫn: "/api/scenes/{name}"
+async def get_scene(
+    name: str,
+    session: app_state.UserSession = Depends(app_state.get_user_session),
+    scene_dal: SceneDAL = Depends(get_scene_dal),
+) -> Scene:
+    scene = await scene_dal.get_scene(_owner(session), name)
+    if scene is None:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy scene '{name}'")
+    return scene
+
+@router.delete("/{name}", status_code=status.HTTP_204_NO_CONTENT) # Đường dẫn: "/api/scenes/{name}"
+async def delete_scene(
+    name: str,
+    session: app_state.UserSession = Depends(app_state.get_user_session),
+    scene_dal: SceneDAL = Depends(get_scene_dal),
+):
+    if not await scene_dal.delete_scene(_owner(session), name):
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy scene '{name}'")
+
+@router.post("/{name}/run") # Đường dẫn: "/api/scenes/{name}/run"
+async def run_scene(
+    name: str,
+    confirm: bool = Query(False, description="Chờ giá trị quay lại qua subscription"),
+    session: app_state.UserSession = Depends(app_state.get_user_session),
+    scene_dal: SceneDAL = Depends(get_scene_dal),
+):
+    """Thực hiện tất cả lệnh của scene song song, trả về kết quả từng thiết bị."""
+    scene = await scene_dal.get_scene(_owner(session), name)
+    if scene is None:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy scene '{name}'")
+    return await run_commands(scene.commands, session, confirm)
@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Optional, AsyncGenerator
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+from pydantic import BaseModel, Field
+from metrics import instrument_dal
+
+# Pydantic model cho một lệnh trong scene
+class SceneCommand(BaseModel):
+    device_id: str # Feed của thiết bị, ví dụ "dadn-led-1"
+    action: str # LED: 0/1/on/off; Fan: on/off/increase/decrease/0-100
+
+# Pydantic model cho Scene (ví dụ "ra khỏi nhà": tắt tất cả thiết bị)
+class Scene(BaseModel):
+    user_no: int # Scene thuộc về người dùng nào
+    name: str
+    commands: list[SceneCommand]
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Data Access Layer cho Scene, mỗi scene được xác định bởi (user_no, name)
+@instrument_dal
+class SceneDAL:
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def save_scene(self, user_no: int, name: str, commands: list[SceneCommand]) -> Scene:
+        """Tạo mới hoặc thay thế scene cùng tên của người dùng."""
+        doc = await self.collection.find_one_and_update(
+            {"user_no": user_no, "name": name},
+            {"$set": {
+                "commands": [command.model_dump() for command in commands],
+                "updated_at": datetime.utcnow(),
+            }},
+            upsert=True,
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        return Scene(**doc)
+
+    async def get_scene(self, user_no: int, name: str) -> Optional[Scene]:
+        doc = await self.collection.find_one({"user_no": user_no, "name": name}, {"_id": 0})
+        return Scene(**doc) if doc else None
+
+    async def list_scenes(self, user_no: int) -> AsyncGenerator[Scene, None]:
+        async for doc in self.collection.find({"user_no": user_no}, {"_id": 0}).sort("name", 1):
+            yield Scene(**doc)
+
+    async def delete_scene(self, user_no: int, name: str) -> bool:
+        response = await self.collection.delete_one({"user_no": user_no, "name": name})
+        return response.deleted_count == 1
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+from typing import Optional, AsyncGenerator
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pydantic import BaseModel
+from pymongo.errors import CollectionInvalid
+
+from MongoDB.batch_writer import BatchWriter
+from adafruit_feeds import SENSOR_FEEDS
+from metrics import instrument_dal
+
+SENSOR_READING_COLLECTION = "sensor_reading"
+
+# Pydantic model cho một giá trị cảm biến
+class SensorReading(BaseModel):
+    feed: str # Feed Adafruit, ví dụ "dadn-temp"
+    username: str # Tài khoản Adafruit sở hữu feed
+    value: float
+    timestamp: datetime
+
+
+async def ensure_sensor_reading_collection(database: AsyncIOMotorDatabase) -> AsyncIOMotorCollection:
+    """Tạo time-series collection cho sensor reading nếu chưa tồn tại."""
+    try:
+        await database.create_collection(
+            SENSOR_READING_COLLECTION,
+            timeseries={"timeField": "timestamp", "metaField": "meta", "granularity": "seconds"},
+        )
+    except CollectionInvalid:
+        pass # Collection đã tồn tại
+    return database.get_collection(SENSOR_READING_COLLECTION)
+
+
+# Data Access Layer cho SensorReading
+@instrument_dal
+class SensorReadingDAL:
+    def __init__(self, collection: AsyncIOMotorCollection, flush_interval: float = 10.0, max_batch: int = 500):
+        self.collection = collection
+        # Gom các giá trị từ MQTT và ghi bằng insert_many theo chu kỳ
+        self.writer = BatchWriter(collection, flush_interval=flush_interval, max_batch=max_batch, name="sensor_reading")
+
+    async def start(self):
+        await self.writer.start()
+
+    async def stop(self):
+        await self.writer.stop()
+
+    def record(self, username: str, feed_id: str, payload, timestamp: Optional[datetime] = None):
+        """Listener cho MQTT: đưa giá trị cảm biến vào buffer, không chặn thread gọi."""
+        if feed_id not in SENSOR_FEEDS:
+            return
+        try:
+            value = float(payload)
+        except (TypeError, ValueError):
+            return
+        self.writer.add({
+            "timestamp": timestamp or datetime.now(timezone.utc),
+            "meta": {"feed": feed_id, "username": username},
+            "value": value,
+        })
+
+    async def get_readings(
+        self,
+        username: str,
+        feed: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 1000,
+    ) -> AsyncGenerator[SensorReading, None]:
+        """Lấy các giá trị cảm biến theo khoảng thời gian, mới nhất trước."""
+        query = {"meta.feed": feed, "meta.username": username}
+        time_range = {}
+        if since is not None:
+            time_range["$gte"] = since
+        if until is not None:
+            time_range["$lt"] = until
+        if time_range:
+            query["timestamp"] = time_range
+        cursor = self.collection.find(query).sort("timestamp", -1).limit(limit)
+        async for doc in cursor:
+            yield SensorReading(
+                feed=doc["meta"]["feed"],
+                username=doc["meta"]["username"],
+                value=doc["value"],
+                timestamp=doc["timestamp"],
+            )
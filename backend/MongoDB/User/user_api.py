@@ -1,6 +1,7 @@
 from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
 
 # Import User và UserDAL từ user_dal.py
 from MongoDB.User.user_dal import User, UserDAL
@@ -41,13 +42,17 @@ async def get_all_users(user_dal: UserDAL = Depends(get_user_dal)) -> list[User]
 @router.post("", status_code=status.HTTP_201_CREATED) # Đường dẫn: "/api/users"
 async def create_user(new_user: NewUser, user_dal: UserDAL = Depends(get_user_dal)) -> NewUserResponse:
     """Tạo một người dùng mới."""
-    created_user = await user_dal.create_user(
-        name=new_user.name,
-        email=new_user.email,
-        password=new_user.password, # Cần xem xét mã hóa mật khẩu ở đây
-        username_adafruit=new_user.username_adafruit,
-        key_adafruit=new_user.key_adafruit
-    )
+    try:
+        created_user = await user_dal.create_user(
+            name=new_user.name,
+            email=new_user.email,
+            password=new_user.password, # Cần xem xét mã hóa mật khẩu ở đây
+            username_adafruit=new_user.username_adafruit,
+            key_adafruit=new_user.key_adafruit
+        )
+    except DuplicateKeyError:
+        # Index unique trên email (MongoDB/indexes.py)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email {new_user.email} đã được sử dụng.")
     if not created_user:
         raise HTTPException(status_code=500, detail="Không thể tạo người dùng.")
     return NewUserResponse(
@@ -55,6 +60,11 @@ async def create_user(new_user: NewUser, user_dal: UserDAL = Depends(get_user_da
         name=created_user.name,
     )
 
+@router.get("/cache/stats") # Đường dẫn: "/api/users/cache/stats"
+async def get_user_cache_stats(user_dal: UserDAL = Depends(get_user_dal)) -> dict:
+    """Thống kê hit/miss của cache tra cứu người dùng."""
+    return user_dal.cache.stats()
+
 @router.get("/{user_no}") # Đường dẫn: "/api/users/{user_no}"
 async def get_user(user_no: int, user_dal: UserDAL = Depends(get_user_dal)) -> User:
     """Lấy thông tin một người dùng cụ thể bằng 'no'."""
@@ -75,7 +85,10 @@ async def update_user(user_no: int, user_update: UserUpdate, user_dal: UserDAL =
         "key_adafruit": user_update.key_adafruit
     }
     
-    updated_user = await user_dal.update_user(user_no, user_data)
+    try:
+        updated_user = await user_dal.update_user(user_no, user_data)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email {user_update.email} đã được sử dụng.")
     if updated_user is None:
         raise HTTPException(status_code=404, detail=f"Không tìm thấy người dùng với no={user_no} để cập nhật")
     return updated_user
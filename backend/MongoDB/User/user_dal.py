@@ -4,7 +4,12 @@ from pymongo import ReturnDocument
 from pydantic import BaseModel, Field, ConfigDict, BeforeValidator
 from typing import Optional, AsyncGenerator, Annotated
 
+import os
 from uuid import uuid4
+from cachetools import TTLCache
+
+from MongoDB.indexes import plan_checker
+from metrics import instrument_dal
 
 # --- Cảnh báo Bảo mật ---
 # Mật khẩu đang được lưu trữ và so sánh dưới dạng văn bản thuần.
@@ -44,9 +49,86 @@ class User(BaseModel):
     # @staticmethod
     # def from_doc(doc) -> "User": ...
 
+# === User Cache ===
+class UserCache:
+    """
+    Cache User trong process theo email và theo no (LRU giới hạn kích thước + TTL).
+    Được xóa khi cập nhật/xóa user; với nhiều process, TTL giới hạn thời gian dữ liệu cũ.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self._by_email = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._by_no = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, cache: TTLCache, key) -> Optional[User]:
+        user = cache.get(key)
+        if user is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return user.model_copy() # Trả bản sao để caller không sửa được dữ liệu trong cache
+
+    def get_by_email(self, email: str) -> Optional[User]:
+        return self._lookup(self._by_email, email)
+
+    def get_by_no(self, no: int) -> Optional[User]:
+        return self._lookup(self._by_no, no)
+
+    def put(self, user: User):
+        self._by_email[user.email] = user
+        self._by_no[user.no] = user
+
+    def invalidate(self, no: int):
+        self._by_no.pop(no, None)
+        # Email có thể đã đổi nên xóa mọi entry trỏ tới user này
+        for email in [email for email, user in self._by_email.items() if user.no == no]:
+            self._by_email.pop(email, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._by_no),
+        }
+
+# _id của bộ đếm user_no trong collection counters
+USER_NO_COUNTER = "user_no"
+
+@instrument_dal
 class UserDAL:
-    def __init__(self, user_collection: AsyncIOMotorCollection):
+    def __init__(
+        self,
+        user_collection: AsyncIOMotorCollection,
+        counter_collection: Optional[AsyncIOMotorCollection] = None,
+        cache: Optional[UserCache] = None,
+    ):
         self._user_collection = user_collection
+        self._counter_collection = counter_collection
+        self.cache = cache or UserCache(
+            maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+        )
+
+    async def init_counter(self, session=None):
+        """
+        Đồng bộ bộ đếm user_no với no lớn nhất hiện có (gọi một lần khi khởi động).
+        Dùng $max nên chạy nhiều lần hoặc chạy đồng thời đều an toàn.
+        """
+        if self._counter_collection is None:
+            return
+        result = await self._user_collection.find_one(
+            {}, sort=[("no", -1)], projection={"no": 1}, session=session
+        )
+        await self._counter_collection.update_one(
+            {"_id": USER_NO_COUNTER},
+            {"$max": {"seq": result["no"] if result else 0}},
+            upsert=True,
+            session=session,
+        )
 
     async def list_users(self, session=None) -> AsyncGenerator[User, None]:
         async for doc in self._user_collection.find({}, session=session):
@@ -58,10 +140,18 @@ class UserDAL:
                 # Bỏ qua bản ghi lỗi hoặc xử lý khác
 
     async def get_user(self, no: int, session=None) -> Optional[User]:
+        # Trong transaction (có session) luôn đọc từ DB
+        if session is None:
+            cached = self.cache.get_by_no(no)
+            if cached is not None:
+                return cached
+        plan_checker.check(self._user_collection, "UserDAL.get_user", {"no": no})
         doc = await self._user_collection.find_one({"no": no}, session=session)
         if doc:
             try:
-                return User(**doc) # Pydantic tự xử lý
+                user = User(**doc) # Pydantic tự xử lý
+                self.cache.put(user)
+                return user.model_copy()
             except Exception as e:
                  print(f"Lỗi khi tạo User model từ doc (get_user): {e}, doc: {doc}")
                  return None
@@ -69,10 +159,17 @@ class UserDAL:
 
     async def get_user_by_email(self, email: str, session=None) -> Optional[User]:
         """Tìm người dùng bằng địa chỉ email."""
+        if session is None:
+            cached = self.cache.get_by_email(email)
+            if cached is not None:
+                return cached
+        plan_checker.check(self._user_collection, "UserDAL.get_user_by_email", {"email": email})
         doc = await self._user_collection.find_one({"email": email}, session=session)
         if doc:
             try:
-                return User(**doc) # Pydantic tự xử lý
+                user = User(**doc) # Pydantic tự xử lý
+                self.cache.put(user)
+                return user.model_copy()
             except Exception as e:
                  print(f"Lỗi khi tạo User model từ doc (get_user_by_email): {e}, doc: {doc}")
                  return None
@@ -80,11 +177,23 @@ class UserDAL:
 
     async def delete_user(self, no: int, session=None) -> bool:
         response = await self._user_collection.delete_one({"no": no}, session=session)
+        self.cache.invalidate(no)
         return response.deleted_count == 1
 
     async def get_next_user_no(self, session=None) -> int:
         """Lấy số no tiếp theo cho người dùng mới"""
-        # Tìm user có no cao nhất
+        if self._counter_collection is not None:
+            # Tăng bộ đếm nguyên tử: O(1) và không trùng khi nhiều người đăng ký cùng lúc
+            counter = await self._counter_collection.find_one_and_update(
+                {"_id": USER_NO_COUNTER},
+                {"$inc": {"seq": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+                session=session,
+            )
+            return counter["seq"]
+
+        # Không có collection counters: tìm user có no cao nhất
         result = await self._user_collection.find_one(
             {},
             sort=[("no", -1)],  # Sắp xếp giảm dần theo no
@@ -130,13 +239,12 @@ class UserDAL:
 
         result = await self._user_collection.insert_one(user_data, session=session)
         if result.inserted_id:
-            inserted_doc = await self._user_collection.find_one({"_id": result.inserted_id}, session=session)
-            if inserted_doc:
-                try:
-                    return User(**inserted_doc) # Pydantic tự xử lý
-                except Exception as e:
-                     print(f"Lỗi khi tạo User model từ doc (create_user): {e}, doc: {inserted_doc}")
-                     return None
+            # Tạo User từ chính dữ liệu vừa insert, không cần đọc lại từ DB
+            try:
+                return User(**user_data) # Pydantic tự xử lý
+            except Exception as e:
+                 print(f"Lỗi khi tạo User model từ doc (create_user): {e}, doc: {user_data}")
+                 return None
         return None
 
     async def update_user(self, no: int, user_update_data: dict, session=None) -> User | None:
@@ -149,16 +257,23 @@ class UserDAL:
          update_dict.pop("id", None)
          update_dict.pop("no", None)
          update_doc = {"$set": update_dict}
+         self.cache.invalidate(no)
 
-         result_doc = await self._user_collection.find_one_and_update(
-             {"no": no},
-             update_doc,
-             session=session,
-             return_document=ReturnDocument.AFTER,
-         )
+         try:
+             result_doc = await self._user_collection.find_one_and_update(
+                 {"no": no},
+                 update_doc,
+                 session=session,
+                 return_document=ReturnDocument.AFTER,
+             )
+         finally:
+             # Xóa lại sau khi ghi: request đọc song song có thể đã cache bản cũ trong lúc chờ DB
+             self.cache.invalidate(no)
          if result_doc:
              try:
-                 return User(**result_doc) # Pydantic tự xử lý
+                 user = User(**result_doc) # Pydantic tự xử lý
+                 self.cache.put(user) # Write-through: cache giữ bản mới nhất
+                 return user.model_copy()
              except Exception as e:
                  print(f"Lỗi khi tạo User model từ doc (update_user): {e}, doc: {result_doc}")
                  return None
@@ -1,9 +1,13 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import csv
+import io
+import json
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from datetime import datetime
 from pydantic import BaseModel
 # Import model và DAL từ user_log_dal.py
-from MongoDB.UserLog.user_log_dal import UserLog, UserLogDAL
+from MongoDB.UserLog.user_log_dal import UserLog, UserLogDAL, EXPORT_FIELDS
 # Import dependency để lấy UserLogDAL (sẽ được định nghĩa trong server_mongo.py)
 from MongoDB.server_mongo import get_user_log_dal
 
@@ -45,30 +49,62 @@ async def create_user_log(
         raise HTTPException(status_code=500, detail=f"Không thể tạo log: {str(e)}")
 
 
+async def _list_logs(
+    user_log_dal: UserLogDAL,
+    response: Response,
+    user_no: Optional[int],
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    status: Optional[str],
+    device_name: Optional[str],
+) -> List[UserLog]:
+    try:
+        # skip (phân trang kiểu cũ, chi phí O(skip)) vẫn đi qua cùng bộ lọc và trả về cursor trang sau
+        logs, next_cursor = await user_log_dal.find_logs(
+            limit=limit,
+            skip=skip,
+            user_no=user_no,
+            since=since,
+            until=until,
+            status=status,
+            device_name=device_name,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return logs
+
+
 @router.get("", response_model=List[UserLogResponse])
 async def get_logs(
+    response: Response,
     user_no: Optional[int] = Query(None, description="Lọc log theo user_no cụ thể"),
-    skip: int = Query(0, ge=0, description="Số lượng bản ghi bỏ qua (phân trang)"),
+    skip: int = Query(0, ge=0, description="Số lượng bản ghi bỏ qua (phân trang kiểu cũ)"),
     limit: int = Query(100, ge=1, le=1000, description="Số lượng bản ghi tối đa trả về"),
+    cursor: Optional[str] = Query(None, description="Cursor lấy từ header X-Next-Cursor của trang trước"),
+    since: Optional[datetime] = Query(None, description="Chỉ lấy log từ thời điểm này"),
+    until: Optional[datetime] = Query(None, description="Chỉ lấy log trước thời điểm này"),
+    status: Optional[str] = Query(None, description="Lọc theo trạng thái"),
+    device_name: Optional[str] = Query(None, description="Lọc theo tên thiết bị"),
     user_log_dal: UserLogDAL = Depends(get_user_log_dal)
 ):
     """
-    Lấy danh sách user log.
+    Lấy danh sách user log, mới nhất trước.
 
-    - Có thể lọc theo **user_no** cụ thể bằng query parameter.
-    - Hỗ trợ phân trang bằng **skip** và **limit**.
+    - Có thể lọc theo **user_no**, **since**/**until**, **status** và **device_name**.
+    - Phân trang bằng **cursor**: nếu còn trang sau, response có header
+      `X-Next-Cursor`; gửi lại giá trị đó trong `cursor` để lấy trang tiếp theo.
+    - **skip** vẫn được hỗ trợ nhưng chậm dần khi skip lớn.
     """
-    logs = []
     try:
-        if user_no is not None:
-            # Lấy log cho user cụ thể
-            async for log in user_log_dal.get_logs_by_user(user_no, limit=limit, skip=skip):
-                logs.append(log)
-        else:
-            # Lấy tất cả log nếu không có user_no
-            async for log in user_log_dal.get_all_logs(limit=limit, skip=skip):
-                logs.append(log)
-        return logs
+        return await _list_logs(user_log_dal, response, user_no, skip, limit, cursor, since, until, status, device_name)
+    except HTTPException as he:
+        raise he
     except Exception as e:
         # Log lỗi ở đây nếu cần
         raise HTTPException(status_code=500, detail=f"Không thể lấy danh sách log: {str(e)}")
@@ -77,26 +113,88 @@ async def get_logs(
 @router.get("/user/{user_no}", response_model=List[UserLogResponse])
 async def get_user_logs_by_user_no(
     user_no: int, # Lấy user_no từ path parameter
-    skip: int = Query(0, ge=0, description="Số lượng bản ghi bỏ qua (phân trang)"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Số lượng bản ghi bỏ qua (phân trang kiểu cũ)"),
     limit: int = Query(100, ge=1, le=1000, description="Số lượng bản ghi tối đa trả về"),
+    cursor: Optional[str] = Query(None, description="Cursor lấy từ header X-Next-Cursor của trang trước"),
+    since: Optional[datetime] = Query(None, description="Chỉ lấy log từ thời điểm này"),
+    until: Optional[datetime] = Query(None, description="Chỉ lấy log trước thời điểm này"),
+    status: Optional[str] = Query(None, description="Lọc theo trạng thái"),
+    device_name: Optional[str] = Query(None, description="Lọc theo tên thiết bị"),
     user_log_dal: UserLogDAL = Depends(get_user_log_dal)
 ):
     """
-    Lấy danh sách tất cả log cho một user_no cụ thể.
+    Lấy danh sách log cho một user_no cụ thể.
 
-    - Hỗ trợ phân trang bằng **skip** và **limit**.
+    - Hỗ trợ các bộ lọc và phân trang bằng **cursor** giống `GET /logs`.
     """
-    logs = []
     try:
-        async for log in user_log_dal.get_logs_by_user(user_no, limit=limit, skip=skip):
-            logs.append(log)
         # Không cần kiểm tra logs rỗng ở đây, trả về danh sách rỗng là hợp lệ
-        return logs
+        return await _list_logs(user_log_dal, response, user_no, skip, limit, cursor, since, until, status, device_name)
+    except HTTPException as he:
+        raise he
     except Exception as e:
         # Log lỗi ở đây nếu cần
         raise HTTPException(status_code=500, detail=f"Không thể lấy log cho user {user_no}: {str(e)}")
 
 
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def _export_chunks(docs, export_format: str, rows_per_chunk: int = 500):
+    """Chuyển các document log thành từng chunk NDJSON/CSV để stream."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer is not None:
+        writer.writerow(EXPORT_FIELDS)
+    rows = 0
+    async for doc in docs:
+        values = [_export_value(doc.get(field)) for field in EXPORT_FIELDS]
+        if writer is not None:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values)), ensure_ascii=False))
+            buffer.write("\n")
+        rows += 1
+        if rows % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@router.get("/user/{user_no}/export")
+async def export_user_logs(
+    user_no: int,
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Định dạng xuất: ndjson hoặc csv"),
+    since: Optional[datetime] = Query(None, description="Chỉ lấy log từ thời điểm này"),
+    until: Optional[datetime] = Query(None, description="Chỉ lấy log trước thời điểm này"),
+    status: Optional[str] = Query(None, description="Lọc theo trạng thái"),
+    device_name: Optional[str] = Query(None, description="Lọc theo tên thiết bị"),
+    user_log_dal: UserLogDAL = Depends(get_user_log_dal)
+):
+    """
+    Xuất toàn bộ log của một user dưới dạng NDJSON hoặc CSV.
+
+    Dữ liệu được stream theo từng chunk trực tiếp từ cursor MongoDB nên bộ nhớ
+    không phụ thuộc vào số lượng log.
+    """
+    docs = user_log_dal.iter_log_docs(
+        user_no=user_no, since=since, until=until, status=status, device_name=device_name
+    )
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"user_{user_no}_logs.{format}"
+    return StreamingResponse(
+        _export_chunks(docs, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @router.get("/{log_id}", response_model=UserLogResponse)
 async def get_single_log(
     log_id: str,
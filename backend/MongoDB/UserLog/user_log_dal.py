@@ -1,8 +1,13 @@
-from datetime import datetime
-from typing import Optional, AsyncGenerator
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Optional, AsyncGenerator, List, Tuple
 from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
 from pydantic import BaseModel, Field, ConfigDict
 from bson import ObjectId # Để tạo _id
+from MongoDB.batch_writer import BatchWriter
+from MongoDB.indexes import plan_checker
+from metrics import instrument_dal
 
 # Pydantic model cho UserLog
 class UserLog(BaseModel):
@@ -22,10 +27,58 @@ class UserLog(BaseModel):
         by_alias=True # <--- Thêm dòng này để serialize dùng alias
     )
 
+# Thứ tự sắp xếp dùng cho keyset pagination, khớp với index (timestamp, _id)
+LOG_SORT = [("timestamp", -1), ("_id", -1)]
+
+# Các trường được xuất khi export log
+EXPORT_FIELDS = ["_id", "user_no", "activity", "status", "timestamp", "device_name"]
+
+def to_naive_utc(dt: datetime) -> datetime:
+    """MongoDB trả về datetime UTC không có tzinfo, chuẩn hóa để so sánh."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+def encode_cursor(log_doc: dict) -> str:
+    """Mã hóa (timestamp, _id) của log cuối cùng thành cursor opaque."""
+    raw = json.dumps([log_doc["timestamp"].isoformat(), str(log_doc["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Giải mã cursor, raise ValueError nếu cursor không hợp lệ."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, log_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(timestamp), log_id
+    except Exception as e:
+        raise ValueError(f"Cursor không hợp lệ: {cursor}") from e
+
 # Data Access Layer cho UserLog
+@instrument_dal
 class UserLogDAL:
-    def __init__(self, collection: AsyncIOMotorCollection):
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        flush_interval: float = 2.0,
+        max_batch: int = 200,
+        spool_path: Optional[str] = None,
+    ):
         self.collection = collection
+        # Log được gom và ghi bằng insert_many; khi MongoDB lỗi thì ghi tạm ra file spool
+        self.writer = BatchWriter(
+            collection,
+            flush_interval=flush_interval,
+            max_batch=max_batch,
+            name="user_log",
+            spool_path=spool_path,
+        )
+
+    async def start(self):
+        await self.writer.start()
+
+    async def stop(self):
+        """Ghi nốt các log còn trong buffer, gọi khi shutdown."""
+        await self.writer.stop()
 
     async def create_log(
         self,
@@ -35,7 +88,12 @@ class UserLogDAL:
         device_name: Optional[str] = None,
         timestamp: Optional[datetime] = None,
     ) -> UserLog:
-        """Tạo một bản ghi log mới."""
+        """
+        Tạo một bản ghi log mới.
+
+        Khi writer đang chạy, log chỉ được đưa vào buffer (không chờ MongoDB)
+        và sẽ được ghi ở lần flush tiếp theo.
+        """
         log_id = str(ObjectId()) # Tạo ID mới cho log
         log_data = {
             "_id": log_id,
@@ -45,12 +103,77 @@ class UserLogDAL:
             "timestamp": timestamp or datetime.utcnow(),
             "device_name": device_name,
         }
-        await self.collection.insert_one(log_data)
+        if self.writer.running:
+            self.writer.add(log_data)
+        else:
+            await self.collection.insert_one(log_data)
         # Trả về đối tượng UserLog đã tạo (lấy từ dữ liệu đã chuẩn bị)
         return UserLog(**log_data)
 
+    def build_query(
+        self,
+        user_no: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        status: Optional[str] = None,
+        device_name: Optional[str] = None,
+        cursor: Optional[str] = None,
+    ) -> dict:
+        """Tạo filter MongoDB từ các điều kiện lọc và cursor phân trang."""
+        query = {}
+        if user_no is not None:
+            query["user_no"] = user_no
+        time_range = {}
+        if since is not None:
+            time_range["$gte"] = to_naive_utc(since)
+        if until is not None:
+            time_range["$lt"] = to_naive_utc(until)
+        if time_range:
+            query["timestamp"] = time_range
+        if status is not None:
+            query["status"] = status
+        if device_name is not None:
+            query["device_name"] = device_name
+        if cursor is not None:
+            # Keyset: chỉ lấy các log đứng sau (timestamp, _id) cuối cùng đã trả về
+            last_timestamp, last_id = decode_cursor(cursor)
+            query["$or"] = [
+                {"timestamp": {"$lt": last_timestamp}},
+                {"timestamp": last_timestamp, "_id": {"$lt": last_id}},
+            ]
+        return query
+
+    async def find_logs(self, limit: int = 100, skip: int = 0, **filters) -> Tuple[List[UserLog], Optional[str]]:
+        """
+        Lấy một trang log (mới nhất trước) theo keyset pagination.
+
+        `filters` gồm user_no, since, until, status, device_name và cursor; `skip` bỏ qua thêm
+        số bản ghi đầu (sau cursor nếu có). Trả về (danh sách log, cursor của trang kế tiếp hoặc None nếu hết).
+        """
+        query = self.build_query(**filters)
+        plan_checker.check(self.collection, "UserLogDAL.find_logs", query, LOG_SORT)
+        # Lấy dư một bản ghi để biết còn trang sau hay không
+        cursor = self.collection.find(query).sort(LOG_SORT)
+        if skip:
+            cursor = cursor.skip(skip)
+        docs = await cursor.limit(limit + 1).to_list(length=limit + 1)
+        logs = [UserLog(**doc) for doc in docs[:limit]]
+        next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        return logs, next_cursor
+
+    async def iter_log_docs(self, batch_size: int = 1000, **filters) -> AsyncGenerator[dict, None]:
+        """
+        Duyệt toàn bộ log khớp điều kiện dưới dạng dict thô (không tạo model),
+        đọc từ cursor theo từng batch để bộ nhớ không tăng theo số bản ghi.
+        """
+        query = self.build_query(**filters)
+        cursor = self.collection.find(query, projection=EXPORT_FIELDS).sort(LOG_SORT).batch_size(batch_size)
+        async for log_doc in cursor:
+            yield log_doc
+
     async def get_logs_by_user(self, user_no: int, limit: int = 100, skip: int = 0) -> AsyncGenerator[UserLog, None]:
         """Lấy danh sách log của một user cụ thể, phân trang."""
+        plan_checker.check(self.collection, "UserLogDAL.get_logs_by_user", {"user_no": user_no}, [("timestamp", -1)])
         cursor = self.collection.find({"user_no": user_no}).sort("timestamp", -1).skip(skip).limit(limit)
         async for log_doc in cursor:
             yield UserLog(**log_doc)
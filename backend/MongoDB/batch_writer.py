@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Optional
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import BulkWriteError
+from metrics import DB_OPERATION_DURATION
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class PartialWriteError(Exception):
+    """insert_many(ordered=False) chỉ ghi được một phần batch; `failed` là các document chưa được ghi."""
+
+    def __init__(self, failed: list, error: BulkWriteError):
+        super().__init__(str(error))
+        self.failed = failed
+
+
+class BatchWriter:
+    """
+    Gom document trong bộ nhớ và ghi xuống MongoDB bằng `insert_many`
+    theo chu kỳ `flush_interval` hoặc khi đủ `max_batch` document.
+
+    `add` không chặn và gọi được từ bất kỳ thread nào (kể cả thread MQTT).
+    Nếu có `spool_path`, batch ghi lỗi được nối vào file đó (mỗi dòng một
+    document) và được ghi lại vào MongoDB khi kết nối hoạt động trở lại.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        flush_interval: float = 5.0,
+        max_batch: int = 500,
+        max_buffer: int = 50000,
+        name: str = "batch",
+        spool_path: Optional[str] = None,
+    ):
+        if spool_path and os.path.exists(spool_path) and not os.path.isfile(spool_path):
+            # Spool được đổi tên và xóa khi replay nên phải là file thường (không phải /dev/null, thư mục...)
+            raise ValueError(f"Spool path must be a regular file: {spool_path}")
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.name = name
+        self.spool_path = spool_path
+        self._buffer = deque(maxlen=max_buffer)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._has_spool = bool(spool_path) and (
+            os.path.exists(spool_path) or os.path.exists(spool_path + ".replay")
+        )
+        self.written = 0
+        self.dropped = 0
+        self.spooled = 0
+
+    def add(self, doc: dict):
+        if len(self._buffer) == self._buffer.maxlen:
+            # Buffer đầy (DB không theo kịp): deque tự bỏ document cũ nhất
+            self.dropped += 1
+        self._buffer.append(doc)
+        if len(self._buffer) >= self.max_batch and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Dừng vòng flush và ghi nốt phần còn lại trong buffer (hoặc vào spool)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+        if self._has_spool:
+            await self.replay_spool()
+        while self._buffer:
+            if not await self.flush():
+                break
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._has_spool:
+                # Nếu MongoDB vẫn lỗi, batch mới bên dưới cũng sẽ được nối vào spool
+                await self.replay_spool()
+            while self._buffer:
+                if not await self.flush() or len(self._buffer) < self.max_batch:
+                    break
+
+    def _take_batch(self) -> list:
+        batch = []
+        while self._buffer and len(batch) < self.max_batch:
+            batch.append(self._buffer.popleft())
+        return batch
+
+    async def _write(self, batch: list):
+        started = time.perf_counter()
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Document đã được ghi ở lần trước (ví dụ khi replay spool) thì bỏ qua.
+            # Các document còn lại của batch đã được ghi, chỉ trả lại những document lỗi
+            # để không ghi trùng (time-series collection không có _id duy nhất).
+            errors = e.details.get("writeErrors", [])
+            failed = [batch[error["index"]] for error in errors if error.get("code") != DUPLICATE_KEY_ERROR]
+            if failed:
+                raise PartialWriteError(failed, e) from e
+        finally:
+            DB_OPERATION_DURATION.observe(time.perf_counter() - started, f"BatchWriter.insert_many[{self.name}]")
+
+    async def flush(self) -> bool:
+        """Ghi một batch, trả về False nếu ghi thất bại."""
+        async with self._flush_lock:
+            batch = self._take_batch()
+            if not batch:
+                return True
+            try:
+                await self._write(batch)
+                self.written += len(batch)
+                return True
+            except PartialWriteError as e:
+                self.written += len(batch) - len(e.failed)
+                logger.error(f"[{self.name}] insert_many: {len(e.failed)}/{len(batch)} documents failed: {e}")
+                failed = e.failed
+            except Exception as e:
+                logger.error(f"[{self.name}] insert_many of {len(batch)} documents failed: {e}")
+                failed = batch
+            if self.spool_path:
+                await self._spool(failed)
+            else:
+                self._requeue(failed)
+            return False
+
+    def _requeue(self, batch: list):
+        # Đưa batch lỗi về đầu buffer để thử lại ở lần flush sau
+        free = self._buffer.maxlen - len(self._buffer)
+        if free < len(batch):
+            self.dropped += len(batch) - free
+            batch = batch[len(batch) - free:] if free > 0 else []
+        self._buffer.extendleft(reversed(batch))
+
+    async def _spool(self, batch: list):
+        lines = "".join(json_util.dumps(doc) + "\n" for doc in batch)
+
+        def append():
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+        try:
+            await asyncio.to_thread(append)
+            self._has_spool = True
+            self.spooled += len(batch)
+            logger.warning(f"[{self.name}] Spooled {len(batch)} documents to {self.spool_path}")
+        except OSError as e:
+            logger.error(f"[{self.name}] Cannot write spool file {self.spool_path}: {e}")
+            self._requeue(batch)
+
+    def _open_replay(self, replay_path: str):
+        """Mở file replay (chạy trong thread); trả về None nếu không còn spool."""
+        if not os.path.exists(replay_path):
+            try:
+                # Đổi tên trước để các batch lỗi mới được nối vào file spool mới
+                os.replace(self.spool_path, replay_path)
+            except FileNotFoundError:
+                return None
+        return open(replay_path, "r", encoding="utf-8")
+
+    def _read_batch(self, f) -> tuple:
+        lines = [line for line in (f.readline() for _ in range(self.max_batch)) if line.strip()]
+        return lines, [json_util.loads(line) for line in lines]
+
+    def _keep_rest(self, f, failed: list, replay_path: str):
+        # Ghi lại phần chưa ghi vào MongoDB để thử lại ở lần sau
+        rest = "".join(failed) + f.read()
+        with open(replay_path + ".tmp", "w", encoding="utf-8") as out:
+            out.write(rest)
+        os.replace(replay_path + ".tmp", replay_path)
+
+    def _finish_replay(self, replay_path: str) -> bool:
+        os.remove(replay_path)
+        return os.path.exists(self.spool_path)
+
+    async def replay_spool(self) -> bool:
+        """Ghi lại các document trong file spool, trả về False nếu MongoDB vẫn lỗi."""
+        if not self.spool_path:
+            return True
+        async with self._flush_lock:
+            # Mọi thao tác file chạy trong thread như `_spool`, không chặn event loop
+            replay_path = self.spool_path + ".replay"
+            f = await asyncio.to_thread(self._open_replay, replay_path)
+            if f is None:
+                self._has_spool = False
+                return True
+
+            replayed = 0
+            try:
+                while True:
+                    lines, docs = await asyncio.to_thread(self._read_batch, f)
+                    if not lines:
+                        break
+                    try:
+                        await self._write(docs)
+                    except Exception as e:
+                        logger.error(f"[{self.name}] Spool replay failed after {replayed} documents: {e}")
+                        if isinstance(e, PartialWriteError):
+                            replayed += len(lines) - len(e.failed)
+                            lines = [json_util.dumps(doc) + "\n" for doc in e.failed]
+                        self.written += replayed
+                        await asyncio.to_thread(self._keep_rest, f, lines, replay_path)
+                        return False
+                    replayed += len(lines)
+            finally:
+                await asyncio.to_thread(f.close)
+            self._has_spool = await asyncio.to_thread(self._finish_replay, replay_path)
+            self.written += replayed
+            logger.info(f"[{self.name}] Replayed {replayed} spooled documents")
+            return True
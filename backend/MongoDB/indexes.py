@@ -0,0 +1,125 @@
+import asyncio
+import os
+import logging
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Index cần có cho từng collection
+INDEXES = {
+    "user": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+        IndexModel([("no", ASCENDING)], unique=True, name="no_unique"),
+    ],
+    "user_log": [
+        # _id đi kèm timestamp để keyset pagination (timestamp, _id) sort được bằng index
+        IndexModel([("user_no", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="user_no_timestamp_id"),
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+    ],
+    "scene": [
+        IndexModel([("user_no", ASCENDING), ("name", ASCENDING)], unique=True, name="user_no_name_unique"),
+    ],
+}
+
+
+# Collection không tạo được index ở lần gọi ensure_indexes gần nhất: tên -> lỗi
+index_failures = {}
+
+# Mã lỗi MongoDB khi dữ liệu hiện có vi phạm index unique
+DUPLICATE_KEY_CODE = 11000
+
+
+async def ensure_indexes(database: AsyncIOMotorDatabase) -> dict:
+    """
+    Tạo các index cần thiết. Gọi nhiều lần không có tác dụng phụ.
+
+    Trả về các collection không tạo được index (tên -> lỗi), cũng được giữ trong `index_failures`.
+    """
+    index_failures.clear()
+    for collection_name, indexes in INDEXES.items():
+        collection = database.get_collection(collection_name)
+        try:
+            created = await collection.create_indexes(indexes)
+            logger.info(f"Indexes ensured on '{collection_name}': {created}")
+        except OperationFailure as e:
+            index_failures[collection_name] = str(e)
+            if e.code == DUPLICATE_KEY_CODE:
+                # Dữ liệu cũ bị trùng (ví dụ email) nên index unique không tạo được và không được đảm bảo
+                logger.critical(
+                    f"Cannot create unique indexes on '{collection_name}': existing documents have duplicate values. "
+                    f"Uniqueness is NOT enforced until the duplicates are removed and the server restarts. {e}"
+                )
+            else:
+                logger.critical(f"Cannot create indexes on '{collection_name}': {e}")
+    return dict(index_failures)
+
+
+async def index_usage(database: AsyncIOMotorDatabase) -> list:
+    """Thống kê số lần sử dụng của từng index (theo $indexStats)."""
+    usage = []
+    for collection_name in INDEXES:
+        collection = database.get_collection(collection_name)
+        async for stat in collection.aggregate([{"$indexStats": {}}]):
+            usage.append({
+                "collection": collection_name,
+                "index": stat["name"],
+                "key": stat.get("key"),
+                "ops": stat.get("accesses", {}).get("ops", 0),
+                "since": stat.get("accesses", {}).get("since"),
+            })
+    return usage
+
+
+def _plan_stages(plan: dict):
+    """Duyệt toàn bộ stage trong một query plan."""
+    if not plan:
+        return
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+    if "queryPlan" in plan:
+        yield from _plan_stages(plan["queryPlan"])
+
+
+class QueryPlanChecker:
+    """
+    Kiểm tra (bằng explain) xem một truy vấn của DAL có phải quét toàn bộ
+    collection hay không và ghi cảnh báo. Mỗi dạng truy vấn chỉ được kiểm tra
+    một lần và chạy nền nên không làm chậm request.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._checked = set()
+        self.collscans = {}  # tên truy vấn -> plan stages
+
+    def check(self, collection: AsyncIOMotorCollection, name: str, filter: dict, sort: Optional[list] = None):
+        if not self.enabled:
+            return
+        shape = (collection.name, name, tuple(sorted(filter)), tuple(sort or ()))
+        if shape in self._checked:
+            return
+        self._checked.add(shape)
+        asyncio.get_running_loop().create_task(self._explain(collection, name, filter, sort))
+
+    async def _explain(self, collection: AsyncIOMotorCollection, name: str, filter: dict, sort: Optional[list]):
+        try:
+            cursor = collection.find(filter)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = await cursor.explain()
+            stages = list(_plan_stages(plan.get("queryPlanner", {}).get("winningPlan", {})))
+            if "COLLSCAN" in stages:
+                self.collscans[name] = stages
+                logger.warning(f"Query {name} on '{collection.name}' uses a collection scan: {stages}")
+        except Exception as e:
+            logger.error(f"Cannot explain query {name}: {e}")
+
+
+# Bật bằng biến môi trường MONGO_CHECK_QUERY_PLANS=1
+plan_checker = QueryPlanChecker(enabled=os.getenv("MONGO_CHECK_QUERY_PLANS", "0") == "1")
@@ -1,6 +1,7 @@
 import os
+import tempfile
 from motor.motor_asyncio import AsyncIOMotorClient
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 import logging
 
 # Import các thành phần cần thiết
@@ -8,11 +9,23 @@ from MongoDB.User.user_dal import UserDAL
 
 # Import các thành phần của UserLog
 from MongoDB.UserLog.user_log_dal import UserLogDAL
+
+# Import các thành phần của SensorReading
+from MongoDB.SensorReading.sensor_reading_dal import SensorReadingDAL, ensure_sensor_reading_collection
+
+# Import các thành phần của Scene
+from MongoDB.Scene.scene_dal import SceneDAL
+
+# Quản lý index
+from MongoDB.indexes import ensure_indexes, index_failures, index_usage, plan_checker
 # Import router từ user_log_api SẼ ĐƯỢC DI CHUYỂN XUỐNG DƯỚI
 
 # Biến toàn cục để lưu trữ các đối tượng DAL
 user_dal: UserDAL | None = None
 user_log_dal: UserLogDAL | None = None
+sensor_reading_dal: SensorReadingDAL | None = None
+scene_dal: SceneDAL | None = None
+database = None # AsyncIOMotorDatabase, dùng cho các thao tác quản trị (index, thống kê)
 # Thêm các biến DAL khác ở đây nếu cần (ví dụ: device_dal = None)
 
 # Router chính của MongoDB module, tiền tố /api sẽ được thêm ở main.py
@@ -39,17 +52,32 @@ async def get_user_log_dal() -> UserLogDAL:
         raise Exception("UserLogDAL chưa được khởi tạo.")
     return user_log_dal
 
+async def get_sensor_reading_dal() -> SensorReadingDAL:
+    """Dependency function để inject SensorReadingDAL."""
+    if sensor_reading_dal is None:
+        logger.error("Attempted to get SensorReadingDAL before initialization!")
+        raise Exception("SensorReadingDAL chưa được khởi tạo.")
+    return sensor_reading_dal
+
+async def get_scene_dal() -> SceneDAL:
+    """Dependency function để inject SceneDAL."""
+    if scene_dal is None:
+        logger.error("Attempted to get SceneDAL before initialization!")
+        raise Exception("SceneDAL chưa được khởi tạo.")
+    return scene_dal
+
 # Thêm các dependency cho DAL khác ở đây nếu cần
 
 # === Import API Routers ===
 # Import các router SAU KHI các dependency đã được định nghĩa
 from MongoDB.User.user_api import router as user_api_router
 from MongoDB.UserLog.user_log_api import router as user_log_api_router
+from MongoDB.Scene.scene_api import router as scene_api_router
 
 # === Database Initialization ===
 async def init_db():
     """Khởi tạo kết nối MongoDB và các đối tượng DAL."""
-    global user_dal, user_log_dal
+    global user_dal, user_log_dal, sensor_reading_dal, scene_dal, database
     logger.info("--- Vercel Log: Starting init_db ---")
     try:
         # Đọc biến môi trường
@@ -82,18 +110,46 @@ async def init_db():
         database = client[db_name]
         logger.info(f"--- Vercel Log: Selected database: {db_name}")
 
+        # Tạo index cho user và user_log (idempotent)
+        logger.info("--- Vercel Log: Ensuring indexes...")
+        failed_indexes = await ensure_indexes(database)
+        if failed_indexes:
+            logger.critical(
+                f"--- Vercel Log: INDEXES MISSING on {sorted(failed_indexes)}; see /api/db/index-usage for details ---"
+            )
+
         # Khởi tạo UserDAL
         logger.info("--- Vercel Log: Initializing UserDAL...")
         users_collection = database.get_collection("user")
-        user_dal = UserDAL(users_collection)
+        counters_collection = database.get_collection("counters")
+        user_dal = UserDAL(users_collection, counters_collection)
+        await user_dal.init_counter()
         logger.info(f"--- Vercel Log: UserDAL initialized: {user_dal is not None}")
 
         # Khởi tạo UserLogDAL
         logger.info("--- Vercel Log: Initializing UserLogDAL...")
         user_logs_collection = database.get_collection("user_log")
-        user_log_dal = UserLogDAL(user_logs_collection)
+        user_log_dal = UserLogDAL(
+            user_logs_collection,
+            flush_interval=float(os.getenv("USER_LOG_FLUSH_INTERVAL", "2")),
+            spool_path=os.getenv("USER_LOG_SPOOL_PATH", os.path.join(tempfile.gettempdir(), "smartdkdh_user_log.spool")),
+        )
         logger.info(f"--- Vercel Log: UserLogDAL initialized: {user_log_dal is not None}")
 
+        # Khởi tạo SensorReadingDAL (time-series collection, ghi theo batch)
+        logger.info("--- Vercel Log: Initializing SensorReadingDAL...")
+        sensor_reading_collection = await ensure_sensor_reading_collection(database)
+        sensor_reading_dal = SensorReadingDAL(
+            sensor_reading_collection,
+            flush_interval=float(os.getenv("SENSOR_FLUSH_INTERVAL", "10")),
+        )
+        logger.info(f"--- Vercel Log: SensorReadingDAL initialized: {sensor_reading_dal is not None}")
+
+        # Khởi tạo SceneDAL
+        logger.info("--- Vercel Log: Initializing SceneDAL...")
+        scene_dal = SceneDAL(database.get_collection("scene"))
+        logger.info(f"--- Vercel Log: SceneDAL initialized: {scene_dal is not None}")
+
         logger.info("--- Vercel Log: init_db finished successfully ---")
         return client
 
@@ -101,6 +157,18 @@ async def init_db():
         logger.critical(f"--- Vercel Log: CRITICAL ERROR in init_db: {type(e).__name__} - {e} ---", exc_info=True)
         raise e
 
+# === Admin Endpoints ===
+@router.get("/db/index-usage", tags=["db"])
+async def get_index_usage():
+    """Thống kê sử dụng index và các truy vấn DAL bị phát hiện quét toàn collection."""
+    if database is None:
+        raise HTTPException(status_code=503, detail="Database chưa được khởi tạo.")
+    return {
+        "indexes": await index_usage(database),
+        "collection_scans": plan_checker.collscans,
+        "index_failures": index_failures,
+    }
+
 # === Include Routers ===
 # Tích hợp router của user API vào router chính của MongoDB
 router.include_router(user_api_router)
@@ -108,6 +176,9 @@ router.include_router(user_api_router)
 # Tích hợp router của user log API
 router.include_router(user_log_api_router)
 
+# Tích hợp router của scene API
+router.include_router(scene_api_router)
+
 # Tích hợp các router khác ở đây nếu có
 # ví dụ: router.include_router(device_api_router)
 
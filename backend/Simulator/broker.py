@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import struct
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Loại gói MQTT 3.1.1 mà broker xử lý
+CONNECT, PUBLISH, PUBACK, SUBSCRIBE, UNSUBSCRIBE, PINGREQ, DISCONNECT = 1, 3, 4, 8, 10, 12, 14
+
+
+def encode_length(n: int) -> bytes:
+    """Mã hóa "remaining length" của MQTT (1-4 byte)."""
+    out = bytearray()
+    while True:
+        byte, n = n % 128, n // 128
+        out.append(byte | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def publish_packet(topic: str, payload: bytes) -> bytes:
+    body = struct.pack("!H", len(topic)) + topic.encode() + payload
+    return bytes([PUBLISH << 4]) + encode_length(len(body)) + body
+
+
+class LocalBroker:
+    """
+    Broker MQTT 3.1.1 tối giản thay cho Adafruit IO khi chạy giả lập/đo tải ở local.
+
+    Chỉ hỗ trợ những gì backend dùng: CONNECT (không kiểm tra key), SUBSCRIBE/UNSUBSCRIBE
+    theo topic chính xác, PUBLISH QoS 0/1 (trả PUBACK, không gửi lại), topic `<feed>/get`
+    trả về giá trị cuối của feed, PINGREQ và DISCONNECT. Mọi message được chuyển tiếp
+    tới subscriber bằng QoS 0, kể cả client đã publish (giống Adafruit IO).
+
+    Kèm theo một REST stand-in cho `GET /{username}/feeds` để backend lấy danh sách feed
+    (đặt ADAFRUIT_API_URL=http://host:port).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", mqtt_port: int = 0, http_port: int = 0):
+        self.host = host
+        self.mqtt_port = mqtt_port
+        self.http_port = http_port
+        self._subscribers = {}  # topic -> set StreamWriter
+        self._writers = set()
+        self._feeds = {}  # username -> {feed_key: {"key", "description", "last_value", ...}}
+        self._server = None
+        self._runner = None
+        self.received = 0  # PUBLISH nhận từ client
+        self.delivered = 0  # PUBLISH gửi tới subscriber
+
+    # ---- Feed ----
+    def add_feed(self, username: str, key: str, description: str, last_value: str = "0", unit: str = None):
+        feed = {"key": key, "name": key, "description": description, "last_value": str(last_value)}
+        if unit is not None:
+            feed["unit_symbol"] = unit
+        self._feeds.setdefault(username, {})[key] = feed
+
+    def feeds(self, username: str) -> list:
+        return list(self._feeds.get(username, {}).values())
+
+    def client_count(self) -> int:
+        return len(self._writers)
+
+    # ---- Publish ----
+    def publish(self, topic: str, payload) -> int:
+        """Publish từ trong process (thiết bị giả lập), trả về số subscriber nhận được."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        parts = topic.split("/")
+        if len(parts) == 3 and parts[1] == "feeds":
+            feed = self._feeds.get(parts[0], {}).get(parts[2])
+            if feed is not None:
+                feed["last_value"] = payload.decode(errors="replace")
+        writers = self._subscribers.get(topic)
+        if not writers:
+            return 0
+        packet = publish_packet(topic, payload)
+        for writer in writers:
+            writer.write(packet)
+        self.delivered += len(writers)
+        return len(writers)
+
+    def _last_value(self, topic: str):
+        parts = topic.split("/")
+        if len(parts) != 3 or parts[1] != "feeds":
+            return None
+        feed = self._feeds.get(parts[0], {}).get(parts[2])
+        return None if feed is None else feed["last_value"]
+
+    # ---- Kết nối MQTT ----
+    async def _read_packet(self, reader: asyncio.StreamReader):
+        header = (await reader.readexactly(1))[0]
+        multiplier, length = 1, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 127) * multiplier
+            multiplier *= 128
+            if not byte & 128:
+                break
+        return header, await reader.readexactly(length)
+
+    def _handle_publish(self, header: int, body: bytes, writer: asyncio.StreamWriter):
+        qos = (header >> 1) & 3
+        length = struct.unpack("!H", body[:2])[0]
+        topic = body[2:2 + length].decode()
+        index = 2 + length
+        if qos:
+            writer.write(bytes([PUBACK << 4, 2]) + body[index:index + 2])
+            index += 2
+        self.received += 1
+        if topic.endswith("/get"):
+            # Adafruit IO: publish vào <feed>/get để nhận lại giá trị cuối của feed
+            topic = topic[:-4]
+            value = self._last_value(topic)
+            if value is not None and writer in self._subscribers.get(topic, ()):
+                writer.write(publish_packet(topic, value.encode()))
+                self.delivered += 1
+            return
+        self.publish(topic, body[index:])
+
+    def _handle_subscribe(self, body: bytes, writer: asyncio.StreamWriter, unsubscribe: bool):
+        index, codes = 2, b""
+        while index < len(body):
+            length = struct.unpack("!H", body[index:index + 2])[0]
+            topic = body[index + 2:index + 2 + length].decode()
+            index += 2 + length
+            if unsubscribe:
+                writers = self._subscribers.get(topic)
+                if writers is not None:
+                    writers.discard(writer)
+                    if not writers:
+                        del self._subscribers[topic]
+            else:
+                index += 1  # QoS yêu cầu, luôn cấp QoS 0
+                self._subscribers.setdefault(topic, set()).add(writer)
+                codes += b"\x00"
+        if unsubscribe:
+            writer.write(bytes([0xB0, 2]) + body[:2])
+        else:
+            writer.write(bytes([0x90]) + encode_length(2 + len(codes)) + body[:2] + codes)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                header, body = await self._read_packet(reader)
+                packet_type = header >> 4
+                if packet_type == CONNECT:
+                    writer.write(b"\x20\x02\x00\x00")
+                elif packet_type == PUBLISH:
+                    self._handle_publish(header, body, writer)
+                elif packet_type == SUBSCRIBE:
+                    self._handle_subscribe(body, writer, unsubscribe=False)
+                elif packet_type == UNSUBSCRIBE:
+                    self._handle_subscribe(body, writer, unsubscribe=True)
+                elif packet_type == PINGREQ:
+                    writer.write(b"\xd0\x00")
+                elif packet_type == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Lỗi xử lý client MQTT: {e}")
+        finally:
+            self._drop_writer(writer)
+
+    def _drop_writer(self, writer: asyncio.StreamWriter):
+        self._writers.discard(writer)
+        for topic in [topic for topic, writers in self._subscribers.items() if writer in writers]:
+            self._subscribers[topic].discard(writer)
+            if not self._subscribers[topic]:
+                del self._subscribers[topic]
+        writer.close()
+
+    def disconnect_all(self):
+        """Đóng mọi kết nối MQTT (giả lập broker bị gián đoạn)."""
+        for writer in list(self._writers):
+            self._drop_writer(writer)
+
+    # ---- REST stand-in ----
+    async def _list_feeds(self, request: web.Request):
+        return web.Response(text=json.dumps(self.feeds(request.match_info["username"])), content_type="application/json")
+
+    # ---- Vòng đời ----
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.mqtt_port)
+        self.mqtt_port = self._server.sockets[0].getsockname()[1]
+        app = web.Application()
+        app.router.add_get("/{username}/feeds", self._list_feeds)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.http_port)
+        await site.start()
+        self.http_port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Local broker: mqtt://{self.host}:{self.mqtt_port}, http://{self.host}:{self.http_port}")
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.http_port}"
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self.disconnect_all()
+            await self._server.wait_closed()
+            self._server = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
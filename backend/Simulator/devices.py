@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+
+from Simulator.broker import LocalBroker
+
+logger = logging.getLogger(__name__)
+
+SENSORS = (
+    ("dadn-temp", "Nhiệt độ", "°C"),
+    ("dadn-light", "Ánh sáng", "%"),
+    ("dadn-humi", "Độ ẩm", "%"),
+)
+
+
+class SimulatedFeed:
+    """Một feed giả lập của một home (tài khoản Adafruit)."""
+
+    __slots__ = ("username", "key", "kind", "topic", "value", "timestamp_values")
+
+    def __init__(self, username: str, key: str, kind: str, value: str, timestamp_values: bool = False):
+        self.username = username
+        self.key = key
+        self.kind = kind
+        self.topic = f"{username}/feeds/{key}"
+        self.value = value
+        self.timestamp_values = timestamp_values
+
+    def next_value(self, sequence: int) -> str:
+        if self.kind == "led":
+            self.value = "0" if self.value == "1" else "1"
+        elif self.kind == "fan":
+            self.value = str(random.choice(range(0, 101, 10)))
+        elif self.timestamp_values:
+            # Thời điểm publish (epoch) làm giá trị: process khác đo được độ trễ mà không cần chia sẻ `sent`
+            self.value = f"{time.time():.6f}"
+        else:
+            # Giá trị cảm biến luôn khác nhau để đo độ trễ theo từng message
+            self.value = str(sequence)
+        return self.value
+
+
+class DeviceSimulator:
+    """
+    Sinh các home giả lập trên LocalBroker: mỗi home có 3 cảm biến, `leds` đèn và `fans` quạt,
+    mỗi feed publish `rate` message/giây (lệch pha ngẫu nhiên để không dồn cùng lúc).
+
+    Thời điểm publish của mỗi giá trị cảm biến được ghi lại trong `sent` để đo độ trễ tới
+    client; các giá trị quá `sent_ttl` giây được dọn định kỳ. Với `timestamp_values`, giá trị cảm biến
+    là thời điểm publish (time.time()) để đo độ trễ ở process khác.
+    """
+
+    def __init__(
+        self,
+        broker: LocalBroker,
+        leds: int = 2,
+        fans: int = 1,
+        rate: float = 1.0,
+        sent_ttl: float = 30,
+        timestamp_values: bool = False,
+    ):
+        self.broker = broker
+        self.leds = leds
+        self.fans = fans
+        self.rate = rate
+        self.sent_ttl = sent_ttl
+        self.timestamp_values = timestamp_values
+        self.homes = []  # username
+        self.feeds = []
+        self.sent = {}  # giá trị cảm biến -> time.perf_counter() lúc publish
+        self.published = 0
+        self._sequence = itertools.count(1)
+        self._tasks = []
+        self._running = False
+
+    def add_home(self, username: str = None) -> str:
+        """Tạo feed cho một home mới; trả về username."""
+        username = username or f"sim-home-{len(self.homes) + 1}"
+        feeds = [SimulatedFeed(username, key, "sensor", "0", self.timestamp_values) for key, _, _ in SENSORS]
+        for key, description, unit in SENSORS:
+            self.broker.add_feed(username, key, description, "0", unit)
+        for n in range(1, self.leds + 1):
+            self.broker.add_feed(username, f"dadn-led-{n}", f"Đèn {n}", "0")
+            feeds.append(SimulatedFeed(username, f"dadn-led-{n}", "led", "0"))
+        for n in range(1, self.fans + 1):
+            self.broker.add_feed(username, f"dadn-fan-{n}", f"Quạt {n}", "0")
+            feeds.append(SimulatedFeed(username, f"dadn-fan-{n}", "fan", "0"))
+        self.homes.append(username)
+        self.feeds.extend(feeds)
+        if self._running:
+            self._tasks.extend(asyncio.create_task(self._run_feed(feed)) for feed in feeds)
+        return username
+
+    def feed_count(self) -> int:
+        return len(self.feeds)
+
+    async def _run_feed(self, feed: SimulatedFeed):
+        interval = 1 / self.rate
+        await asyncio.sleep(random.uniform(0, interval))
+        next_at = time.perf_counter()
+        while True:
+            sequence = next(self._sequence)
+            value = feed.next_value(sequence)
+            if feed.kind == "sensor" and not self.timestamp_values:
+                self.sent[value] = time.perf_counter()
+            self.broker.publish(feed.topic, value)
+            self.published += 1
+            # Giữ nhịp cố định, không cộng dồn thời gian xử lý
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+    async def _cleanup(self):
+        while True:
+            await asyncio.sleep(self.sent_ttl)
+            deadline = time.perf_counter() - self.sent_ttl
+            for value in [value for value, sent_at in self.sent.items() if sent_at < deadline]:
+                del self.sent[value]
+
+    def start(self):
+        self._running = True
+        self._tasks = [asyncio.create_task(self._run_feed(feed)) for feed in self.feeds]
+        self._tasks.append(asyncio.create_task(self._cleanup()))
+
+    async def stop(self):
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+async def _serve(args):
+    broker = LocalBroker(args.host, args.mqtt_port, args.http_port)
+    await broker.start()
+    simulator = DeviceSimulator(broker, leds=args.leds, fans=args.fans, rate=args.rate)
+    for _ in range(args.homes):
+        simulator.add_home()
+    simulator.start()
+    print(f"MQTT_BROKER_HOST={args.host} MQTT_BROKER_PORT={broker.mqtt_port} MQTT_BROKER_SECURE=0")
+    print(f"ADAFRUIT_API_URL={broker.api_url}")
+    print(f"Homes: {', '.join(simulator.homes)} ({simulator.feed_count()} feeds, {args.rate} msg/s mỗi feed)")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(f"published={simulator.published} delivered={broker.delivered} clients={broker.client_count()}")
+    finally:
+        await simulator.stop()
+        await broker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy broker MQTT local và các thiết bị giả lập cho backend.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--mqtt-port", type=int, default=1883)
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--homes", type=int, default=1)
+    parser.add_argument("--leds", type=int, default=2)
+    parser.add_argument("--fans", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=1.0, help="message/giây cho mỗi feed")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Đo tải backend với broker và thiết bị giả lập.
+
+Chạy từ thư mục backend:
+
+    python -m Simulator.load_report --homes 1,10,50 --leds 2 --fans 1 --rate 1 --duration 10
+
+Mỗi bước tăng số home lên mức tiếp theo (thiết bị cũ giữ nguyên), khởi tạo thiết bị backend
+như khi đăng nhập (lấy feed qua REST, init_devices, một kết nối MQTT cho mỗi home), gắn
+`--clients` client vào hub WebSocket của mỗi home rồi đo: số message/giây, độ trễ từ lúc
+thiết bị publish tới lúc client nhận delta (p50/p95/p99), bộ nhớ RSS và số thread.
+
+Với `--ws-url` (ví dụ ws://localhost:8000/ws?user_no={user_no}&deltas=1) harness kết nối WebSocket thật
+tới một backend đang chạy thay vì dùng hub trong process; backend phải trỏ tới broker này
+(xem Simulator.devices) và user tương ứng đã đăng nhập với username Adafruit là sim-home-N.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import threading
+import time
+from functools import partial
+
+from Simulator.broker import LocalBroker
+from Simulator.devices import DeviceSimulator
+
+
+def percentile(values: list, p: float):
+    """Phân vị theo nearest-rank, None nếu không có mẫu."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def process_memory() -> dict:
+    """RSS hiện tại (MB) và số thread của process."""
+    rss_kb, threads = None, None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_kb = int(line.split()[1])
+                elif line.startswith("Threads:"):
+                    threads = int(line.split()[1])
+    except OSError:
+        pass
+    if rss_kb is None:
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # đỉnh RSS, kB trên Linux
+    return {"rss_mb": round(rss_kb / 1024, 1), "threads": threads or threading.active_count()}
+
+
+class LatencyProbe:
+    """Gom độ trễ của các delta cảm biến mà client nhận được."""
+
+    def __init__(self, sent: dict):
+        self.sent = sent
+        self.latencies = []
+        self.messages = 0
+        self.resyncs = 0
+
+    def record(self, text):
+        if text is None:
+            self.resyncs += 1  # client chậm, hub yêu cầu gửi lại snapshot
+            return
+        received_at = time.perf_counter()
+        self.messages += 1
+        message = json.loads(text)
+        for value in message.get("sensor_values", {}).values():
+            sent_at = self.sent.get(str(value))
+            if sent_at is not None:
+                self.latencies.append((received_at - sent_at) * 1000)
+
+    def reset(self):
+        self.latencies = []
+        self.messages = 0
+        self.resyncs = 0
+
+
+class InProcessBackend:
+    """Thiết bị backend (LED/Fan/Sensor) và client hub trong cùng process với broker."""
+
+    def __init__(self, key: str, clients: int, probe: LatencyProbe):
+        # Import sau khi đã đặt biến môi trường trỏ tới broker local
+        import mqtt_service
+        from ws_hub import hub
+        from Device import device_loader, fan_controller, led_controller, sensor_controller
+
+        self.key = key
+        self.clients = clients
+        self.probe = probe
+        self.hub = hub
+        self.connection_manager = mqtt_service.connection_manager
+        self.device_loader = device_loader
+        self.controllers = (led_controller, fan_controller, sensor_controller)
+        self.devices = []
+        self.failures = []
+        self._hub_clients = []
+        self._tasks = []
+        hub.bind_loop(asyncio.get_running_loop())
+
+    async def add_home(self, username: str):
+        led_controller, fan_controller, sensor_controller = self.controllers
+        led_feeds, fan_feeds, sensor_feeds = await asyncio.gather(
+            led_controller.fetch_led_feeds(username, self.key),
+            fan_controller.fetch_fan_feeds(username, self.key),
+            sensor_controller.fetch_sensor_feeds(username, self.key),
+        )
+        factories = []
+        for feed_id, description, last_value in led_feeds:
+            factories.append((feed_id, partial(led_controller.LEDDevice, feed_id, description, last_value, username, self.key)))
+        for feed_id, description, last_value in fan_feeds:
+            factories.append((feed_id, partial(fan_controller.FanDevice, feed_id, description, last_value, username, self.key)))
+        for feed_id, description, last_value, unit in sensor_feeds:
+            factories.append((feed_id, partial(
+                sensor_controller.SensorDevice, feed_id, description, last_value, unit, username, self.key
+            )))
+        devices, failures = await self.device_loader.init_devices(factories)
+        self.devices.extend(devices.values())
+        self.failures.extend(failures)
+        for _ in range(self.clients):
+            client = self.hub.register(username, deltas=True)
+            self._hub_clients.append(client)
+            self._tasks.append(asyncio.create_task(self._consume(client)))
+
+    async def _consume(self, client):
+        while True:
+            self.probe.record(await client.next_message())
+
+    async def wait_online(self, timeout: float = 10):
+        """Chờ tất cả kết nối MQTT đã subscribe xong."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            connections = list(self.connection_manager._connections.values())
+            if all(connection.online for connection in connections):
+                return True
+            await asyncio.sleep(0.1)
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self.devices),
+            "failed_devices": len(self.failures),
+            "mqtt_connections": self.connection_manager.connection_count(),
+            "ws_clients": self.hub.client_count(),
+            "client_drops": sum(client.dropped for client in self._hub_clients),
+        }
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for client in self._hub_clients:
+            self.hub.unregister(client)
+        await self.device_loader.disconnect_devices(self.devices)
+        from adafruit_feeds import feed_client
+        await feed_client.close()
+
+
+class WebSocketClients:
+    """Client WebSocket thật tới một backend đang chạy (`--ws-url`)."""
+
+    def __init__(self, url: str, clients: int, probe: LatencyProbe):
+        self.url = url
+        self.clients = clients
+        self.probe = probe
+        self.connected = 0
+        self._tasks = []
+
+    async def add_home(self, username: str):
+        user_no = username.rsplit("-", 1)[-1]
+        for _ in range(self.clients):
+            self._tasks.append(asyncio.create_task(self._consume(self.url.format(user_no=user_no, username=username))))
+
+    async def _consume(self, url: str):
+        import websockets
+
+        async with websockets.connect(url) as websocket:
+            self.connected += 1
+            try:
+                async for text in websocket:
+                    message = json.loads(text)
+                    if message.get("type") == "delta":
+                        self.probe.record(text)
+            finally:
+                self.connected -= 1
+
+    async def wait_online(self, timeout: float = 10):
+        await asyncio.sleep(1)
+        return True
+
+    def stats(self) -> dict:
+        return {"ws_clients": self.connected}
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def run_report(args) -> dict:
+    broker = LocalBroker(mqtt_port=args.mqtt_port, http_port=args.http_port)
+    await broker.start()
+    os.environ.update({
+        "MQTT_BROKER_HOST": broker.host,
+        "MQTT_BROKER_PORT": str(broker.mqtt_port),
+        "MQTT_BROKER_SECURE": "0",
+        "ADAFRUIT_API_URL": broker.api_url,
+    })
+    simulator = DeviceSimulator(broker, leds=args.leds, fans=args.fans, rate=args.rate)
+    probe = LatencyProbe(simulator.sent)
+    if args.ws_url:
+        backend = WebSocketClients(args.ws_url, args.clients, probe)
+    else:
+        backend = InProcessBackend("sim-key", args.clients, probe)
+    simulator.start()
+    steps = []
+    try:
+        for homes in args.homes:
+            setup_started = time.perf_counter()
+            while len(simulator.homes) < homes:
+                await backend.add_home(simulator.add_home())
+            online = await backend.wait_online()
+            setup_s = time.perf_counter() - setup_started
+            await asyncio.sleep(args.warmup)
+
+            probe.reset()
+            published, delivered = simulator.published, broker.delivered
+            started = time.perf_counter()
+            await asyncio.sleep(args.duration)
+            elapsed = time.perf_counter() - started
+            latencies = probe.latencies
+            steps.append({
+                "homes": homes,
+                "feeds": simulator.feed_count(),
+                "online": online,
+                "setup_s": round(setup_s, 2),
+                "published_per_s": round((simulator.published - published) / elapsed, 1),
+                "mqtt_delivered_per_s": round((broker.delivered - delivered) / elapsed, 1),
+                "ws_messages_per_s": round(probe.messages / elapsed, 1),
+                "latency_samples": len(latencies),
+                "latency_ms": {
+                    f"p{p}": None if not latencies else round(percentile(latencies, p), 2) for p in (50, 95, 99)
+                },
+                "resyncs": probe.resyncs,
+                **backend.stats(),
+                **process_memory(),
+            })
+    finally:
+        await simulator.stop()
+        await backend.close()
+        await broker.stop()
+    return {
+        "config": {
+            "leds": args.leds,
+            "fans": args.fans,
+            "rate": args.rate,
+            "clients": args.clients,
+            "duration": args.duration,
+            "mode": "websocket" if args.ws_url else "in-process",
+        },
+        "steps": steps,
+    }
+
+
+def format_table(report: dict) -> str:
+    columns = (
+        ("homes", "homes"), ("feeds", "feeds"), ("pub/s", "published_per_s"), ("ws msg/s", "ws_messages_per_s"),
+        ("p50 ms", "p50"), ("p95 ms", "p95"), ("p99 ms", "p99"), ("resync", "resyncs"),
+        ("RSS MB", "rss_mb"), ("threads", "threads"),
+    )
+    rows = [[title for title, _ in columns]]
+    for step in report["steps"]:
+        values = {**step, **step["latency_ms"]}
+        rows.append(["-" if values.get(key) is None else str(values[key]) for _, key in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo throughput, độ trễ tới WebSocket và bộ nhớ theo số thiết bị.")
+    parser.add_argument("--homes", default="1,5,10", help="các mức số home, ví dụ 1,10,50")
+    parser.add_argument("--leds", type=int, default=2)
+    parser.add_argument("--fans", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=1.0, help="message/giây cho mỗi feed")
+    parser.add_argument("--clients", type=int, default=1, help="số client WebSocket cho mỗi home")
+    parser.add_argument("--duration", type=float, default=10, help="số giây đo cho mỗi bước")
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--mqtt-port", type=int, default=0)
+    parser.add_argument("--http-port", type=int, default=0)
+    parser.add_argument("--ws-url", help="URL WebSocket của backend đang chạy, có thể chứa {user_no}/{username}")
+    parser.add_argument("--json", help="ghi báo cáo JSON ra file")
+    parser.add_argument("--verbose", action="store_true", help="hiện log của backend")
+    args = parser.parse_args()
+    args.homes = sorted(int(n) for n in args.homes.split(","))
+
+    # Backend in log cho từng message MQTT; tắt đi để không ảnh hưởng kết quả đo
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with output:
+        report = asyncio.run(run_report(args))
+    print(format_table(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import time
+import wave
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+from pydub import AudioSegment
+
+from Speech.recognizers import SPEECH_BACKEND, SpeechRecognizerBackend, create_recognizer
+from Speech.vad import VAD_ENABLED, trim_silence
+
+logger = logging.getLogger(__name__)
+
+# Số process giải mã audio chạy song song (0 = dùng thread thay cho process)
+SPEECH_WORKERS = int(os.getenv("SPEECH_WORKERS", str(min(4, os.cpu_count() or 1))))
+SAMPLE_RATE = 16000
+# Không dùng fork: pool được tạo khi process đã có thread MQTT/pymongo, fork có thể kẹt ở lock
+# do các thread đó đang giữ. forkserver/spawn khởi động worker từ một process sạch.
+WORKER_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Backend của worker hiện tại (mỗi process trong pool giữ một bản, nạp model một lần)
+_worker_backend: Optional[SpeechRecognizerBackend] = None
+
+
+def decode_to_wav(content: bytes, audio_format: str = "m4a") -> tuple:
+    """
+    Giải mã audio (m4a, mp3, ...) sang WAV mono 16 kHz 16-bit hoàn toàn trong bộ nhớ,
+    cắt im lặng đầu/cuối bằng VAD. Trả về (wav, thống kê audio).
+    pydub tự tạo file tạm riêng cho ffmpeg nên các request song song không ghi đè lên nhau.
+    """
+    segment = AudioSegment.from_file(io.BytesIO(content), format=audio_format)
+    segment = segment.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+    samples = np.frombuffer(segment.raw_data, dtype=np.int16)
+    stats = {"duration_ms": round(len(samples) * 1000 / SAMPLE_RATE, 1), "trimmed_ms": 0.0}
+    if VAD_ENABLED:
+        samples, removed_ms = trim_silence(samples, SAMPLE_RATE)
+        stats["trimmed_ms"] = round(removed_ms, 1)
+
+    output = io.BytesIO()
+    with wave.open(output, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+    return output.getvalue(), stats
+
+
+def _init_worker(backend_name: Optional[str]):
+    global _worker_backend
+    if backend_name is None:
+        return
+    _worker_backend = create_recognizer(backend_name)
+    _worker_backend.load()
+
+
+def _warm_up() -> bool:
+    return _worker_backend is not None
+
+
+def _transcribe_job(content: bytes, audio_format: str):
+    """Giải mã và nhận dạng ngay trong worker (cho backend offline), trả về thời gian từng bước."""
+    started = time.perf_counter()
+    wav, audio_stats = decode_to_wav(content, audio_format)
+    decoded = time.perf_counter()
+    text = _worker_backend.recognize(wav)
+    return text, audio_stats, decoded - started, time.perf_counter() - decoded
+
+
+def audio_format_of(filename: Optional[str], default: str = "m4a") -> str:
+    """Lấy định dạng audio từ phần mở rộng của tên file upload."""
+    ext = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    return ext or default
+
+
+class AudioPipeline:
+    """
+    Chuyển audio upload thành văn bản mà không chặn event loop.
+    Giải mã (CPU) chạy trong process pool giới hạn số worker. Backend offline nhận dạng
+    luôn trong worker đó (model nạp sẵn ở mỗi worker); backend online nhận dạng trong thread.
+    """
+
+    def __init__(self, backend: str = SPEECH_BACKEND, workers: int = SPEECH_WORKERS):
+        self.backend = create_recognizer(backend)
+        self.workers = workers
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            initargs = (self.backend.name if self.backend.offline else None,)
+            if self.workers > 0:
+                try:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, initializer=_init_worker, initargs=initargs,
+                        mp_context=multiprocessing.get_context(WORKER_START_METHOD),
+                    )
+                except (OSError, NotImplementedError) as e:
+                    # Ví dụ môi trường serverless không hỗ trợ multiprocessing
+                    logger.warning(f"Cannot create process pool ({e}), decoding audio in threads")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(self.workers, 1), thread_name_prefix="audio",
+                    initializer=_init_worker, initargs=initargs,
+                )
+        return self._executor
+
+    async def start(self):
+        """Tạo pool, khởi động mọi worker (nạp model offline nếu có) ngay khi khởi động thay vì ở request đầu."""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(executor, _warm_up) for _ in range(max(self.workers, 1))))
+        except Exception as e:
+            self.close()
+            if not self.backend.offline:
+                logger.error(f"Cannot start audio workers: {e}")
+                return
+            # Không nạp được model (thiếu gói/model): quay về backend online để API vẫn hoạt động
+            logger.error(f"Cannot load speech backend '{self.backend.name}': {e}, falling back to google")
+            self.backend = create_recognizer("google")
+            return
+        logger.info(f"Speech backend '{self.backend.name}' ready in {max(self.workers, 1)} workers")
+
+    async def decode(self, content: bytes, audio_format: str = "m4a") -> tuple:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), decode_to_wav, content, audio_format)
+
+    async def transcribe(self, content: bytes, audio_format: str = "m4a") -> dict:
+        """
+        Trả về văn bản cùng backend, thống kê audio (độ dài, phần im lặng đã cắt)
+        và độ trễ (ms) của từng bước. Ném NoSpeechError nếu clip không có giọng nói.
+        """
+        started = time.perf_counter()
+        if self.backend.offline:
+            loop = asyncio.get_running_loop()
+            text, audio_stats, decode_s, recognition_s = await loop.run_in_executor(
+                self._get_executor(), _transcribe_job, content, audio_format
+            )
+        else:
+            wav, audio_stats = await self.decode(content, audio_format)
+            decode_s = time.perf_counter() - started
+            text = await asyncio.to_thread(self.backend.recognize, wav)
+            recognition_s = time.perf_counter() - started - decode_s
+        return {
+            "text": text,
+            "backend": self.backend.name,
+            "audio": audio_stats,
+            "latency_ms": {
+                "decode": round(decode_s * 1000, 1),
+                "recognition": round(recognition_s * 1000, 1),
+                "total": round((time.perf_counter() - started) * 1000, 1),
+            },
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+audio_pipeline = AudioPipeline()
@@ -0,0 +1,155 @@
+import asyncio
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import BaseModel
+
+import app_state
+from Device.batch_controller import DeviceCommand, apply_command, validate_commands
+
+# Các mẫu được biên dịch một lần, áp dụng trên văn bản đã bỏ dấu (xem normalize)
+FAN_RE = re.compile(r"\bquat\b")
+LIGHT_RE = re.compile(r"\b(den|led)\b")
+ALL_RE = re.compile(r"\b(tat ca|het|toan bo)\b")
+ON_RE = re.compile(r"\b(bat|mo)\b")
+OFF_RE = re.compile(r"\btat\b")
+INCREASE_RE = re.compile(r"\btang\b")
+DECREASE_RE = re.compile(r"\bgiam\b")
+NUMBER_RE = re.compile(r"\b(\d{1,3})\b")
+# Mức quạt chỉ là số đi kèm từ chỉ mức: "mức 70", "tốc độ 70", "70%", "70 phần trăm"
+LEVEL_RE = re.compile(r"\b(?:muc|toc do)\s*(\d{1,3})\b|\b(\d{1,3})\s*(?:%|phan tram\b)")
+
+
+def normalize(text: str) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt (kể cả đ) và gộp khoảng trắng."""
+    text = unicodedata.normalize("NFD", text.lower().replace("đ", "d"))
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return " ".join(text.split())
+
+
+@lru_cache(maxsize=256)
+def _description_matcher(descriptions: tuple) -> Optional[re.Pattern]:
+    """Regex khớp mô tả thiết bị, mô tả dài được ưu tiên (ví dụ "phong khach 2" trước "phong khach")."""
+    names = sorted({name for name in descriptions if name}, key=len, reverse=True)
+    if not names:
+        return None
+    return re.compile(r"\b(" + "|".join(re.escape(name) for name in names) + r")\b")
+
+
+def _device_names(devices: dict) -> tuple:
+    by_name = {}
+    for device_id, device in devices.items():
+        by_name.setdefault(normalize(device.description or ""), []).append(device_id)
+    return by_name, _description_matcher(tuple(sorted(by_name)))
+
+
+def remove_device_names(text: str, devices: dict) -> str:
+    """Bỏ mô tả thiết bị khỏi câu lệnh để số trong tên (ví dụ "quat 2") không bị hiểu là giá trị."""
+    _, matcher = _device_names(devices)
+    return matcher.sub(" ", text) if matcher is not None else text
+
+
+def match_devices(text: str, devices: dict) -> list:
+    """Tìm các thiết bị có mô tả xuất hiện trong câu lệnh (đã normalize)."""
+    by_name, matcher = _device_names(devices)
+    if matcher is None:
+        return []
+    matched = []
+    for name in matcher.findall(text):
+        matched.extend(device_id for device_id in by_name[name] if device_id not in matched)
+    return matched
+
+
+class VoiceIntent(BaseModel):
+    device_type: str  # "fan" hoặc "led"
+    action: str  # on, off, increase, decrease, set
+    value: Optional[int] = None  # mức quạt 0-100 khi action = "set"
+    device_ids: list[str]
+
+    @property
+    def command_type(self) -> str:
+        return f"{self.device_type}_{self.action}"
+
+
+def _fan_intent(text: str, session: app_state.UserSession) -> Optional[VoiceIntent]:
+    device_ids = match_devices(text, session.fan_devices)
+    text = remove_device_names(text, session.fan_devices)
+    levels = [int(match.group(1) or match.group(2)) for match in LEVEL_RE.finditer(text)]
+    levels = [level for level in levels if level <= 100]
+    # Số còn lại là số thứ tự quạt ("bật quạt 2"), như "bật đèn 2" với đèn
+    for n in NUMBER_RE.findall(LEVEL_RE.sub(" ", text)):
+        if f"dadn-fan-{n}" in session.fan_devices and f"dadn-fan-{n}" not in device_ids:
+            device_ids.append(f"dadn-fan-{n}")
+
+    if OFF_RE.search(text) and not ON_RE.search(text):
+        action, value = "off", None
+    elif INCREASE_RE.search(text):
+        action, value = "increase", None
+    elif DECREASE_RE.search(text):
+        action, value = "decrease", None
+    elif levels:
+        # "quạt mức 70", "bật quạt 70 phần trăm"
+        action, value = "set", levels[-1]
+    elif ON_RE.search(text):
+        action, value = "on", None
+    else:
+        return None
+    # Không nêu tên quạt thì áp dụng cho mọi quạt
+    return VoiceIntent(device_type="fan", action=action, value=value, device_ids=device_ids or list(session.fan_devices))
+
+
+def _led_intent(text: str, session: app_state.UserSession, all_devices: bool) -> Optional[VoiceIntent]:
+    if ON_RE.search(text):
+        action = "on"
+    elif OFF_RE.search(text):
+        action = "off"
+    else:
+        return None
+
+    if all_devices:
+        device_ids = list(session.led_devices)
+    else:
+        # Ưu tiên tên phòng/mô tả, sau đó tới số thứ tự đèn ("bật đèn 1 và 2");
+        # không nêu đèn nào thì áp dụng cho mọi đèn như với quạt
+        device_ids = match_devices(text, session.led_devices)
+        if not device_ids:
+            device_ids = [f"dadn-led-{n}" for n in NUMBER_RE.findall(text)] or list(session.led_devices)
+    return VoiceIntent(device_type="led", action=action, device_ids=device_ids)
+
+
+def parse_intent(text: str, session: app_state.UserSession) -> Optional[VoiceIntent]:
+    """Phân tích câu lệnh giọng nói thành intent điều khiển quạt hoặc đèn."""
+    normalized = normalize(text)
+    # "tất cả" chứa "tat" nên bỏ đi trước khi xét bật/tắt
+    command = ALL_RE.sub(" ", normalized)
+    if FAN_RE.search(normalized):
+        return _fan_intent(command, session)
+    if LIGHT_RE.search(normalized) or match_devices(normalized, session.led_devices):
+        return _led_intent(command, session, all_devices=bool(ALL_RE.search(normalized)))
+    return None
+
+
+def intent_commands(intent: VoiceIntent) -> list:
+    """Chuyển intent thành các lệnh giống /devices/batch."""
+    if intent.device_type == "fan":
+        action = str(intent.value) if intent.action == "set" else intent.action
+    else:
+        action = intent.action  # LED nhận "on"/"off"
+    return [DeviceCommand(device_id=device_id, action=action) for device_id in intent.device_ids]
+
+
+async def execute_intent(intent: VoiceIntent, session: app_state.UserSession) -> list:
+    """
+    Publish song song các lệnh của intent qua hàng đợi publish, trả về kết quả của từng thiết bị.
+    Thiết bị không tồn tại (ví dụ "đèn 5") được báo lỗi riêng, không chặn các thiết bị còn lại.
+    """
+    commands = intent_commands(intent)
+    errors = {error["device_id"]: error for error in validate_commands(commands, session)}
+    valid = [command for command in commands if command.device_id not in errors]
+    applied = iter(await asyncio.gather(*(apply_command(command, session) for command in valid)))
+    return [
+        {**errors[command.device_id], "success": False} if command.device_id in errors else next(applied)
+        for command in commands
+    ]
@@ -0,0 +1,106 @@
+import io
+import json
+import os
+import wave
+
+import speech_recognition as sr
+
+# Backend nhận dạng mặc định: "google" (online) hoặc "vosk" (offline)
+SPEECH_BACKEND = os.getenv("SPEECH_BACKEND", "google")
+SPEECH_LANGUAGE = os.getenv("SPEECH_LANGUAGE", "vi-VN")
+# Thư mục model Vosk tiếng Việt, ví dụ vosk-model-small-vn-0.4
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-vn-0.4")
+
+
+class RecognitionError(Exception):
+    """Backend không nhận dạng được audio hoặc không dùng được."""
+
+
+class SpeechRecognizerBackend:
+    """
+    Giao diện chung cho các backend nhận dạng giọng nói.
+    `recognize` nhận WAV mono 16-bit (đầu ra của decode_to_wav) và trả về văn bản.
+    """
+
+    name = "base"
+    # True: chạy ngay trong process pool giải mã (CPU); False: chạy trong thread (I/O mạng)
+    offline = False
+
+    def load(self):
+        """Nạp model (nếu có). Được gọi một lần cho mỗi worker."""
+
+    def recognize(self, wav: bytes) -> str:
+        raise NotImplementedError
+
+
+class GoogleRecognizer(SpeechRecognizerBackend):
+    """Google Web Speech API qua thư viện SpeechRecognition (cần Internet)."""
+
+    name = "google"
+    offline = False
+
+    def __init__(self, language: str = SPEECH_LANGUAGE):
+        self.language = language
+
+    def recognize(self, wav: bytes) -> str:
+        recognizer = sr.Recognizer()
+        with sr.AudioFile(io.BytesIO(wav)) as source:
+            audio_data = recognizer.record(source)
+        try:
+            return recognizer.recognize_google(audio_data, language=self.language)
+        except sr.UnknownValueError:
+            raise RecognitionError("Không nhận dạng được giọng nói")
+        except sr.RequestError as e:
+            raise RecognitionError(f"Speech recognition service error: {e}")
+
+
+class VoskRecognizer(SpeechRecognizerBackend):
+    """Nhận dạng offline bằng Vosk (Kaldi); model được nạp một lần cho mỗi worker."""
+
+    name = "vosk"
+    offline = True
+
+    def __init__(self, model_path: str = VOSK_MODEL_PATH):
+        self.model_path = model_path
+        self._model = None
+
+    def load(self):
+        if self._model is not None:
+            return
+        try:
+            import vosk
+        except ImportError as e:
+            raise RecognitionError("SPEECH_BACKEND=vosk cần cài đặt gói 'vosk'") from e
+        if not os.path.isdir(self.model_path):
+            raise RecognitionError(f"Không tìm thấy model Vosk tại {self.model_path}")
+        vosk.SetLogLevel(-1)
+        self._model = vosk.Model(self.model_path)
+
+    def recognize(self, wav: bytes) -> str:
+        from vosk import KaldiRecognizer
+
+        self.load()
+        with wave.open(io.BytesIO(wav)) as source:
+            recognizer = KaldiRecognizer(self._model, source.getframerate())
+            while True:
+                frames = source.readframes(4000)
+                if not frames:
+                    break
+                recognizer.AcceptWaveform(frames)
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        if not text:
+            raise RecognitionError("Không nhận dạng được giọng nói")
+        return text
+
+
+RECOGNIZERS = {
+    GoogleRecognizer.name: GoogleRecognizer,
+    VoskRecognizer.name: VoskRecognizer,
+}
+
+
+def create_recognizer(name: str = SPEECH_BACKEND) -> SpeechRecognizerBackend:
+    try:
+        return RECOGNIZERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown speech backend '{name}', expected one of {sorted(RECOGNIZERS)}")
@@ -0,0 +1,62 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+# Cấu hình VAD (phát hiện giọng nói) dựa trên năng lượng từng frame
+VAD_ENABLED = os.getenv("SPEECH_VAD", "1") == "1"
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+VAD_MIN_DBFS = float(os.getenv("VAD_MIN_DBFS", "-45"))  # dưới mức này luôn coi là im lặng
+VAD_NOISE_MARGIN_DB = float(os.getenv("VAD_NOISE_MARGIN_DB", "12"))  # cao hơn nền nhiễu bao nhiêu dB thì là giọng nói
+VAD_DYNAMIC_RANGE_DB = float(os.getenv("VAD_DYNAMIC_RANGE_DB", "20"))
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", "200"))  # giữ lại quanh đoạn có tiếng để không cắt mất âm đầu/cuối
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "120"))
+
+
+class NoSpeechError(Exception):
+    """Clip không chứa giọng nói."""
+
+
+def frame_energy_dbfs(samples: np.ndarray, frame_size: int) -> np.ndarray:
+    """Năng lượng RMS (dBFS) của từng frame không chồng lấn, tính vector hóa."""
+    n_frames = len(samples) // frame_size
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[: n_frames * frame_size].astype(np.float32).reshape(n_frames, frame_size)
+    rms = np.sqrt(np.mean(np.square(frames / 32768.0), axis=1))
+    return 20.0 * np.log10(rms + 1e-10)
+
+
+def speech_bounds(samples: np.ndarray, sample_rate: int) -> Optional[tuple]:
+    """
+    Tìm (start, end) theo chỉ số mẫu của đoạn có giọng nói, đã cộng padding.
+    Trả về None nếu không có giọng nói.
+    """
+    frame_size = max(1, sample_rate * VAD_FRAME_MS // 1000)
+    energy = frame_energy_dbfs(samples, frame_size)
+    if energy.size == 0:
+        return None
+    # Ngưỡng thích nghi: nền nhiễu ước lượng bằng phân vị 10% năng lượng các frame;
+    # giới hạn bởi đỉnh - VAD_DYNAMIC_RANGE_DB để clip toàn giọng nói không bị coi là nhiễu
+    noise_floor = float(np.percentile(energy, 10))
+    threshold = max(VAD_MIN_DBFS, min(noise_floor + VAD_NOISE_MARGIN_DB, float(energy.max()) - VAD_DYNAMIC_RANGE_DB))
+    voiced = np.flatnonzero(energy > threshold)
+    if voiced.size * VAD_FRAME_MS < VAD_MIN_SPEECH_MS:
+        return None
+    padding = sample_rate * VAD_PADDING_MS // 1000
+    start = max(0, int(voiced[0]) * frame_size - padding)
+    end = min(len(samples), (int(voiced[-1]) + 1) * frame_size + padding)
+    return start, end
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int) -> tuple:
+    """
+    Cắt im lặng ở đầu và cuối clip (mono int16).
+    Trả về (samples đã cắt, số ms đã cắt); ném NoSpeechError nếu không có giọng nói.
+    """
+    bounds = speech_bounds(samples, sample_rate)
+    if bounds is None:
+        raise NoSpeechError("Không phát hiện giọng nói trong audio")
+    start, end = bounds
+    removed_ms = (len(samples) - (end - start)) * 1000 / sample_rate
+    return samples[start:end], removed_ms
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import logging
+import aiohttp
+from cachetools import TTLCache
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ADAFRUIT_API_URL = os.getenv("ADAFRUIT_API_URL", "https://io.adafruit.com/api/v2")
+SENSOR_FEEDS = ("dadn-temp", "dadn-light", "dadn-humi")
+
+
+def feed_kind(feed_key: str):
+    """Phân loại feed theo key: "led", "fan", "sensor" hoặc None."""
+    if feed_key.startswith("dadn-led"):
+        return "led"
+    if feed_key.startswith("dadn-fan"):
+        return "fan"
+    if feed_key in SENSOR_FEEDS:
+        return "sensor"
+    return None
+
+
+def classify_feeds(feeds: list) -> dict:
+    """Chia danh sách feed thành các nhóm thiết bị trong một lần duyệt."""
+    groups = {"led": [], "fan": [], "sensor": []}
+    for feed in feeds:
+        kind = feed_kind(feed.get("key", ""))
+        if kind is not None:
+            groups[kind].append(feed)
+    return groups
+
+
+class AdafruitFeedClient:
+    """HTTP client dùng chung để lấy danh sách feed, có cache TTL theo tài khoản."""
+
+    def __init__(self, base_url: str = ADAFRUIT_API_URL, ttl: float = 15, maxsize: int = 256):
+        self.base_url = base_url.rstrip("/")
+        self._session: aiohttp.ClientSession | None = None
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._locks: dict[tuple, asyncio.Lock] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+        return self._session
+
+    async def _download(self, username: str, key: str) -> list:
+        session = self._get_session()
+        async with session.get(
+            f"{self.base_url}/{username}/feeds",
+            headers={"X-AIO-Key": key}
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def get_device_feeds(self, username: str, key: str) -> dict:
+        """Trả về feed đã phân loại của tài khoản, chỉ tải lại khi cache hết hạn."""
+        cache_key = (username, key)
+        groups = self._cache.get(cache_key)
+        if groups is not None:
+            return groups
+        # Các request đồng thời của cùng tài khoản chờ chung một lần tải
+        lock = self._locks.setdefault(cache_key, asyncio.Lock())
+        try:
+            async with lock:
+                groups = self._cache.get(cache_key)
+                if groups is None:
+                    feeds = await self._download(username, key)
+                    groups = classify_feeds(feeds)
+                    self._cache[cache_key] = groups
+                    logger.info(f"Fetched {len(feeds)} Adafruit feeds for {username}")
+        finally:
+            # Lock chỉ cần trong lúc tải; request đang chờ vẫn giữ tham chiếu tới lock cũ
+            if self._locks.get(cache_key) is lock and not lock.locked():
+                del self._locks[cache_key]
+        return groups
+
+    def invalidate(self, username: str, key: str = None):
+        """Xóa feed đã cache của tài khoản (mọi key nếu không truyền `key`)."""
+        cache_keys = [(username, key)] if key is not None else [
+            cache_key for cache_key in list(self._cache.keys()) + list(self._locks) if cache_key[0] == username
+        ]
+        for cache_key in cache_keys:
+            self._cache.pop(cache_key, None)
+            self._locks.pop(cache_key, None)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# Client global, dùng chung cho toàn bộ ứng dụng
+feed_client = AdafruitFeedClient()
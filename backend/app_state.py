@@ -1,4 +1,123 @@
-led_devices = {}
-fan_devices = {}
-sensor_devices = {}
-    
\ No newline at end of file
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Header, Query
+
+# Thời gian tối đa một phiên không hoạt động và số phiên tối đa giữ trong bộ nhớ
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "3600"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "100"))
+
+
+class UserSession:
+    """Thiết bị và kết nối MQTT của một người dùng (một ngôi nhà)."""
+
+    def __init__(self, user_no: Optional[int] = None, username_adafruit: Optional[str] = None):
+        self.user_no = user_no
+        self.username_adafruit = username_adafruit
+        self.led_devices = {}
+        self.fan_devices = {}
+        self.sensor_devices = {}
+        self.last_seen = time.monotonic()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def device_collections(self):
+        return [self.led_devices, self.fan_devices, self.sensor_devices]
+
+    def all_devices(self):
+        return [device for collection in self.device_collections() for device in collection.values()]
+
+
+class SessionRegistry:
+    """Registry các phiên theo user_no, có timeout khi không hoạt động và giới hạn LRU."""
+
+    def __init__(self, idle_timeout: float = SESSION_IDLE_TIMEOUT, max_sessions: int = MAX_SESSIONS):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[int, UserSession]" = OrderedDict()
+        # user_no -> các kết nối WebSocket đang mở, kể cả khi chưa đăng nhập (chưa có phiên)
+        self._sockets: dict[int, set] = {}
+
+    def get(self, user_no: int) -> Optional[UserSession]:
+        session = self._sessions.get(user_no)
+        if session is not None:
+            session.touch()
+            self._sessions.move_to_end(user_no)
+        return session
+
+    def peek(self, user_no: int) -> Optional[UserSession]:
+        """Như `get` nhưng không tính là một lần hoạt động của phiên."""
+        return self._sessions.get(user_no)
+
+    def open_socket(self, user_no: int, connection):
+        self._sockets.setdefault(user_no, set()).add(connection)
+
+    def close_socket(self, user_no: int, connection):
+        sockets = self._sockets.get(user_no)
+        if sockets is not None:
+            sockets.discard(connection)
+            if not sockets:
+                del self._sockets[user_no]
+        session = self._sessions.get(user_no)
+        if session is not None:
+            session.touch()
+
+    def sockets(self, user_no: int) -> list:
+        return list(self._sockets.get(user_no, ()))
+
+    def ws_clients(self, user_no: int) -> int:
+        return len(self._sockets.get(user_no, ()))
+
+    def replace(self, session: UserSession) -> list:
+        """Đăng ký phiên mới cho user, trả về các phiên bị thay thế hoặc bị loại bởi LRU."""
+        removed = []
+        old = self._sessions.pop(session.user_no, None)
+        if old is not None:
+            removed.append(old)
+        self._sessions[session.user_no] = session
+        while len(self._sessions) > self.max_sessions:
+            # Ưu tiên loại phiên không còn WebSocket mở, cũ nhất trước
+            user_no = next(
+                (no for no, other in self._sessions.items() if self.ws_clients(no) == 0 and other is not session),
+                next(iter(self._sessions)),
+            )
+            removed.append(self._sessions.pop(user_no))
+        return removed
+
+    def remove(self, user_no: int) -> Optional[UserSession]:
+        return self._sessions.pop(user_no, None)
+
+    def evict_idle(self) -> list:
+        """Loại các phiên quá hạn (trừ phiên còn WebSocket đang mở)."""
+        now = time.monotonic()
+        expired = [
+            user_no for user_no, session in self._sessions.items()
+            if self.ws_clients(user_no) == 0 and now - session.last_seen > self.idle_timeout
+        ]
+        return [self._sessions.pop(user_no) for user_no in expired]
+
+    def sessions(self) -> list:
+        return list(self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+registry = SessionRegistry()
+
+
+def resolve_session(user_no: Optional[int] = None) -> UserSession:
+    """Tìm phiên theo user_no; không có user_no hoặc chưa đăng nhập thì trả về phiên rỗng."""
+    session = registry.get(user_no) if user_no is not None else None
+    # Phiên rỗng (không đăng ký) để các endpoint báo "device not found", không lộ thiết bị của người khác
+    return session if session is not None else UserSession(user_no)
+
+
+async def get_user_session(
+    user_no: Optional[int] = Query(None, description="user_no của phiên đã đăng nhập"),
+    x_user_no: Optional[int] = Header(None),
+) -> UserSession:
+    """Dependency lấy phiên của người gọi từ query `user_no` hoặc header `X-User-No`."""
+    return resolve_session(user_no if user_no is not None else x_user_no)
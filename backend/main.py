@@ -1,12 +1,10 @@
 import asyncio
-import os
-import tempfile
+from functools import partial
 import uvicorn
-from fastapi import FastAPI, UploadFile, WebSocket, File, HTTPException, Depends, status
+from fastapi import FastAPI, UploadFile, WebSocket, File, HTTPException, Depends, Query, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
-import speech_recognition as sr
-from pydub import AudioSegment
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 import logging
@@ -15,7 +13,17 @@ import logging
 from Device import led_controller
 from Device import fan_controller
 from Device import sensor_controller  # Import module mới
+from Device import device_loader
+from Device import batch_controller
+from Device.sensor_history import history_store
 import app_state
+import mqtt_service as mqtt
+from ws_hub import hub
+from adafruit_feeds import feed_client
+import metrics
+from Speech.audio_pipeline import audio_pipeline, audio_format_of
+from Speech.vad import NoSpeechError
+from Speech.intents import parse_intent, execute_intent
 
 # Import server_mongo router và init_db
 from MongoDB.server_mongo import router as mongo_router, init_db
@@ -24,12 +32,37 @@ from MongoDB.server_mongo import get_user_dal
 
 # Import get_user_log_dal nếu cần dùng trực tiếp (ví dụ để ghi log trong main)
 from MongoDB.server_mongo import get_user_log_dal
+from MongoDB.server_mongo import get_sensor_reading_dal
 from MongoDB.UserLog.user_log_dal import UserLogDAL # Sửa đường dẫn import
 
 # === Cấu hình Logging cơ bản ===
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__) # Tạo logger cho main.py
 
+async def close_sessions(sessions: list):
+    """Ngắt kết nối thiết bị của các phiên đã bị loại và dọn dữ liệu của tài khoản không còn phiên nào."""
+    await device_loader.disconnect_devices([device for session in sessions for device in session.all_devices()])
+    active = {session.username_adafruit for session in app_state.registry.sessions()}
+    for username in {session.username_adafruit for session in sessions} - active:
+        history_store.discard(username)
+    for session in sessions:
+        if app_state.registry.peek(session.user_no) is None:
+            # Phiên bị loại khi còn WebSocket mở: client nhận snapshot rỗng thay cho giá trị cũ
+            for client in app_state.registry.sockets(session.user_no):
+                client.request_snapshot()
+
+async def evict_idle_sessions(interval: float = 60):
+    """Định kỳ loại các phiên không hoạt động và ngắt kết nối thiết bị của chúng."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            sessions = app_state.registry.evict_idle()
+            for session in sessions:
+                logger.info(f"Evicting idle session for user {session.user_no}")
+            await close_sessions(sessions)
+        except Exception as e:
+            logger.error(f"Error evicting idle sessions: {e}", exc_info=True)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     mongo_client = None
@@ -43,21 +76,35 @@ async def lifespan(app: FastAPI):
         # Raise lại lỗi để làm server crash
         raise RuntimeError(f"Failed to initialize database during startup: {e}") from e
 
+    # Hub WebSocket nhận thay đổi từ thread MQTT qua event loop này
+    hub.bind_loop(asyncio.get_running_loop())
+
+    # Lưu giá trị cảm biến từ MQTT xuống MongoDB theo batch
+    sensor_reading_dal = await get_sensor_reading_dal()
+    await sensor_reading_dal.start()
+
+    # Ghi user log theo batch, không nằm trên đường xử lý request
+    user_log_dal = await get_user_log_dal()
+    await user_log_dal.start()
+    mqtt.connection_manager.add_listener(sensor_reading_dal.record)
+    # Ghi lịch sử cảm biến trong bộ nhớ một lần cho mỗi message MQTT, dùng chung giữa các phiên
+    mqtt.connection_manager.add_listener(history_store.record)
+    eviction_task = asyncio.create_task(evict_idle_sessions())
+    # Tạo worker pool nhận dạng giọng nói (nạp model offline nếu có)
+    await audio_pipeline.start()
+
     logger.info("--- Vercel Log: Lifespan startup finished, yielding control ---")
     yield
     logger.info("--- Vercel Log: Lifespan shutdown initiated ---")
-    # Shutdown - ngắt kết nối các thiết bị nếu có
-    for device in app_state.led_devices.values():
-        if hasattr(device, 'mqtt_service') and device.mqtt_service:
-            device.mqtt_service.client.disconnect()
-    
-    for device in app_state.fan_devices.values():
-        if hasattr(device, 'mqtt_service') and device.mqtt_service:
-            device.mqtt_service.client.disconnect()
-    
-    for device in app_state.sensor_devices.values():
-        if hasattr(device, 'mqtt_service') and device.mqtt_service:
-            device.mqtt_service.client.disconnect()
+    eviction_task.cancel()
+    # Shutdown - đóng toàn bộ kết nối MQTT dùng chung
+    mqtt.connection_manager.close_all()
+    mqtt.connection_manager.remove_listener(sensor_reading_dal.record)
+    mqtt.connection_manager.remove_listener(history_store.record)
+    await sensor_reading_dal.stop()
+    await user_log_dal.stop()
+    await feed_client.close()
+    audio_pipeline.close()
     
     # Đóng kết nối MongoDB
     if mongo_client:
@@ -79,106 +126,167 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cho phép client trên trình duyệt đọc cursor trang sau của /api/logs
+    expose_headers=["X-Next-Cursor"],
 )
+# Đo latency theo route cho /metrics (ASGI thuần, không tạo task cho mỗi request)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Thêm các router từ các module
 app.include_router(led_controller.router)
 app.include_router(fan_controller.router)
 app.include_router(sensor_controller.router)  # Thêm router mới
+app.include_router(batch_controller.router)
 
 # Thêm router chính của MongoDB (đã bao gồm user_api_router)
 # Prefix /api sẽ được áp dụng cho tất cả các route trong mongo_router
 app.include_router(mongo_router, prefix="/api")
 
+def build_status_snapshot(session: app_state.UserSession) -> dict:
+    """Tạo snapshot đầy đủ trạng thái thiết bị của phiên cho client WebSocket."""
+    return {
+        "type": "snapshot",
+        "led_statuses": {
+            device_id: device.mqtt_service.get_latest_data()
+            for device_id, device in session.led_devices.items()
+        },
+        "fan_statuses": {
+            device_id: device.mqtt_service.get_latest_data()
+            for device_id, device in session.fan_devices.items()
+        },
+        "sensor_values": {
+            device_id: device.mqtt_service.get_latest_data()
+            for device_id, device in session.sensor_devices.items()
+        },
+        # Feed có giá trị cũ (mất kết nối MQTT, chưa nhận lại giá trị mới)
+        "stale": [
+            device_id
+            for collection in session.device_collections()
+            for device_id, device in collection.items()
+            if device.mqtt_service.is_stale()
+        ],
+    }
+
+async def _wait_for_close(websocket: WebSocket):
+    # Client không gửi dữ liệu, chỉ đọc để phát hiện khi kết nối bị đóng
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+def _current_session(user_no: int) -> app_state.UserSession:
+    # Tra cứu lại mỗi lần gửi: phiên có thể đã được thay khi user đăng nhập lại
+    return app_state.registry.peek(user_no) or app_state.UserSession(user_no)
+
+async def _send_updates(websocket: WebSocket, client, user_no: int):
+    await websocket.send_json(build_status_snapshot(_current_session(user_no)))
+    while True:
+        text = await client.next_message()
+        if text is None:
+            # Client bị tụt lại phía sau hoặc phiên vừa thay đổi, gửi lại snapshot đầy đủ
+            await websocket.send_json(build_status_snapshot(_current_session(user_no)))
+        else:
+            await websocket.send_text(text)
+
+# Gauge được tính lúc scrape từ trạng thái hiện có, không tốn chi phí trên đường xử lý request
+metrics.registry.gauge("ws_clients", "Số client WebSocket đang kết nối.", hub.client_count)
+metrics.registry.gauge(
+    "ws_send_queue_messages", "Số message đang chờ gửi tới client WebSocket.",
+    lambda: {("total",): sum(hub.queue_depths()), ("max",): max(hub.queue_depths(), default=0)},
+    ("stat",),
+)
+metrics.registry.gauge(
+    "mqtt_publish_queue_depth", "Số feed có lệnh đang chờ publish (tổng các tài khoản).",
+    lambda: sum(stats["queue_depth"] for stats in mqtt.connection_manager.publish_stats().values()),
+)
+metrics.registry.gauge("mqtt_connections", "Số kết nối MQTT (tài khoản Adafruit).", mqtt.connection_manager.connection_count)
+metrics.registry.gauge("active_sessions", "Số phiên người dùng trong bộ nhớ.", lambda: len(app_state.registry))
+metrics.registry.gauge(
+    "active_devices", "Số thiết bị của các phiên đang hoạt động theo loại.",
+    lambda: {
+        (kind,): sum(len(getattr(session, f"{kind}_devices")) for session in app_state.registry.sessions())
+        for kind in ("led", "fan", "sensor")
+    },
+    ("type",),
+)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Metric theo định dạng text của Prometheus."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/mqtt/publish-stats")
+async def get_publish_stats():
+    """Độ sâu hàng đợi publish và số lệnh đã gộp/bị bỏ theo từng tài khoản Adafruit."""
+    return mqtt.connection_manager.publish_stats()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     logger.info("WebSocket client connecting...")
     await websocket.accept()
     logger.info("WebSocket client connected.")
+    user_no = websocket.query_params.get("user_no")
+    if not (user_no and user_no.isdigit()):
+        # Không biết phiên của ai thì không gửi trạng thái thiết bị nào
+        logger.warning("WebSocket client connected without user_no, closing.")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="user_no is required")
+        return
+    user_no = int(user_no)
+    # Kết nối chỉ giữ user_no; khi user đăng nhập (lại), client được chuyển sang tài khoản của phiên mới
+    session = app_state.registry.peek(user_no)
+    # `deltas=1`: client tự gộp delta vào trạng thái; mặc định gửi lại snapshot đầy đủ khi có thay đổi
+    client = hub.register(session.username_adafruit if session else None, deltas=websocket.query_params.get("deltas") == "1")
+    app_state.registry.open_socket(user_no, client)
+    tasks = [
+        asyncio.create_task(_send_updates(websocket, client, user_no)),
+        asyncio.create_task(_wait_for_close(websocket)),
+    ]
     try:
-        while True:
-            led_statuses = {
-                device_id: device.mqtt_service.get_latest_data() 
-                for device_id, device in app_state.led_devices.items()
-            }
-            fan_statuses = {
-                device_id: device.mqtt_service.get_latest_data() 
-                for device_id, device in app_state.fan_devices.items()
-            }
-            sensor_values = {
-                device_id: device.mqtt_service.get_latest_data() 
-                for device_id, device in app_state.sensor_devices.items()
-            }
-            await websocket.send_json({
-                "led_statuses": led_statuses,
-                "fan_statuses": fan_statuses,
-                "sensor_values": sensor_values
-            })
-            await asyncio.sleep(1)
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                logger.error(f"WebSocket error: {task.exception()}")
     except Exception as e:
         logger.error(f"WebSocket error: {e}", exc_info=True)
     finally:
+        for task in tasks:
+            task.cancel()
+        hub.unregister(client)
+        app_state.registry.close_socket(user_no, client)
         logger.info("WebSocket client disconnected.")
 
 @app.post("/speech-to-text")
-async def speech_to_text(audio: UploadFile = File(...)):
+async def speech_to_text(
+    audio: UploadFile = File(...),
+    execute: bool = Query(False, description="Thực hiện luôn lệnh nhận dạng được trên thiết bị"),
+    session: app_state.UserSession = Depends(app_state.get_user_session),
+):
     logger.info("Received request for /speech-to-text")
     try:
-        # Đọc file audio
+        # Đọc file audio vào bộ nhớ (mỗi request có buffer riêng)
         content = await audio.read()
-        
-        # Tạo temporary file với đường dẫn tuyệt đối
-        temp_dir = tempfile.gettempdir()
-        temp_audio_path = os.path.join(temp_dir, 'temp_audio.m4a')
-        temp_wav_path = os.path.join(temp_dir, 'temp_audio.wav')
-
-        # Ghi file audio
-        with open(temp_audio_path, 'wb') as f:
-            f.write(content)
-        
-        logger.info(f"Saved audio to: {temp_audio_path}")
-
-        # Kiểm tra file tồn tại
-        if not os.path.exists(temp_audio_path):
-            raise Exception(f"Audio file not found at {temp_audio_path}")
-
-        # Chuyển đổi m4a sang wav
-        try:
-            logger.info("Attempting audio conversion...")
-            audio_segment = AudioSegment.from_file(temp_audio_path, format="m4a")
-            audio_segment.export(temp_wav_path, format="wav")
-            logger.info("Audio conversion successful.")
-        except Exception as e:
-            logger.error(f"Audio conversion failed: {e}", exc_info=True)
-            logger.warning("This might be due to missing ffmpeg/avconv in the Vercel environment.")
-            raise Exception(f"Error converting audio: {str(e)}")
-
-        # Nhận dạng giọng nói
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(temp_wav_path) as source:
-            audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data, language='vi-VN')
-
-        # Xóa temporary files
-        os.remove(temp_audio_path)
-        os.remove(temp_wav_path)
-
-        # Phân tích lệnh quạt và đèn
-        normalized_text = text.lower()
-        command_type = None
-        
-        if "quạt" in normalized_text:
-            if "tắt" in normalized_text:
-                command_type = "fan_off"
-            elif "bật" in normalized_text or "mở" in normalized_text:
-                command_type = "fan_on"
-            elif "tăng" in normalized_text:
-                command_type = "fan_increase"
-            elif "giảm" in normalized_text:
-                command_type = "fan_decrease"
-        
-        logger.info(f"Speech-to-text result: {text}")
-        return {"text": text, "command_type": command_type}
+
+        # Giải mã và nhận dạng trong worker pool, không chặn event loop
+        result = await audio_pipeline.transcribe(content, audio_format_of(audio.filename))
+        text = result["text"]
+
+        # Phân tích lệnh quạt và đèn theo thiết bị của phiên hiện tại
+        intent = parse_intent(text, session)
+        response = {
+            **result,
+            "command_type": intent.command_type if intent else None,
+            "intent": intent.model_dump() if intent else None,
+        }
+        if execute and intent is not None:
+            response["results"] = await execute_intent(intent, session)
+            if not intent.device_ids:
+                response["error"] = "Không tìm thấy thiết bị nào để điều khiển."
+
+        logger.info(f"Speech-to-text result ({result['backend']}, {result['latency_ms']['total']} ms): {text}")
+        return response
+    except NoSpeechError as e:
+        logger.info(f"Speech-to-text rejected clip: {e}")
+        return {"error": str(e), "no_speech": True}
     except Exception as e:
         logger.error(f"Error processing audio: {e}", exc_info=True)
         return {"error": str(e)}
@@ -240,60 +348,62 @@ async def init_adafruit_connection(
             await user_log_dal.create_log(user_no=user_no, activity="Initiating Adafruit connection", status="Failed", device_name="Credentials missing")
             raise HTTPException(status_code=400, detail="Thiếu thông tin Adafruit cho người dùng này.") # Lỗi 400 rõ ràng hơn
 
-        # 3. Ngắt kết nối cũ (Giữ nguyên logic)
-        # ... (copy code ngắt kết nối từ phiên bản trước) ...
-        logger.info("Disconnecting existing devices...")
-        for device_collection in [app_state.led_devices, app_state.fan_devices, app_state.sensor_devices]:
-             for device_id, device in list(device_collection.items()):
-                if hasattr(device, 'mqtt_service') and device.mqtt_service:
-                    try:
-                        if device.mqtt_service.client.is_connected():
-                            device.mqtt_service.client.disconnect()
-                            device.mqtt_service.client.loop_stop()
-                        logger.info(f"Disconnected old device: {device_id}")
-                    except Exception as disconnect_error:
-                        logger.error(f"Error disconnecting device {device_id}: {disconnect_error}")
-                if device_id in device_collection: # Kiểm tra lại trước khi xóa
-                   del device_collection[device_id]
-        logger.info("Finished disconnecting old devices.")
-
-
-        # 4. Khởi tạo kết nối mới (Giữ nguyên logic)
-        # ... (copy code khởi tạo kết nối LED, Fan, Sensor từ phiên bản trước) ...
+        # 3. Khởi tạo thiết bị cho phiên mới song song, ngoài event loop
         logger.info(f"Initializing new connections for user {user_no}...")
-        # LED devices
+        session = app_state.UserSession(user_no, username_adafruit)
+        # Đăng nhập lại (có thể với key mới): tải lại danh sách feed thay vì dùng bản đã cache
+        feed_client.invalidate(username_adafruit)
         try:
-            led_feeds = await led_controller.fetch_led_feeds(username_adafruit, key_adafruit)
-            for feed_id, description, last_value in led_feeds:
-                app_state.led_devices[feed_id] = led_controller.LEDDevice(
-                    feed_id, description, last_value, username_adafruit, key_adafruit
-                )
-            logger.info(f"Initialized {len(led_feeds)} LED devices.")
-        except Exception as e:
-            logger.error(f"Error fetching/initializing LED feeds: {e}", exc_info=True)
-
-        # Fan devices
-        try:
-            fan_feeds = await fan_controller.fetch_fan_feeds(username_adafruit, key_adafruit)
-            for feed_id, description, last_value in fan_feeds:
-                 app_state.fan_devices[feed_id] = fan_controller.FanDevice(
-                     feed_id, description, last_value, username_adafruit, key_adafruit
-                 )
-            logger.info(f"Initialized {len(fan_feeds)} Fan devices.")
+            led_feeds, fan_feeds, sensor_feeds = await asyncio.gather(
+                led_controller.fetch_led_feeds(username_adafruit, key_adafruit),
+                fan_controller.fetch_fan_feeds(username_adafruit, key_adafruit),
+                sensor_controller.fetch_sensor_feeds(username_adafruit, key_adafruit),
+            )
         except Exception as e:
-             logger.error(f"Error fetching/initializing Fan feeds: {e}", exc_info=True)
+            logger.error(f"Error fetching Adafruit feeds: {e}", exc_info=True)
+            led_feeds, fan_feeds, sensor_feeds = [], [], []
+        factories = []
+        for feed_id, description, last_value in led_feeds:
+            factories.append((feed_id, partial(
+                led_controller.LEDDevice, feed_id, description, last_value, username_adafruit, key_adafruit
+            )))
+        for feed_id, description, last_value in fan_feeds:
+            factories.append((feed_id, partial(
+                fan_controller.FanDevice, feed_id, description, last_value, username_adafruit, key_adafruit
+            )))
+        for feed_id, description, last_value, unit in sensor_feeds:
+            factories.append((feed_id, partial(
+                sensor_controller.SensorDevice, feed_id, description, last_value, unit, username_adafruit, key_adafruit
+            )))
 
-        # Sensor devices
         try:
-            sensor_feeds = await sensor_controller.fetch_sensor_feeds(username_adafruit, key_adafruit)
-            for feed_id, description, last_value, unit in sensor_feeds:
-                 app_state.sensor_devices[feed_id] = sensor_controller.SensorDevice(
-                     feed_id, description, last_value, unit, username_adafruit, key_adafruit
-                 )
-            logger.info(f"Initialized {len(sensor_feeds)} Sensor devices.")
-        except Exception as e:
-             logger.error(f"Error fetching/initializing Sensor feeds: {e}", exc_info=True)
+            devices, failed_devices = await device_loader.init_devices(factories, fatal=(mqtt.MQTTAuthError,))
+        except mqtt.MQTTAuthError as e:
+            # Không thay phiên cũ: đăng nhập thất bại thay vì báo thành công với thiết bị không điều khiển được
+            logger.warning(f"Adafruit IO rejected credentials for user {user_no}: {e}")
+            raise HTTPException(status_code=400, detail="Adafruit IO từ chối username/key của người dùng này.")
+        for feed_id, device in devices.items():
+            if isinstance(device, led_controller.LEDDevice):
+                session.led_devices[feed_id] = device
+            elif isinstance(device, fan_controller.FanDevice):
+                session.fan_devices[feed_id] = device
+            else:
+                session.sensor_devices[feed_id] = device
+        logger.info(
+            f"Initialized {len(session.led_devices)} LED, {len(session.fan_devices)} Fan, "
+            f"{len(session.sensor_devices)} Sensor devices ({len(failed_devices)} failed)."
+        )
 
+        # 4. Thay phiên cũ của user này (và phiên bị loại bởi LRU), rồi ngắt kết nối chúng.
+        # Phiên mới đã đăng ký feed trước nên kết nối MQTT dùng chung không bị đóng lại.
+        old_sessions = app_state.registry.replace(session)
+        # WebSocket đang mở của user (kể cả mở trước khi đăng nhập) chuyển sang phiên mới
+        for client in app_state.registry.sockets(user_no):
+            hub.rescope(client, username_adafruit)
+        await close_sessions(old_sessions)
+        logger.info(
+            f"Disconnected {sum(len(old.all_devices()) for old in old_sessions)} devices from {len(old_sessions)} old sessions."
+        )
 
         # 5. Ghi log thành công
         logger.info(f"Login successful for user {user_no}. Initiating Adafruit connection...")
@@ -301,7 +411,7 @@ async def init_adafruit_connection(
             user_no=user_no,
             activity="Adafruit connection initialized successfully",
             status="Success",
-            device_name=f"LEDs: {len(app_state.led_devices)}, Fans: {len(app_state.fan_devices)}, Sensors: {len(app_state.sensor_devices)}"
+            device_name=f"LEDs: {len(session.led_devices)}, Fans: {len(session.fan_devices)}, Sensors: {len(session.sensor_devices)}"
         )
 
         # 6. Trả về kết quả
@@ -310,10 +420,11 @@ async def init_adafruit_connection(
             "message": "Kết nối Adafruit đã được khởi tạo thành công.",
             "user_no": user_no, # Trả về user_no để client biết ai đã login
             "devices": {
-                "led": list(app_state.led_devices.keys()),
-                "fan": list(app_state.fan_devices.keys()),
-                "sensor": list(app_state.sensor_devices.keys())
-            }
+                "led": list(session.led_devices.keys()),
+                "fan": list(session.fan_devices.keys()),
+                "sensor": list(session.sensor_devices.keys())
+            },
+            "failed_devices": failed_devices
         }
     except HTTPException as he:
         # Ghi log lỗi HTTP đã biết (lỗi 401 đã được log ở trên)
@@ -0,0 +1,243 @@
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+
+# Bucket mặc định (giây) cho latency HTTP, giống client Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Thao tác MongoDB thường nhanh hơn nhiều (cache, index)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()  # có thể được cập nhật từ thread MQTT
+
+    def samples(self):
+        """Trả về các dòng (tên, nhãn, giá trị) để xuất."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Gauge(Metric):
+    """Gauge tính khi scrape: `function` trả về một số, hoặc dict {tuple nhãn: giá trị}."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, function, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self._function = function
+
+    def samples(self):
+        value = self._function()
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        for label_values, sample in values:
+            yield self.name, _format_labels(self.labels, label_values), sample
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # nhãn -> [số mẫu theo bucket (không cộng dồn)..., sum]
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(label_values, list(counts)) for label_values, counts in self._series.items()]
+        for label_values, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                yield f"{self.name}_bucket", _format_labels(self.labels, label_values, le), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labels, label_values), counts[-1]
+            yield f"{self.name}_count", _format_labels(self.labels, label_values), cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, function, labels: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, help, function, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        """Xuất toàn bộ metric theo định dạng text của Prometheus (0.0.4)."""
+        blocks = []
+        for metric in list(self._metrics.values()):
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                # Một gauge lỗi không làm hỏng cả trang metrics
+                blocks.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return "\n".join(blocks) + "\n"
+
+
+# Registry global, dùng chung cho toàn bộ ứng dụng
+registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "Thời gian xử lý request HTTP theo route.", ("method", "route")
+)
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "Số request HTTP theo route và status.", ("method", "route", "status")
+)
+MQTT_MESSAGES_RECEIVED = registry.counter(
+    "mqtt_messages_received_total", "Số message MQTT nhận được theo feed.", ("feed",)
+)
+MQTT_MESSAGES_PUBLISHED = registry.counter(
+    "mqtt_messages_published_total", "Số giá trị publish thành công (broker đã ack) theo feed.", ("feed",)
+)
+MQTT_PUBLISH_FAILURES = registry.counter(
+    "mqtt_publish_failures_total", "Số lệnh publish thất bại hoặc bị bỏ theo feed và lý do.", ("feed", "reason")
+)
+DB_OPERATION_DURATION = registry.histogram(
+    "mongodb_operation_duration_seconds", "Thời gian các thao tác MongoDB theo phương thức DAL.",
+    ("operation",), DB_BUCKETS,
+)
+
+# Lý do lỗi publish được giữ nguyên làm nhãn; lỗi khác gộp thành "error" để số series không tăng vô hạn
+PUBLISH_FAILURE_REASONS = {"ack timeout", "offline buffer full", "expired", "offline"}
+
+
+def publish_failure_reason(error) -> str:
+    return error if error in PUBLISH_FAILURE_REASONS else "error"
+
+
+class MetricsMiddleware:
+    """ASGI middleware đo latency HTTP theo route template (ví dụ /led/{device_id}/{status})."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Chỉ dùng path template để số series không phụ thuộc vào URL thực tế
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method, path)
+            HTTP_REQUESTS.inc(method, path, str(status))
+
+
+def _timed_coroutine(operation: str, function):
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            DB_OPERATION_DURATION.observe(time.perf_counter() - started, operation)
+    return wrapper
+
+
+def _timed_generator(operation: str, function):
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        # Tính từ lúc bắt đầu duyệt tới khi cursor hết hoặc bị đóng
+        started = time.perf_counter()
+        try:
+            async for item in function(*args, **kwargs):
+                yield item
+        finally:
+            DB_OPERATION_DURATION.observe(time.perf_counter() - started, operation)
+    return wrapper
+
+
+def instrument_dal(cls):
+    """Class decorator: đo thời gian mọi phương thức async public của DAL (trừ start/stop)."""
+    for name, function in list(vars(cls).items()):
+        if name.startswith("_") or name in ("start", "stop"):
+            continue
+        operation = f"{cls.__name__}.{name}"
+        if inspect.isasyncgenfunction(function):
+            setattr(cls, name, _timed_generator(operation, function))
+        elif inspect.iscoroutinefunction(function):
+            setattr(cls, name, _timed_coroutine(operation, function))
+    return cls
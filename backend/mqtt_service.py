@@ -1,9 +1,509 @@
 import sys
 import os
-from Adafruit_IO import MQTTClient
+import threading
+import asyncio
+import random
+import time
+from collections import OrderedDict
+import paho.mqtt.client as paho_mqtt
 from dotenv import load_dotenv
+from ws_hub import hub
+from publish_queue import FeedPublisher, PublishResult
+from metrics import MQTT_MESSAGES_RECEIVED
 load_dotenv()
 
+# Địa chỉ broker MQTT: mặc định Adafruit IO, có thể trỏ tới broker local (ví dụ Simulator)
+MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST", "io.adafruit.com")
+MQTT_BROKER_SECURE = os.getenv("MQTT_BROKER_SECURE", "1") == "1"
+MQTT_BROKER_PORT = os.getenv("MQTT_BROKER_PORT")  # mặc định 8883 (TLS) hoặc 1883
+MQTT_KEEPALIVE = 60
+
+# QoS khi publish (Adafruit IO hỗ trợ 0 hoặc 1) và thời gian chờ xác nhận tối đa
+MQTT_PUBLISH_QOS = int(os.getenv("MQTT_PUBLISH_QOS", "1"))
+MQTT_PUBLISH_TIMEOUT = float(os.getenv("MQTT_PUBLISH_TIMEOUT", "5"))
+# Khoảng chờ reconnect (giây): tăng gấp đôi sau mỗi lần thất bại, tối đa MQTT_RECONNECT_MAX
+MQTT_RECONNECT_MIN = float(os.getenv("MQTT_RECONNECT_MIN", "1"))
+MQTT_RECONNECT_MAX = float(os.getenv("MQTT_RECONNECT_MAX", "60"))
+# Thời gian chờ CONNACK ở lần kết nối đầu để phát hiện sai username/key ngay khi đăng nhập
+MQTT_CONNECT_TIMEOUT = float(os.getenv("MQTT_CONNECT_TIMEOUT", "5"))
+# CONNACK từ chối vì thông tin đăng nhập: thử lại cũng không thành công nên không reconnect
+AUTH_FAILURE_REASONS = {"Bad user name or password", "Not authorized"}
+
+
+class ReconnectBackoff:
+    """Exponential backoff có jitter để các kết nối không reconnect cùng lúc."""
+
+    def __init__(self, base=MQTT_RECONNECT_MIN, cap=MQTT_RECONNECT_MAX):
+        self.base = base
+        self.cap = cap
+        self.attempt = 0
+
+    def next_delay(self):
+        delay = min(self.cap, self.base * 2 ** self.attempt)
+        self.attempt += 1
+        # "Equal jitter": nửa cố định, nửa ngẫu nhiên
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self):
+        self.attempt = 0
+
+
+class ConnectionClosedError(ConnectionError):
+    """Kết nối đã bị đóng (và bỏ khỏi manager) trong lúc chờ connect."""
+
+
+class MQTTAuthError(ConnectionError):
+    """Broker từ chối username/key của tài khoản Adafruit."""
+
+
+class AdafruitMQTTClient:
+    """
+    Client MQTT cho feed Adafruit IO, dùng trực tiếp API của paho: topic `{username}/feeds/{feed_id}`,
+    lấy lại giá trị cuối qua topic `/get`. Callback:
+
+    - on_connect(client), on_message(client, feed_id, payload), on_subscribe(client, mid)
+    - on_connect_refused(client, reason): broker trả CONNACK lỗi (`reason` là tên reason code)
+    - on_publish(mid): broker đã ack message QoS 1
+    - on_disconnect(client, unexpected): `unexpected` là False khi ngắt kết nối chủ động
+    """
+
+    def __init__(self, username, key, host=MQTT_BROKER_HOST, port=None, secure=MQTT_BROKER_SECURE):
+        self.username = username
+        self.host = host
+        self.port = int(port) if port else (8883 if secure else 1883)
+        self.on_connect = None
+        self.on_connect_refused = None
+        self.on_message = None
+        self.on_subscribe = None
+        self.on_publish = None
+        self.on_disconnect = None
+        self._client = paho_mqtt.Client(paho_mqtt.CallbackAPIVersion.VERSION2)
+        if secure:
+            self._client.tls_set_context()
+        self._client.username_pw_set(username, key)
+        self._client.on_connect = self._paho_connect
+        self._client.on_message = self._paho_message
+        self._client.on_subscribe = self._paho_subscribe
+        self._client.on_publish = self._paho_publish
+        self._client.on_disconnect = self._paho_disconnect
+
+    def topic(self, feed_id):
+        return f"{self.username}/feeds/{feed_id}"
+
+    def _paho_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            # loop() trả về MQTT_ERR_CONN_REFUSED
+            print(f"Adafruit IO từ chối kết nối ({self.username}): {reason_code}")
+            if self.on_connect_refused is not None:
+                self.on_connect_refused(self, reason_code.getName())
+            return
+        if self.on_connect is not None:
+            self.on_connect(self)
+
+    def _paho_message(self, client, userdata, message):
+        parts = message.topic.split("/")
+        if len(parts) != 3 or parts[1] != "feeds" or self.on_message is None:
+            return
+        payload = message.payload.decode("utf-8") if message.payload else ""
+        self.on_message(self, parts[2], payload)
+
+    def _paho_subscribe(self, client, userdata, mid, reason_codes, properties):
+        if self.on_subscribe is not None:
+            self.on_subscribe(self, mid)
+
+    def _paho_publish(self, client, userdata, mid, reason_code, properties):
+        if self.on_publish is not None:
+            self.on_publish(mid)
+
+    def _paho_disconnect(self, client, userdata, flags, reason_code, properties):
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, reason_code != 0)
+
+    def connect(self):
+        self._client.connect(self.host, self.port, keepalive=MQTT_KEEPALIVE)
+
+    def reconnect(self):
+        self._client.reconnect()
+
+    def loop(self, timeout=1.0):
+        return self._client.loop(timeout=timeout)
+
+    def disconnect(self):
+        self._client.disconnect()
+
+    def is_connected(self):
+        return self._client.is_connected()
+
+    def subscribe(self, feed_id, qos=0):
+        return self._client.subscribe(self.topic(feed_id), qos=qos)
+
+    def unsubscribe(self, feed_id):
+        return self._client.unsubscribe(self.topic(feed_id))
+
+    def receive(self, feed_id):
+        """Yêu cầu broker gửi lại giá trị cuối của feed."""
+        return self._client.publish(self.topic(feed_id) + "/get", payload="")
+
+    def publish(self, feed_id, value, qos=0):
+        """Publish giá trị, trả về MQTTMessageInfo (mid, rc) của paho."""
+        return self._client.publish(self.topic(feed_id), payload=value, qos=qos)
+
+
+def _resolve(loop, future, result):
+    """Đặt kết quả cho future của event loop từ thread MQTT."""
+    def set_result():
+        if not future.done():
+            future.set_result(result)
+    try:
+        loop.call_soon_threadsafe(set_result)
+    except RuntimeError:
+        pass  # event loop đã đóng (đang shutdown)
+
+
+class MQTTConnection:
+    """Một kết nối MQTT dùng chung cho tất cả feed của một tài khoản Adafruit."""
+
+    def __init__(self, username, key, listeners=()):
+        self.username = username
+        self.key = key
+        self._listeners = listeners  # gọi một lần cho mỗi message, trước khi chia cho service
+        self._services = {}  # feed_id -> list MQTTService (nhiều phiên có thể dùng chung feed)
+        self._pending_subscribes = {}  # mid -> feed_id, chỉ dùng để log
+        self._pending_acks = {}  # mid -> (loop, future) của publish_async đang chờ ack
+        self._acked_mids = OrderedDict()  # ack đến trước khi publish_async kịp đăng ký mid
+        self._echo_waiters = {}  # feed_id -> list (value, loop, future) chờ giá trị quay lại
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._started = False
+        self._closing = threading.Event()
+        self._connack = threading.Event()  # đã nhận CONNACK (thành công hoặc bị từ chối)
+        self.auth_error = None  # lý do broker từ chối thông tin đăng nhập
+        self._needs_reconnect = False
+        self._thread = None
+        self.backoff = ReconnectBackoff()
+        self.online = False
+        self.disconnected_at = None  # thời điểm mất kết nối gần nhất, dùng để đánh dấu dữ liệu cũ
+        self.reconnects = 0
+        self.client = AdafruitMQTTClient(username, key, port=MQTT_BROKER_PORT)
+        self.client.on_connect = self.connected
+        self.client.on_connect_refused = self.connect_refused
+        self.client.on_message = self.message
+        self.client.on_subscribe = self.subscribe_ack
+        self.client.on_publish = self.publish_ack
+        self.client.on_disconnect = self.connection_lost
+        # Hàng đợi publish (coalesce theo feed + token bucket theo tài khoản)
+        self.publisher = FeedPublisher(self.publish_async, on_published=self.published)
+
+    def ensure_connected(self):
+        # Chỉ thread đầu tiên thực hiện connect, các thread khác chờ ở lock
+        with self._connect_lock:
+            if self.auth_error is not None:
+                raise MQTTAuthError(f"Adafruit IO từ chối đăng nhập ({self.username}): {self.auth_error}")
+            if self._closing.is_set():
+                # Thread connect trước đó thất bại và đã đóng kết nối này trong lúc chờ lock
+                raise ConnectionClosedError(f"Kết nối Adafruit IO ({self.username}) đã bị đóng")
+            if self._started:
+                return
+            self.client.connect()
+            self._thread = threading.Thread(target=self._network_loop, name=f"mqtt-{self.username}", daemon=True)
+            self._thread.start()
+            self._started = True
+            # Chờ CONNACK để báo sai key cho người đăng nhập; broker chậm thì để vòng lặp mạng xử lý tiếp
+            if self._connack.wait(MQTT_CONNECT_TIMEOUT) and self.auth_error is not None:
+                raise MQTTAuthError(f"Adafruit IO từ chối đăng nhập ({self.username}): {self.auth_error}")
+
+    def _network_loop(self):
+        """Vòng lặp mạng của kết nối, tự reconnect với backoff khi mất kết nối."""
+        while not self._closing.is_set():
+            if self._needs_reconnect:
+                delay = self.backoff.next_delay()
+                print(f"Reconnect Adafruit IO ({self.username}) sau {delay:.1f}s (lần {self.backoff.attempt})...")
+                if self._closing.wait(delay):
+                    break
+                try:
+                    self.client.reconnect()
+                    self._needs_reconnect = False
+                    self.reconnects += 1
+                except Exception as e:
+                    print(f"Reconnect thất bại ({self.username}): {e}")
+                continue
+            try:
+                rc = self.client.loop(timeout=1.0)
+            except Exception as e:
+                print(f"Lỗi kết nối Adafruit IO ({self.username}): {e}")
+                rc = paho_mqtt.MQTT_ERR_CONN_LOST
+            if rc != paho_mqtt.MQTT_ERR_SUCCESS and not self._closing.is_set():
+                self._mark_offline()
+                self._needs_reconnect = True
+
+    def _mark_offline(self):
+        if self.online or self.disconnected_at is None:
+            self.disconnected_at = time.time()
+        if self.online:
+            self.online = False
+            self.publisher.set_online(False)
+            hub.notify_connection(self.username, False)
+
+    def connection_lost(self, client, unexpected):
+        self._mark_offline()
+        # Ngắt kết nối chủ động (close) thì không reconnect
+        if unexpected and not self._closing.is_set():
+            self._needs_reconnect = True
+        self.disconnected(self.client)
+
+    def connect_refused(self, client, reason):
+        if reason in AUTH_FAILURE_REASONS:
+            # Sai username/key: dừng reconnect, các lệnh đang chờ báo lỗi thay vì chờ hết TTL
+            self.auth_error = reason
+            self._closing.set()
+            self.publisher.close()
+        self._connack.set()
+
+    def connected(self, client):
+        self._connack.set()
+        with self._lock:
+            feed_ids = list(self._services)
+        reconnected = self.disconnected_at is not None
+        self.backoff.reset()
+        self.online = True
+        print(f"Kết nối thành công đến Adafruit IO ({self.username}), subscribe {len(feed_ids)} feed...")
+        for feed_id in feed_ids:
+            self._subscribe(feed_id)
+            if reconnected:
+                # Yêu cầu Adafruit gửi lại giá trị cuối của feed để thay dữ liệu cũ
+                try:
+                    self.client.receive(feed_id)
+                except Exception as e:
+                    print(f"Lỗi khi lấy lại giá trị {feed_id}: {e}")
+        # Gửi các lệnh được giữ lại trong lúc mất kết nối
+        self.publisher.set_online(True)
+        hub.notify_connection(self.username, True)
+
+    def subscribe_ack(self, client, mid):
+        feed_id = self._pending_subscribes.pop(mid, None)
+        print(f"Subscribe thành công đến {feed_id or mid}...")
+
+    def publish_ack(self, mid):
+        with self._lock:
+            waiter = self._pending_acks.pop(mid, None)
+            if waiter is None:
+                self._acked_mids[mid] = True
+                while len(self._acked_mids) > 1024:
+                    self._acked_mids.popitem(last=False)
+        if waiter is not None:
+            _resolve(*waiter, True)
+
+    def disconnected(self, client):
+        print(f"Ngắt kết nối từ Adafruit IO ({self.username})...")
+
+    def message(self, client, feed_id, payload):
+        MQTT_MESSAGES_RECEIVED.inc(feed_id)
+        for listener in self._listeners:
+            try:
+                listener(self.username, feed_id, payload)
+            except Exception as e:
+                print(f"Lỗi trong listener khi nhận dữ liệu từ {feed_id}: {e}")
+        with self._lock:
+            services = list(self._services.get(feed_id, ()))
+            echoed = []
+            waiters = self._echo_waiters.get(feed_id)
+            if waiters:
+                echoed = [waiter for waiter in waiters if waiter[0] == str(payload)]
+                for waiter in echoed:
+                    waiters.remove(waiter)
+        for value, loop, future in echoed:
+            _resolve(loop, future, True)
+        if not services:
+            print(f"Bỏ qua dữ liệu từ feed chưa đăng ký {feed_id}: {payload}")
+            return
+        for service in services:
+            service.message(client, feed_id, payload)
+
+    def _subscribe(self, feed_id):
+        try:
+            res, mid = self.client.subscribe(feed_id)
+            self._pending_subscribes[mid] = feed_id
+        except Exception as e:
+            print(f"Lỗi khi subscribe {feed_id}: {e}")
+
+    def add(self, service):
+        """Đăng ký feed của service và subscribe nếu kết nối đã sẵn sàng."""
+        with self._lock:
+            services = self._services.setdefault(service.AIO_FEED_ID, [])
+            services.append(service)
+            is_new_feed = len(services) == 1
+        # Nếu chưa kết nối, callback connected sẽ subscribe toàn bộ feed đã đăng ký
+        if is_new_feed and self.client.is_connected():
+            self._subscribe(service.AIO_FEED_ID)
+
+    def remove(self, service):
+        """Hủy đăng ký service, trả về số feed còn lại trên kết nối."""
+        with self._lock:
+            services = self._services.get(service.AIO_FEED_ID, [])
+            if service in services:
+                services.remove(service)
+            # Chỉ unsubscribe khi không còn service nào dùng feed này
+            feed_unused = not services
+            if feed_unused:
+                self._services.pop(service.AIO_FEED_ID, None)
+            remaining = len(self._services)
+        if feed_unused and remaining and self.client.is_connected():
+            try:
+                self.client.unsubscribe(service.AIO_FEED_ID)
+            except Exception as e:
+                print(f"Lỗi khi unsubscribe {service.AIO_FEED_ID}: {e}")
+        return remaining
+
+    async def publish_async(self, feed_id, value, qos=MQTT_PUBLISH_QOS, timeout=MQTT_PUBLISH_TIMEOUT, confirm=False):
+        """
+        Publish không chặn event loop. Trả về PublishResult khi broker ack; nếu `confirm`
+        thì chờ thêm tới khi giá trị quay lại qua subscription (trong cùng `timeout`).
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        ack = loop.create_future()
+        echo = None
+        if confirm:
+            # Đăng ký trước khi publish để không bỏ lỡ echo đến sớm
+            echo = loop.create_future()
+            waiter = (str(value), loop, echo)
+            with self._lock:
+                self._echo_waiters.setdefault(feed_id, []).append(waiter)
+        try:
+            info = self.client.publish(feed_id, value, qos=qos)
+            if info.rc != paho_mqtt.MQTT_ERR_SUCCESS:
+                return PublishResult(False, error=paho_mqtt.error_string(info.rc))
+            with self._lock:
+                if self._acked_mids.pop(info.mid, None) or info.is_published():
+                    ack.set_result(True)
+                else:
+                    self._pending_acks[info.mid] = (loop, ack)
+            try:
+                await asyncio.wait_for(ack, timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self._pending_acks.pop(info.mid, None)
+                return PublishResult(False, error="ack timeout")
+            result = PublishResult(True)
+            if echo is not None:
+                remaining = max(0.0, timeout - (time.perf_counter() - started))
+                try:
+                    await asyncio.wait_for(echo, remaining)
+                    result.confirmed = True
+                except asyncio.TimeoutError:
+                    result.confirmed = False
+            result.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            return result
+        finally:
+            if echo is not None:
+                with self._lock:
+                    waiters = self._echo_waiters.get(feed_id, [])
+                    if waiter in waiters:
+                        waiters.remove(waiter)
+                    if not waiters:
+                        self._echo_waiters.pop(feed_id, None)
+
+    def published(self, feed_id, value):
+        """Cập nhật giá trị mới nhất cho các service của feed sau khi publish qua hàng đợi."""
+        with self._lock:
+            services = list(self._services.get(feed_id, ()))
+        now = time.time()
+        for service in services:
+            service.latest_data = value
+            service.updated_at = now
+        hub.notify(self.username, feed_id, value)
+
+    def close(self):
+        self.publisher.close()
+        self._closing.set()
+        try:
+            self.client.disconnect()
+            if self._thread is not None and self._thread is not threading.current_thread():
+                self._thread.join(timeout=2)
+            print(f"Đã đóng kết nối Adafruit IO ({self.username})")
+        except Exception as e:
+            print(f"Lỗi khi đóng kết nối Adafruit IO ({self.username}): {e}")
+
+
+class MQTTConnectionManager:
+    """Giữ một MQTTConnection cho mỗi cặp (username, key)."""
+
+    connection_class = MQTTConnection  # có thể thay bằng kết nối giả lập (xem Benchmark.stand_ins)
+
+    def __init__(self):
+        self._connections = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Đăng ký hàm listener(username, feed_id, payload) cho mọi message nhận được."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def attach(self, service):
+        conn_key = (service.AIO_USERNAME, service.AIO_KEY)
+        while True:
+            with self._lock:
+                connection = self._connections.get(conn_key)
+                if connection is None:
+                    connection = self.connection_class(*conn_key, listeners=self._listeners)
+                    self._connections[conn_key] = connection
+                connection.add(service)
+            # Connect ngoài lock của manager để không chặn các tài khoản khác
+            try:
+                connection.ensure_connected()
+                return connection
+            except ConnectionClosedError:
+                # Kết nối bị đóng trong lúc chờ: đăng ký lại trên kết nối mới của tài khoản
+                self._release(service, connection)
+            except Exception:
+                self._release(service, connection)
+                raise
+
+    def _release(self, service, connection):
+        """Hủy đăng ký service khỏi `connection`, đóng kết nối khi không còn feed nào."""
+        conn_key = (service.AIO_USERNAME, service.AIO_KEY)
+        with self._lock:
+            remaining = connection.remove(service)
+            # Chỉ bỏ khỏi manager nếu đây vẫn là kết nối hiện tại của tài khoản
+            if remaining == 0 and self._connections.get(conn_key) is connection:
+                del self._connections[conn_key]
+        if remaining == 0:
+            connection.close()
+
+    def detach(self, service):
+        connection = service.connection
+        if connection is None:
+            with self._lock:
+                connection = self._connections.get((service.AIO_USERNAME, service.AIO_KEY))
+        if connection is not None:
+            self._release(service, connection)
+
+    def close_all(self):
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+
+    def connection_count(self):
+        with self._lock:
+            return len(self._connections)
+
+    def publish_stats(self):
+        """Độ sâu hàng đợi và số lệnh đã gộp/bị bỏ của từng tài khoản."""
+        with self._lock:
+            connections = list(self._connections.values())
+        return {connection.username: connection.publisher.stats() for connection in connections}
+
+
+# Manager global, dùng chung cho toàn bộ ứng dụng
+connection_manager = MQTTConnectionManager()
+
+
 class MQTTService:
     def __init__(self, feed_id, initial_status, username=os.getenv("ADAFRUIT_USERNAME"), key=os.getenv("ADAFRUIT_KEY")):
         self.AIO_FEED_ID = feed_id
@@ -13,54 +513,52 @@ class MQTTService:
         self.AIO_KEY = key
         # self.AIO_KEY = "aio_eaue76HZurAww7Kso1LWJUbRs8Q8"
         self.latest_data = initial_status  # Sử dụng giá trị từ Adafruit
+        self.updated_at = time.time()  # thời điểm nhận giá trị gần nhất
+        self.connection = None
         self.setup_client()
 
-    def connected(self, client):
-        print(f"Kết nối thành công đến {self.AIO_FEED_ID}...")
-        client.subscribe(self.AIO_FEED_ID)
-
-    def subscribe(self, client, userdata, mid, granted_qos):
-        print(f"Subscribe thành công đến {self.AIO_FEED_ID}...")
-
-    def disconnected(self, client):
-        print(f"Ngắt kết nối từ {self.AIO_FEED_ID}...")
-        # Không gọi sys.exit(1) để tránh tắt toàn bộ ứng dụng
-        # sys.exit(1)
+    @property
+    def client(self):
+        return self.connection.client
 
     def message(self, client, feed_id, payload):
         print(f"Nhận dữ liệu từ {feed_id}: {payload}")
         self.latest_data = payload
+        self.updated_at = time.time()
+        hub.notify(self.AIO_USERNAME, feed_id, payload)
 
     def get_latest_data(self):
         return self.latest_data
 
-    def publish_data(self, value):
-        try:
-            self.client.publish(self.AIO_FEED_ID, value)
-            self.latest_data = value
-            print(f"Đã publish {value} đến {self.AIO_FEED_ID}")
+    def is_stale(self):
+        """Giá trị cũ nếu đang mất kết nối hoặc chưa được cập nhật lại sau lần mất kết nối gần nhất."""
+        connection = self.connection
+        if connection is None or not connection.online:
             return True
-        except Exception as e:
-            print(f"Lỗi khi publish đến {self.AIO_FEED_ID}: {e}")
-            return False
+        return connection.disconnected_at is not None and self.updated_at < connection.disconnected_at
+
+    def data_status(self):
+        return {"updated_at": self.updated_at, "stale": self.is_stale()}
+
+    async def submit(self, value, confirm=False) -> PublishResult:
+        """
+        Publish qua hàng đợi của tài khoản; các lệnh dồn dập chỉ gửi giá trị cuối cùng.
+        `latest_data` chỉ được cập nhật sau khi broker ack.
+        """
+        if self.connection.auth_error is not None:
+            return PublishResult(False, error=f"authorization failed: {self.connection.auth_error}")
+        return await self.connection.publisher.submit(self.AIO_FEED_ID, value, confirm=confirm)
 
     def setup_client(self):
-        self.client = MQTTClient(self.AIO_USERNAME, self.AIO_KEY)
-        self.client.on_connect = self.connected
-        self.client.on_disconnect = self.disconnected
-        self.client.on_message = self.message
-        self.client.on_subscribe = self.subscribe
-        self.client.connect()
-        self.client.loop_background()
+        # Dùng chung kết nối MQTT của tài khoản thay vì mở client riêng cho mỗi feed
+        self.connection = connection_manager.attach(self)
 
     def disconnect(self):
         try:
-            self.client.disconnect()
+            connection_manager.detach(self)
             print(f"Đã ngắt kết nối từ {self.AIO_FEED_ID}")
         except Exception as e:
             print(f"Lỗi khi ngắt kết nối từ {self.AIO_FEED_ID}: {e}")
 
 # Tạo instance global
 # mqtt_service = MQTTService("bbc-led")
-
-
@@ -0,0 +1,273 @@
+import asyncio
+import os
+import time
+from collections import deque
+from metrics import MQTT_MESSAGES_PUBLISHED, MQTT_PUBLISH_FAILURES, publish_failure_reason
+
+# Adafruit IO (gói free) cho phép khoảng 30 data point/phút cho mỗi tài khoản; 0 = không giới hạn
+ADAFRUIT_PUBLISH_RATE = float(os.getenv("ADAFRUIT_PUBLISH_RATE", "0.5"))  # lệnh/giây
+ADAFRUIT_PUBLISH_BURST = int(os.getenv("ADAFRUIT_PUBLISH_BURST", "10"))
+# Số feed tối đa giữ lệnh khi mất kết nối và thời gian sống của một lệnh chờ gửi
+OFFLINE_BUFFER_SIZE = int(os.getenv("MQTT_OFFLINE_BUFFER_SIZE", "100"))
+OFFLINE_COMMAND_TTL = float(os.getenv("MQTT_OFFLINE_COMMAND_TTL", "300"))
+
+
+class PublishResult:
+    """
+    Kết quả một lần publish. `acked`: broker đã nhận (PUBACK với QoS 1, đã gửi lên socket với QoS 0).
+    `confirmed`: giá trị đã quay lại qua subscription (None nếu không yêu cầu xác nhận).
+    `queued`: mất kết nối, lệnh được giữ lại và sẽ gửi khi kết nối khôi phục.
+    """
+
+    def __init__(self, acked: bool, confirmed=None, latency_ms=None, error=None, queued=False):
+        self.acked = acked
+        self.confirmed = confirmed
+        self.queued = queued
+        self.latency_ms = latency_ms
+        self.error = error
+
+    def to_dict(self):
+        return {
+            "acked": self.acked,
+            "confirmed": self.confirmed,
+            "queued": self.queued,
+            "latency_ms": self.latency_ms,
+            "error": self.error,
+        }
+
+
+class TokenBucket:
+    """Token bucket giới hạn tốc độ publish: `rate` token/giây, tối đa `capacity` token (rate 0: không giới hạn)."""
+
+    def __init__(self, rate: float = ADAFRUIT_PUBLISH_RATE, capacity: int = ADAFRUIT_PUBLISH_BURST):
+        if rate < 0:
+            raise ValueError(f"Publish rate must be >= 0, got {rate}")
+        if capacity < 1:
+            raise ValueError(f"Publish burst must be >= 1, got {capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.rate == 0:
+            return
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def refund(self):
+        """Trả lại token đã lấy nhưng không dùng."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class PendingCommand:
+    """Lệnh đang chờ publish của một feed (đã gộp các lệnh đến sau)."""
+
+    __slots__ = ("value", "future", "count", "confirm", "queued_at")
+
+    def __init__(self, value, future, confirm: bool):
+        self.value = value
+        self.future = future
+        self.count = 1
+        self.confirm = confirm
+        self.queued_at = time.monotonic()
+
+    def resolve(self, result):
+        if not self.future.done():
+            self.future.set_result(result)
+
+
+class FeedPublisher:
+    """
+    Hàng đợi publish của một tài khoản Adafruit, chạy trên event loop.
+
+    Mỗi feed có tối đa một lệnh đang chờ: lệnh mới cho cùng feed thay giá trị cũ
+    (coalesce) nên chỉ giá trị mới nhất được gửi. Các feed được gửi theo thứ tự
+    lệnh đầu tiên và mọi lần gửi đều đi qua token bucket của tài khoản.
+
+    Khi mất kết nối, lệnh được giữ lại (tối đa `max_offline` feed, mỗi lệnh sống
+    `offline_ttl` giây) và được gửi khi kết nối khôi phục.
+    """
+
+    def __init__(
+        self,
+        publish,
+        on_published=None,
+        bucket: TokenBucket = None,
+        max_offline: int = OFFLINE_BUFFER_SIZE,
+        offline_ttl: float = OFFLINE_COMMAND_TTL,
+    ):
+        self._publish = publish  # coroutine publish(feed_id, value, confirm) -> PublishResult
+        self._on_published = on_published
+        self.bucket = bucket or TokenBucket()
+        self.max_offline = max_offline
+        self.offline_ttl = offline_ttl
+        self._pending = {}  # feed_id -> PendingCommand
+        self._order = deque()
+        self._inflight = None  # lệnh đang được publish
+        self._online_flag = False
+        self._online = None
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self.submitted = 0
+        self.published = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.expired = 0
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._online = asyncio.Event()
+            if self._online_flag:
+                self._online.set()
+            self._task = self._loop.create_task(self._run())
+
+    @property
+    def online(self) -> bool:
+        return self._online_flag
+
+    def set_online(self, online: bool):
+        """Cập nhật trạng thái kết nối; gọi được từ thread MQTT."""
+        self._online_flag = online
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._apply_online)
+        except RuntimeError:
+            pass
+
+    def _apply_online(self):
+        if self._online is None:
+            return
+        if self._online_flag:
+            self._online.set()
+        else:
+            self._online.clear()
+
+    def _drop_oldest(self):
+        feed_id = self._order.popleft()
+        command = self._pending.pop(feed_id)
+        self.dropped += command.count
+        MQTT_PUBLISH_FAILURES.inc(feed_id, "offline buffer full", amount=command.count)
+        command.resolve(PublishResult(False, error="offline buffer full"))
+
+    async def submit(self, feed_id: str, value, confirm: bool = False) -> PublishResult:
+        """
+        Đưa giá trị vào hàng đợi, trả về kết quả publish của giá trị này (hoặc giá trị
+        mới hơn đã thay nó). Khi mất kết nối trả về ngay với `queued=True`.
+        """
+        self._ensure_started()
+        self.submitted += 1
+        command = self._pending.get(feed_id)
+        if command is not None:
+            command.value = value
+            command.count += 1
+            command.confirm = command.confirm or confirm
+            self.coalesced += 1
+        else:
+            if not self._online_flag and len(self._pending) >= self.max_offline:
+                self._drop_oldest()
+            command = self._pending[feed_id] = PendingCommand(value, self._loop.create_future(), confirm)
+            self._order.append(feed_id)
+            self._wakeup.set()
+        if not self._online_flag:
+            return PublishResult(False, queued=True, error="offline")
+        # shield: một request bị hủy không làm hủy lệnh chung của các request khác
+        return await asyncio.shield(command.future)
+
+    async def _run(self):
+        while True:
+            if not self._order:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._online.wait()
+            await self.bucket.acquire()
+            if not self._online_flag:
+                # Mất kết nối trong lúc chờ token: giữ lệnh trong hàng đợi tới khi kết nối lại
+                self.bucket.refund()
+                self._online.clear()
+                continue
+            if not self._order:
+                self.bucket.refund()
+                continue  # lệnh bị bỏ trong lúc chờ
+            feed_id = self._order.popleft()
+            # Lấy giá trị sau khi có token để các lệnh đến trong lúc chờ được gộp vào
+            command = self._inflight = self._pending.pop(feed_id)
+            if time.monotonic() - command.queued_at > self.offline_ttl:
+                # Lệnh đã quá cũ (ví dụ chờ reconnect quá lâu), không gửi nữa
+                self.expired += command.count
+                MQTT_PUBLISH_FAILURES.inc(feed_id, "expired", amount=command.count)
+                self._inflight = None
+                command.resolve(PublishResult(False, error="expired"))
+                continue
+            try:
+                result = await self._publish(feed_id, command.value, confirm=command.confirm)
+            except Exception as e:
+                print(f"Lỗi khi publish đến {feed_id}: {e}")
+                result = PublishResult(False, error=str(e))
+            if result.acked:
+                self.published += 1
+                MQTT_MESSAGES_PUBLISHED.inc(feed_id)
+                if self._on_published is not None:
+                    self._on_published(feed_id, command.value)
+            else:
+                self.dropped += command.count
+                MQTT_PUBLISH_FAILURES.inc(feed_id, publish_failure_reason(result.error), amount=command.count)
+            self._inflight = None
+            command.resolve(result)
+
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        return {
+            "online": self._online_flag,
+            "queue_depth": self.queue_depth(),
+            "submitted": self.submitted,
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "expired": self.expired,
+            "tokens": round(self.bucket.tokens, 2),
+        }
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        commands = list(self._pending.values())
+        if self._inflight is not None:
+            commands.append(self._inflight)
+            self._inflight = None
+        for command in commands:
+            self.dropped += command.count
+            command.resolve(PublishResult(False, error="publisher closed"))
+        self._pending.clear()
+        self._order.clear()
+
+    def close(self):
+        """Dừng hàng đợi; an toàn khi gọi từ thread khác event loop."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._cancel()
+        else:
+            self._loop.call_soon_threadsafe(self._cancel)
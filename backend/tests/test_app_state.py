@@ -0,0 +1,61 @@
+from app_state import SessionRegistry, UserSession
+
+
+def test_replace_returns_previous_session_of_the_same_user():
+    registry = SessionRegistry(max_sessions=10)
+    old = UserSession(1, "home-1")
+    registry.replace(old)
+    new = UserSession(1, "home-1")
+    assert registry.replace(new) == [old]
+    assert registry.get(1) is new
+
+
+def test_replace_evicts_least_recently_used_session():
+    registry = SessionRegistry(max_sessions=2)
+    sessions = [UserSession(no, f"home-{no}") for no in (1, 2)]
+    for session in sessions:
+        registry.replace(session)
+    registry.get(1)  # user 2 thành phiên ít dùng nhất
+    assert registry.replace(UserSession(3, "home-3")) == [sessions[1]]
+    assert [session.user_no for session in registry.sessions()] == [1, 3]
+
+
+def test_replace_keeps_sessions_with_open_websockets():
+    registry = SessionRegistry(max_sessions=2)
+    watched, idle = UserSession(1, "home-1"), UserSession(2, "home-2")
+    registry.open_socket(1, object())
+    registry.replace(watched)
+    registry.replace(idle)
+    assert registry.replace(UserSession(3, "home-3")) == [idle]
+    assert registry.get(1) is watched
+
+
+def test_replace_never_evicts_the_new_session():
+    registry = SessionRegistry(max_sessions=1)
+    watched = UserSession(1, "home-1")
+    registry.open_socket(1, object())
+    registry.replace(watched)
+    new = UserSession(2, "home-2")
+    assert registry.replace(new) == [watched]
+    assert registry.sessions() == [new]
+
+
+def test_evict_idle_skips_sessions_with_open_websockets():
+    registry = SessionRegistry(idle_timeout=0, max_sessions=10)
+    watched, idle = UserSession(1, "home-1"), UserSession(2, "home-2")
+    registry.open_socket(1, object())
+    registry.replace(watched)
+    registry.replace(idle)
+    assert registry.evict_idle() == [idle]
+    assert registry.sessions() == [watched]
+
+
+def test_closing_the_last_socket_makes_the_session_evictable():
+    registry = SessionRegistry(idle_timeout=0, max_sessions=10)
+    session, socket = UserSession(1, "home-1"), object()
+    registry.open_socket(1, socket)
+    registry.replace(session)
+    assert registry.evict_idle() == []
+    registry.close_socket(1, socket)
+    assert registry.ws_clients(1) == 0
+    assert registry.evict_idle() == [session]
@@ -0,0 +1,127 @@
+import asyncio
+import os
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from MongoDB.batch_writer import BatchWriter
+
+
+class FlakyCollection:
+    """Collection giả: lỗi kết nối khi `down`, lỗi từng document có "bad" như insert_many(ordered=False)."""
+
+    def __init__(self):
+        self.docs = []
+        self.down = False
+
+    async def insert_many(self, docs, ordered=True):
+        if self.down:
+            raise AutoReconnect("connection refused")
+        errors = []
+        for index, doc in enumerate(docs):
+            if doc.get("bad"):
+                errors.append({"index": index, "code": 121, "errmsg": "Document failed validation"})
+            else:
+                self.docs.append(doc)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+def test_flush_writes_batches_with_insert_many():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"]["user_log"]
+        writer = BatchWriter(collection, max_batch=3)
+        for i in range(5):
+            writer.add({"i": i})
+        assert await writer.flush()
+        assert writer.pending() == 2
+        assert await writer.flush()
+        return writer, await collection.count_documents({})
+
+    writer, count = asyncio.run(scenario())
+    assert count == 5
+    assert writer.written == 5
+
+
+def test_flush_requeues_only_failed_documents():
+    async def scenario():
+        collection = FlakyCollection()
+        writer = BatchWriter(collection, max_batch=10)
+        for i in range(4):
+            writer.add({"i": i, "bad": i == 2})
+        assert not await writer.flush()
+        return collection, writer
+
+    collection, writer = asyncio.run(scenario())
+    assert [doc["i"] for doc in collection.docs] == [0, 1, 3]
+    assert [doc["i"] for doc in writer._buffer] == [2]
+    assert writer.written == 3
+
+
+def test_stop_flushes_remaining_documents():
+    async def scenario():
+        collection = FlakyCollection()
+        writer = BatchWriter(collection, flush_interval=60, max_batch=2)
+        await writer.start()
+        for i in range(5):
+            writer.add({"i": i})
+        await writer.stop()
+        return collection
+
+    assert [doc["i"] for doc in asyncio.run(scenario()).docs] == [0, 1, 2, 3, 4]
+
+
+def test_failed_batches_are_spooled_and_replayed(tmp_path):
+    spool_path = str(tmp_path / "user_log.spool")
+
+    async def scenario():
+        collection = FlakyCollection()
+        collection.down = True
+        writer = BatchWriter(collection, max_batch=2, spool_path=spool_path)
+        for i in range(5):
+            writer.add({"i": i})
+        while writer.pending():
+            assert not await writer.flush()
+        assert writer.spooled == 5
+
+        collection.down = False
+        assert await writer.replay_spool()
+        return collection, writer
+
+    collection, writer = asyncio.run(scenario())
+    assert [doc["i"] for doc in collection.docs] == [0, 1, 2, 3, 4]
+    assert writer.written == 5
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_replay_keeps_unwritten_documents(tmp_path):
+    spool_path = str(tmp_path / "user_log.spool")
+
+    async def scenario():
+        collection = FlakyCollection()
+        collection.down = True
+        writer = BatchWriter(collection, max_batch=3, spool_path=spool_path)
+        for i in range(6):
+            writer.add({"i": i, "bad": i == 1})
+        while writer.pending():
+            await writer.flush()
+
+        collection.down = False
+        assert not await writer.replay_spool()
+        with open(spool_path + ".replay", encoding="utf-8") as f:
+            kept = f.read().splitlines()
+        return collection, writer, kept
+
+    collection, writer, kept = asyncio.run(scenario())
+    # Batch đầu chỉ lỗi document 1: phần còn lại đã ghi, không ghi lại lần nữa
+    assert [doc["i"] for doc in collection.docs] == [0, 2]
+    assert len(kept) == 4
+    assert writer.written == 2
+
+
+def test_spool_path_must_be_a_regular_file(tmp_path):
+    with pytest.raises(ValueError):
+        BatchWriter(FlakyCollection(), spool_path=os.devnull)
+    with pytest.raises(ValueError):
+        BatchWriter(FlakyCollection(), spool_path=str(tmp_path))
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app_state import UserSession
+from Speech.intents import parse_intent
+
+
+@pytest.fixture
+def session():
+    session = UserSession(1, "home-1")
+    session.led_devices = {
+        "dadn-led-1": SimpleNamespace(description="Phòng khách"),
+        "dadn-led-2": SimpleNamespace(description="Phòng ngủ"),
+        "dadn-led-3": SimpleNamespace(description="Nhà bếp"),
+    }
+    session.fan_devices = {
+        "dadn-fan-1": SimpleNamespace(description="Quạt trần"),
+        "dadn-fan-2": SimpleNamespace(description="Quạt đứng"),
+    }
+    return session
+
+
+@pytest.mark.parametrize("text, action, device_ids", [
+    ("Bật đèn", "on", ["dadn-led-1", "dadn-led-2", "dadn-led-3"]),
+    ("tắt tất cả đèn", "off", ["dadn-led-1", "dadn-led-2", "dadn-led-3"]),
+    ("bật đèn 1 và 2", "on", ["dadn-led-1", "dadn-led-2"]),
+    ("tắt đèn phòng ngủ", "off", ["dadn-led-2"]),
+    ("mở nhà bếp", "on", ["dadn-led-3"]),
+])
+def test_parse_led_intents(session, text, action, device_ids):
+    intent = parse_intent(text, session)
+    assert (intent.device_type, intent.action, intent.device_ids) == ("led", action, device_ids)
+
+
+@pytest.mark.parametrize("text, action, value", [
+    ("bật quạt", "on", None),
+    ("Tắt quạt", "off", None),
+    ("tăng quạt", "increase", None),
+    ("giảm quạt", "decrease", None),
+    ("quạt 70 phần trăm", "set", 70),
+])
+def test_parse_fan_intents(session, text, action, value):
+    intent = parse_intent(text, session)
+    assert (intent.device_type, intent.action, intent.value) == ("fan", action, value)
+    assert intent.device_ids == ["dadn-fan-1", "dadn-fan-2"]
+
+
+def test_parse_fan_intent_by_description(session):
+    intent = parse_intent("tắt quạt trần", session)
+    assert intent.device_ids == ["dadn-fan-1"]
+
+
+@pytest.mark.parametrize("text", ["mở cửa", "hôm nay trời đẹp", "đèn"])
+def test_parse_intent_returns_none_for_unknown_commands(session, text):
+    assert parse_intent(text, session) is None
+
+
+@pytest.fixture
+def numbered_session():
+    session = UserSession(1, "home-1")
+    session.fan_devices = {
+        "dadn-fan-1": SimpleNamespace(description="Quạt 1"),
+        "dadn-fan-2": SimpleNamespace(description="Quạt 2"),
+    }
+    return session
+
+
+@pytest.mark.parametrize("text, action, value, device_ids", [
+    ("bật quạt 2", "on", None, ["dadn-fan-2"]),
+    ("bật quạt 1", "on", None, ["dadn-fan-1"]),
+    ("tắt quạt 1 và 2", "off", None, ["dadn-fan-1", "dadn-fan-2"]),
+    ("quạt 2 mức 40", "set", 40, ["dadn-fan-2"]),
+    ("chỉnh quạt 1 lên 30%", "set", 30, ["dadn-fan-1"]),
+    ("quạt 60 phần trăm", "set", 60, ["dadn-fan-1", "dadn-fan-2"]),
+])
+def test_parse_numbered_fans(numbered_session, text, action, value, device_ids):
+    intent = parse_intent(text, numbered_session)
+    assert (intent.action, intent.value, intent.device_ids) == (action, value, device_ids)
+
+
+def test_fan_number_maps_to_feed_without_numbered_description(session):
+    intent = parse_intent("bật quạt 2", session)
+    assert (intent.action, intent.value, intent.device_ids) == ("on", None, ["dadn-fan-2"])
+
+
+def test_number_without_level_word_is_not_a_fan_level(session):
+    assert parse_intent("quạt 50", session) is None
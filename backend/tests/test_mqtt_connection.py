@@ -0,0 +1,100 @@
+import random
+import time
+
+import paho.mqtt.client as paho_mqtt
+import pytest
+
+import mqtt_service
+from mqtt_service import MQTTAuthError, MQTTConnection, MQTTConnectionManager, ReconnectBackoff
+
+
+class RefusingClient:
+    """Client giả: broker trả CONNACK lỗi `reason` cho mỗi lần connect/reconnect."""
+
+    def __init__(self, reason):
+        self.reason = reason
+        self.connects = 0
+        self.on_connect_refused = None
+
+    def connect(self):
+        self.connects += 1
+        self.on_connect_refused(self, self.reason)
+
+    reconnect = connect
+
+    def loop(self, timeout=1.0):
+        time.sleep(0.001)
+        return paho_mqtt.MQTT_ERR_CONN_REFUSED
+
+    def is_connected(self):
+        return False
+
+    def disconnect(self):
+        pass
+
+
+class Service:
+    def __init__(self, feed_id, username="user", key="bad-key"):
+        self.AIO_FEED_ID = feed_id
+        self.AIO_USERNAME = username
+        self.AIO_KEY = key
+
+
+def refusing_manager(reason, monkeypatch):
+    monkeypatch.setattr(mqtt_service, "MQTT_RECONNECT_MIN", 0.001)
+    clients = []
+
+    class RefusingConnection(MQTTConnection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.backoff = ReconnectBackoff(base=0.001, cap=0.001)
+            self.client = RefusingClient(reason)
+            self.client.on_connect_refused = self.connect_refused
+            clients.append(self.client)
+
+    manager = MQTTConnectionManager()
+    manager.connection_class = RefusingConnection
+    return manager, clients
+
+
+def test_backoff_doubles_up_to_cap_with_equal_jitter():
+    random.seed(1)
+    backoff = ReconnectBackoff(base=1, cap=8)
+    for expected in (1, 2, 4, 8, 8):
+        delay = backoff.next_delay()
+        assert expected / 2 <= delay <= expected
+    assert backoff.attempt == 5
+    backoff.reset()
+    assert backoff.next_delay() <= 1
+
+
+def test_bad_credentials_stop_reconnecting_and_fail_attach(monkeypatch):
+    manager, clients = refusing_manager("Bad user name or password", monkeypatch)
+    with pytest.raises(MQTTAuthError):
+        manager.attach(Service("dadn-led-1"))
+    time.sleep(0.05)
+    assert clients[0].connects == 1
+    # Kết nối bị từ chối được bỏ khỏi manager, không giữ lại để retry
+    assert manager.connection_count() == 0
+
+
+def test_not_authorized_is_reported_to_later_callers(monkeypatch):
+    manager, clients = refusing_manager("Not authorized", monkeypatch)
+    connection = manager.connection_class("user", "bad-key", listeners=[])
+    with pytest.raises(MQTTAuthError):
+        connection.ensure_connected()
+    with pytest.raises(MQTTAuthError):
+        connection.ensure_connected()
+    assert clients[0].connects == 1
+
+
+def test_other_refusals_keep_retrying_with_backoff(monkeypatch):
+    manager, clients = refusing_manager("Server unavailable", monkeypatch)
+    connection = manager.connection_class("user", "key", listeners=[])
+    connection.ensure_connected()
+    deadline = time.monotonic() + 1
+    while clients[0].connects < 3:
+        assert time.monotonic() < deadline, "không reconnect"
+        time.sleep(0.005)
+    assert connection.auth_error is None
+    connection.close()
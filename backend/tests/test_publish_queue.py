@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+from publish_queue import FeedPublisher, PublishResult, TokenBucket
+
+
+class FakeBroker:
+    """Publish giả: ghi lại các lần gửi, chỉ trả kết quả khi `gate` được mở."""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def publish(self, feed_id, value, confirm=False):
+        self.calls.append((feed_id, value))
+        await self.gate.wait()
+        return PublishResult(True)
+
+
+async def wait_until(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.001)
+
+
+def unlimited_bucket():
+    return TokenBucket(rate=0, capacity=1)
+
+
+def test_token_bucket_allows_burst_then_waits_for_refill():
+    async def scenario():
+        bucket = TokenBucket(rate=20, capacity=2)
+        started = time.monotonic()
+        await bucket.acquire()
+        await bucket.acquire()
+        assert time.monotonic() - started < 0.02
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.04
+
+
+def test_token_bucket_rate_zero_never_blocks():
+    async def scenario():
+        bucket = TokenBucket(rate=0, capacity=1)
+        for _ in range(100):
+            await bucket.acquire()
+
+    asyncio.run(asyncio.wait_for(scenario(), 1))
+
+
+@pytest.mark.parametrize("rate, capacity", [(-1, 10), (1, 0)])
+def test_token_bucket_rejects_invalid_settings(rate, capacity):
+    with pytest.raises(ValueError):
+        TokenBucket(rate=rate, capacity=capacity)
+
+
+def test_token_bucket_refund_is_capped():
+    bucket = TokenBucket(rate=1, capacity=2)
+    bucket.refund()
+    assert bucket.tokens == 2
+    bucket.tokens = 0.5
+    bucket.refund()
+    assert bucket.tokens == 1.5
+
+
+def test_publisher_coalesces_commands_for_the_same_feed():
+    async def scenario():
+        broker = FakeBroker()
+        publisher = FeedPublisher(broker.publish, bucket=unlimited_bucket())
+        publisher.set_online(True)
+        broker.gate.clear()
+        first = asyncio.create_task(publisher.submit("dadn-fan-1", "10"))
+        await wait_until(lambda: broker.calls)
+        # Lệnh đầu đang gửi: các lệnh sau cho cùng feed được gộp, chỉ giá trị cuối được gửi
+        later = [asyncio.create_task(publisher.submit("dadn-fan-1", value)) for value in ("20", "30")]
+        await asyncio.sleep(0)
+        broker.gate.set()
+        results = await asyncio.gather(first, *later)
+        publisher.close()
+        return broker, publisher, results
+
+    broker, publisher, results = asyncio.run(scenario())
+    assert broker.calls == [("dadn-fan-1", "10"), ("dadn-fan-1", "30")]
+    assert all(result.acked for result in results)
+    assert results[1] is results[2]
+    assert publisher.coalesced == 1
+    assert publisher.published == 2
+
+
+def test_publisher_buffers_while_offline_and_drops_oldest_feed():
+    async def scenario():
+        broker = FakeBroker()
+        publisher = FeedPublisher(broker.publish, bucket=unlimited_bucket(), max_offline=2)
+        queued = [await publisher.submit(feed_id, "1") for feed_id in ("dadn-led-1", "dadn-led-2")]
+        dropped = publisher._pending["dadn-led-1"].future
+        await publisher.submit("dadn-led-3", "1")
+        assert broker.calls == []
+        publisher.set_online(True)
+        await wait_until(lambda: len(broker.calls) == 2)
+        publisher.close()
+        return broker, publisher, queued, dropped.result()
+
+    broker, publisher, queued, dropped = asyncio.run(scenario())
+    assert all(result.queued and not result.acked for result in queued)
+    assert dropped.error == "offline buffer full"
+    assert broker.calls == [("dadn-led-2", "1"), ("dadn-led-3", "1")]
+    assert publisher.dropped == 1
+
+
+def test_publisher_expires_commands_older_than_ttl():
+    async def scenario():
+        broker = FakeBroker()
+        publisher = FeedPublisher(broker.publish, bucket=unlimited_bucket(), offline_ttl=0.01)
+        await publisher.submit("dadn-led-1", "1")
+        future = publisher._pending["dadn-led-1"].future
+        await asyncio.sleep(0.03)
+        publisher.set_online(True)
+        result = await asyncio.wait_for(future, 1)
+        publisher.close()
+        return broker, publisher, result
+
+    broker, publisher, result = asyncio.run(scenario())
+    assert result.error == "expired"
+    assert broker.calls == []
+    assert publisher.expired == 1
@@ -0,0 +1,29 @@
+from Device.sensor_history import SensorHistory
+
+
+def test_wraparound_keeps_latest_samples_in_order():
+    history = SensorHistory(capacity=4)
+    for t in range(10):
+        history.append(float(t), t * 10.0)
+    assert len(history) == 4
+    # Mỗi mẫu một bucket: chỉ còn 4 mẫu mới nhất, theo thứ tự thời gian dù đã ghi vòng qua đầu buffer
+    buckets = history.query(0, 10, 10)
+    assert [bucket["avg"] for bucket in buckets] == [60.0, 70.0, 80.0, 90.0]
+
+
+def test_query_after_wraparound_finds_range_start():
+    history = SensorHistory(capacity=5)
+    for t in range(13):
+        history.append(float(t), float(t))
+    # Tìm kiếm nhị phân phải đi qua điểm nối giữa cuối và đầu mảng vật lý
+    buckets = history.query(9, 11, 1)
+    assert buckets == [{"t": 10.0, "min": 9.0, "max": 11.0, "avg": 10.0, "count": 3}]
+    assert history.query(0, 7.5, 4) == []
+
+
+def test_out_of_order_timestamp_is_clamped():
+    history = SensorHistory(capacity=3)
+    history.append(5.0, 1.0)
+    history.append(3.0, 2.0)
+    buckets = history.query(4, 6, 1)
+    assert buckets[0]["count"] == 2
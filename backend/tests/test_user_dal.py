@@ -0,0 +1,110 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from MongoDB.User.user_dal import UserDAL
+
+
+def _dal():
+    db = AsyncMongoMockClient()["test"]
+    return UserDAL(db["user"], db["counters"])
+
+
+async def _create(dal, no=None, email=None):
+    return await dal.create_user(
+        name="User", email=email or f"user{no}@example.com", password="secret",
+        username_adafruit="home", key_adafruit="key", no=no,
+    )
+
+
+def test_counter_starts_after_existing_users():
+    async def scenario():
+        dal = _dal()
+        await _create(dal, no=1)
+        await _create(dal, no=7)
+        await dal.init_counter()
+        # Gọi lại (vd. khởi động lại server) không làm lùi bộ đếm
+        await dal.init_counter()
+        user = await _create(dal, email="new@example.com")
+        return user.no, await dal.get_next_user_no()
+
+    assert asyncio.run(scenario()) == (8, 9)
+
+
+def test_concurrent_registrations_get_distinct_numbers():
+    async def scenario():
+        dal = _dal()
+        await dal.init_counter()
+        return await asyncio.gather(*(dal.get_next_user_no() for _ in range(20)))
+
+    assert sorted(asyncio.run(scenario())) == list(range(1, 21))
+
+
+def test_next_user_no_without_counter_collection():
+    async def scenario():
+        dal = UserDAL(AsyncMongoMockClient()["test"]["user"])
+        first = await dal.get_next_user_no()
+        await _create(dal, no=4)
+        return first, await dal.get_next_user_no()
+
+    assert asyncio.run(scenario()) == (1, 5)
+
+
+def test_update_user_replaces_cached_entries():
+    async def scenario():
+        dal = _dal()
+        await _create(dal, no=1, email="old@example.com")
+        await dal.get_user_by_email("old@example.com")
+        await dal.get_user(1)
+        await dal.update_user(1, {"email": "new@example.com", "key_adafruit": "new-key"})
+        return (
+            await dal.get_user_by_email("old@example.com"),
+            await dal.get_user(1),
+            dal.cache.stats()["misses"],
+        )
+
+    old, user, misses = asyncio.run(scenario())
+    # Email cũ không còn trỏ tới user, bản theo no là bản mới (write-through, không đọc lại DB)
+    assert old is None
+    assert (user.email, user.key_adafruit) == ("new@example.com", "new-key")
+    # Chỉ hai lần đọc email (trước và sau khi đổi) phải vào DB
+    assert misses == 2
+
+
+def test_update_user_drops_entry_cached_by_concurrent_read():
+    class RacingCollection:
+        """Collection mà trong lúc ghi có request khác đọc và cache bản cũ."""
+
+        def __init__(self, collection):
+            self._collection = collection
+            self.dal = None
+
+        def __getattr__(self, name):
+            return getattr(self._collection, name)
+
+        async def find_one_and_update(self, *args, **kwargs):
+            await self.dal.get_user(1)
+            raise RuntimeError("write failed")
+
+    async def scenario():
+        collection = RacingCollection(AsyncMongoMockClient()["test"]["user"])
+        dal = collection.dal = UserDAL(collection)
+        await _create(dal, no=1)
+        try:
+            await dal.update_user(1, {"name": "New"})
+        except RuntimeError:
+            pass
+        return dal.cache.get_by_no(1)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_delete_user_invalidates_cache():
+    async def scenario():
+        dal = _dal()
+        await _create(dal, no=1)
+        await dal.get_user(1)
+        await dal.delete_user(1)
+        return await dal.get_user(1), await dal.get_user_by_email("user1@example.com")
+
+    assert asyncio.run(scenario()) == (None, None)
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from MongoDB.UserLog.user_log_dal import UserLogDAL, decode_cursor, encode_cursor
+
+STARTED = datetime(2025, 1, 1, 8, 0, 0)
+
+
+def test_cursor_round_trip():
+    doc = {"timestamp": STARTED, "_id": "65a1b2c3d4e5f60718293a4b"}
+    assert decode_cursor(encode_cursor(doc)) == (STARTED, doc["_id"])
+
+
+def test_decode_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_build_query_combines_filters_and_cursor():
+    dal = UserLogDAL(collection=None)
+    cursor = encode_cursor({"timestamp": STARTED, "_id": "b"})
+    query = dal.build_query(
+        user_no=1,
+        since=datetime(2025, 1, 1, 9, 0, tzinfo=timezone(timedelta(hours=7))),
+        status="Success",
+        cursor=cursor,
+    )
+    assert query["user_no"] == 1
+    assert query["status"] == "Success"
+    # since có múi giờ được chuyển về UTC không tzinfo như dữ liệu MongoDB trả về
+    assert query["timestamp"] == {"$gte": datetime(2025, 1, 1, 2, 0)}
+    assert query["$or"] == [
+        {"timestamp": {"$lt": STARTED}},
+        {"timestamp": STARTED, "_id": {"$lt": "b"}},
+    ]
+
+
+async def _seed_logs():
+    dal = UserLogDAL(AsyncMongoMockClient()["test"]["user_log"])
+    for i in range(7):
+        # Hai log mỗi timestamp để kiểm tra thứ tự theo _id khi trùng thời gian
+        for user_no in (1, 2):
+            await dal.create_log(
+                user_no=user_no, activity="Bật đèn", status="Success",
+                device_name="dadn-led-1", timestamp=STARTED + timedelta(seconds=i // 2),
+            )
+    return dal
+
+
+async def _all_pages(dal, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        logs, cursor = await dal.find_logs(limit=limit, cursor=cursor, **filters)
+        pages.append(logs)
+        if cursor is None:
+            return pages
+
+
+def test_find_logs_pages_through_cursor_without_gaps():
+    async def scenario():
+        dal = await _seed_logs()
+        pages = await _all_pages(dal, limit=3, user_no=1)
+        expected, _ = await dal.find_logs(limit=100, user_no=1)
+        return pages, expected
+
+    pages, expected = asyncio.run(scenario())
+    assert [len(page) for page in pages] == [3, 3, 1]
+    ids = [log.id for page in pages for log in page]
+    assert ids == [log.id for log in expected]
+    assert len(set(ids)) == 7
+
+
+def test_find_logs_skip_keeps_filters_and_returns_cursor():
+    async def scenario():
+        dal = await _seed_logs()
+        skipped, cursor = await dal.find_logs(limit=2, skip=2, user_no=2)
+        rest, _ = await dal.find_logs(limit=100, user_no=2, cursor=cursor)
+        expected, _ = await dal.find_logs(limit=100, user_no=2)
+        return skipped, rest, expected
+
+    skipped, rest, expected = asyncio.run(scenario())
+    assert all(log.user_no == 2 for log in skipped + rest)
+    assert [log.id for log in skipped + rest] == [log.id for log in expected[2:]]
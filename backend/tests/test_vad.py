@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from Speech.vad import NoSpeechError, speech_bounds, trim_silence
+
+RATE = 16000
+
+
+def tone(seconds, amplitude):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def noise(seconds, amplitude, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, amplitude, int(RATE * seconds)).astype(np.int16)
+
+
+def test_trims_leading_and_trailing_silence_with_padding():
+    samples = np.concatenate([noise(1.0, 30), tone(0.5, 8000), noise(1.0, 30, seed=1)])
+    trimmed, removed_ms = trim_silence(samples, RATE)
+    # Giữ đoạn có tiếng 0.5s cộng padding 200ms mỗi bên (sai số một frame 30ms)
+    assert 0.85 * RATE <= len(trimmed) <= 0.97 * RATE
+    assert removed_ms == pytest.approx((len(samples) - len(trimmed)) * 1000 / RATE)
+    start, end = speech_bounds(samples, RATE)
+    assert start <= RATE <= 1.5 * RATE <= end
+
+
+def test_clip_that_is_all_speech_is_kept():
+    samples = tone(1.0, 8000)
+    trimmed, removed_ms = trim_silence(samples, RATE)
+    assert len(trimmed) == len(samples)
+    assert removed_ms == 0
+
+
+@pytest.mark.parametrize("samples", [
+    np.zeros(RATE, dtype=np.int16),
+    noise(1.0, 30),
+    # Tiếng click ngắn hơn VAD_MIN_SPEECH_MS
+    np.concatenate([noise(0.5, 30), tone(0.05, 8000), noise(0.5, 30)]),
+    np.zeros(10, dtype=np.int16),
+])
+def test_no_speech_raises(samples):
+    with pytest.raises(NoSpeechError):
+        trim_silence(samples, RATE)
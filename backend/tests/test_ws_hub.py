@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+from ws_hub import BroadcastHub
+
+
+def drain(client) -> list:
+    messages = []
+    while not client.queue.empty():
+        messages.append(client.queue.get_nowait())
+    return messages
+
+
+def broadcast(hub, *updates):
+    """Gửi thay đổi qua notify như thread MQTT và chờ event loop xử lý."""
+    async def scenario():
+        hub.bind_loop(asyncio.get_running_loop())
+        for scope, feed_id, value in updates:
+            hub.notify(scope, feed_id, value)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+
+def test_delta_clients_share_one_serialized_message():
+    hub = BroadcastHub()
+    first, second = hub.register("home-1", deltas=True), hub.register("home-1", deltas=True)
+    other = hub.register("home-2", deltas=True)
+    broadcast(hub, ("home-1", "dadn-temp", 30.5))
+    [text] = drain(first)
+    assert json.loads(text) == {"type": "delta", "sensor_values": {"dadn-temp": "30.5"}}
+    assert drain(second)[0] is text
+    assert drain(other) == []
+
+
+def test_unchanged_values_and_unknown_feeds_are_not_sent():
+    hub = BroadcastHub()
+    client = hub.register("home-1", deltas=True)
+    broadcast(hub, ("home-1", "dadn-led-1", 1), ("home-1", "dadn-led-1", 1), ("home-1", "other-feed", 1))
+    assert [json.loads(text) for text in drain(client)] == [{"type": "delta", "led_statuses": {"dadn-led-1": "1"}}]
+
+
+def test_snapshot_clients_get_one_merged_snapshot_request():
+    hub = BroadcastHub()
+    client = hub.register("home-1")
+    broadcast(hub, ("home-1", "dadn-led-1", 1), ("home-1", "dadn-fan-1", 40))
+    assert drain(client) == [None]
+
+
+def test_slow_client_drops_deltas_for_a_snapshot():
+    hub = BroadcastHub(queue_size=2)
+    client = hub.register("home-1", deltas=True)
+    broadcast(hub, *[("home-1", "dadn-temp", value) for value in range(5)])
+    assert drain(client)[0] is None
+    assert client.dropped > 0
+
+
+def test_last_values_are_dropped_with_the_last_client():
+    hub = BroadcastHub()
+    client = hub.register("home-1", deltas=True)
+    broadcast(hub, ("home-1", "dadn-temp", 30))
+    hub.unregister(client)
+    assert hub.client_count() == 0
+    assert hub._last_values == {}
+    # Client mới nhận lại giá trị dù không đổi (snapshot của nó có thể đã cũ hơn)
+    client = hub.register("home-1", deltas=True)
+    broadcast(hub, ("home-1", "dadn-temp", 30))
+    assert len(drain(client)) == 1
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+from adafruit_feeds import feed_kind
+
+logger = logging.getLogger(__name__)
+
+STATUS_KEYS = {
+    "led": "led_statuses",
+    "fan": "fan_statuses",
+    "sensor": "sensor_values",
+}
+
+
+def status_key(feed_id: str):
+    """Trả về khóa nhóm trạng thái trong message WebSocket cho một feed."""
+    return STATUS_KEYS.get(feed_kind(feed_id))
+
+
+class HubClient:
+    """Hàng đợi gửi của một kết nối WebSocket.
+
+    Client `deltas` nhận từng thay đổi; client cũ (app hiện tại thay toàn bộ trạng thái theo
+    mỗi message) nhận lại snapshot đầy đủ mỗi khi có thay đổi.
+    """
+
+    def __init__(self, scope: str, queue_size: int, deltas: bool = False):
+        self.scope = scope
+        self.deltas = deltas
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._snapshot_pending = False
+
+    def offer(self, text: str):
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            # Client chậm: bỏ các delta đang chờ, gửi lại snapshot khi client theo kịp
+            self.dropped += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self._snapshot_pending = False
+            self.request_snapshot()
+
+    def request_snapshot(self):
+        """Yêu cầu gửi lại snapshot; các yêu cầu chưa được gửi gộp thành một."""
+        if self._snapshot_pending:
+            return
+        self._snapshot_pending = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def next_message(self):
+        """Trả về text cần gửi, hoặc None nếu client cần nhận lại snapshot."""
+        text = await self.queue.get()
+        if text is None:
+            self._snapshot_pending = False
+        return text
+
+
+class BroadcastHub:
+    """Nhận thay đổi từ MQTT và phát delta tới các WebSocket client cùng scope.
+
+    Scope là username Adafruit: mọi phiên dùng chung tài khoản thấy cùng feed.
+    """
+
+    def __init__(self, queue_size: int = 64):
+        self._queue_size = queue_size
+        self._clients: dict[str, set[HubClient]] = {}
+        self._last_values: dict[tuple, str] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def register(self, scope: str, deltas: bool = False) -> HubClient:
+        client = HubClient(scope, self._queue_size, deltas)
+        self._clients.setdefault(scope, set()).add(client)
+        return client
+
+    def rescope(self, client: HubClient, scope: str):
+        """Chuyển client sang scope khác (user đăng nhập lại) và gửi lại snapshot của phiên mới."""
+        if client.scope != scope:
+            self.unregister(client)
+            client.scope = scope
+            self._clients.setdefault(scope, set()).add(client)
+        client.request_snapshot()
+
+    def unregister(self, client: HubClient):
+        clients = self._clients.get(client.scope)
+        if clients is None:
+            return
+        clients.discard(client)
+        if not clients:
+            del self._clients[client.scope]
+            # Client sau nhận snapshot từ phiên, không cần giá trị cũ của scope này
+            for key in [key for key in self._last_values if key[0] == client.scope]:
+                del self._last_values[key]
+
+    def client_count(self) -> int:
+        return sum(len(clients) for clients in self._clients.values())
+
+    def queue_depths(self) -> list:
+        """Số message đang chờ gửi của từng client."""
+        return [client.queue.qsize() for clients in self._clients.values() for client in clients]
+
+    def notify(self, scope: str, feed_id: str, value):
+        """Gọi được từ bất kỳ thread nào (kể cả thread MQTT)."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._broadcast, scope, feed_id, str(value))
+
+    def notify_connection(self, scope: str, online: bool):
+        """Báo cho client khi kết nối MQTT của tài khoản mất/khôi phục (dữ liệu có thể đã cũ)."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._broadcast_connection, scope, online)
+
+    def _broadcast_connection(self, scope: str, online: bool):
+        clients = self._clients.get(scope)
+        if not clients:
+            return
+        text = json.dumps({"type": "connection", "online": online})
+        for client in clients:
+            client.offer(text)
+
+    def _broadcast(self, scope: str, feed_id: str, value: str):
+        key = status_key(feed_id)
+        clients = self._clients.get(scope)
+        # Chỉ nhớ giá trị của scope đang có client để bộ nhớ không tăng theo số tài khoản
+        if key is None or not clients or self._last_values.get((scope, feed_id)) == value:
+            return
+        self._last_values[(scope, feed_id)] = value
+        text = None
+        for client in clients:
+            if not client.deltas:
+                client.request_snapshot()
+                continue
+            if text is None:
+                # Serialize một lần cho tất cả client nhận delta
+                text = json.dumps({"type": "delta", key: {feed_id: value}})
+            client.offer(text)
+
+
+hub = BroadcastHub()
@@ -28,6 +28,8 @@ import SummaryCard from "@/components/card/Summary";
 import { Audio } from "expo-av";
 import { MaterialIcons } from "@expo/vector-icons";
 import { handleForAll } from "@/actions/fan/handleVoiceCommand";
+import { withUserNo } from "@/constants/Session";
+import { statusSocketUrl } from "@/constants/StatusSocket";
 import { styles } from "@/styles/fan";
 import { VoiceHint } from "@/components/ui/VoiceHint";
 import FontAwesome6 from "@expo/vector-icons/FontAwesome6";
@@ -157,7 +159,7 @@ export default function FanList() {
 
   // WebSocket connection
   useEffect(() => {
-    const wsUrl = `wss://smartdkdh.onrender.com/ws`;
+    const wsUrl = statusSocketUrl(`wss://smartdkdh.onrender.com/ws`);
     const ws = new WebSocket(wsUrl);
 
     ws.onopen = () => {
@@ -333,7 +335,7 @@ export default function FanList() {
         name: "recording.m4a",
       } as any);
 
-      const url = `${API_BASE_URL}/speech-to-text`;
+      const url = withUserNo(`${API_BASE_URL}/speech-to-text`);
       console.log("Sending to URL:", url);
 
       // Thêm timeout và retry logic
@@ -21,6 +21,8 @@ import { Alert } from "react-native";
 import MaterialIcons from "@expo/vector-icons/MaterialIcons";
 import LottieView from "lottie-react-native";
 import { handleForOne } from "@/actions/fan/handleVoiceCommand";
+import { withUserNo } from "@/constants/Session";
+import { statusSocketUrl } from "@/constants/StatusSocket";
 import { FanNotFound } from "@/components/notFound/fan";
 import { styles } from "@/styles/fan/details";
 import PowerButton from "@/components/ui/PowerButton";
@@ -379,7 +381,7 @@ export default function FanDetails() {
       } as any);
 
       // const url = `http://${serverIp}:8000/speech-to-text`;
-      const url = `${API_BASE_URL}/speech-to-text`;
+      const url = withUserNo(`${API_BASE_URL}/speech-to-text`);
       console.log("Sending to URL:", url);
 
       // Thêm timeout và retry logic
@@ -451,7 +453,7 @@ export default function FanDetails() {
   // WebSocket connection
   useEffect(() => {
     // const wsUrl = `ws://${serverIp}:8000/ws`;
-    const wsUrl = `wss://smartdkdh.onrender.com/ws`;
+    const wsUrl = statusSocketUrl(`wss://smartdkdh.onrender.com/ws`);
     const ws = new WebSocket(wsUrl);
 
     ws.onopen = () => {
@@ -29,6 +29,8 @@ import MaterialIcons from "@expo/vector-icons/MaterialIcons";
 import { VoiceHint } from "@/components/ui/VoiceHint";
 import { styles } from "@/styles/light";
 import { handleForAll } from "@/actions/light/handleVoiceCommand";
+import { withUserNo } from "@/constants/Session";
+import { statusSocketUrl } from "@/constants/StatusSocket";
 import FontAwesome6 from "@expo/vector-icons/FontAwesome6";
 import { ThemedText } from "@/components/ThemedText";
 import { Feather } from "@expo/vector-icons";
@@ -169,7 +171,7 @@ export default function LightList() {
 
   // WebSocket connection
   useEffect(() => {
-    const wsUrl = `wss://smartdkdh.onrender.com/ws`;
+    const wsUrl = statusSocketUrl(`wss://smartdkdh.onrender.com/ws`);
     const ws = new WebSocket(wsUrl);
 
     ws.onopen = () => {
@@ -353,7 +355,7 @@ export default function LightList() {
         name: "recording.m4a",
       } as any);
 
-      const url = `${API_BASE_URL}/speech-to-text`;
+      const url = withUserNo(`${API_BASE_URL}/speech-to-text`);
       console.log("Sending to URL:", url);
 
       // Thêm timeout và retry logic
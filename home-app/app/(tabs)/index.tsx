@@ -26,6 +26,8 @@ import { Feather, Octicons, MaterialIcons } from "@expo/vector-icons";
 import { Info } from "@/components/Info";
 import { Sensor } from "@/components/Sensor";
 import { Devices } from "@/components/Devices";
+import { withUserNo } from "@/constants/Session";
+import { mergeStatuses, statusSocketUrl } from "@/constants/StatusSocket";
 
 import { router } from "expo-router";
 import React from "react";
@@ -148,7 +150,7 @@ export default function HomeScreen() {
 
   // WebSocket connection
   useEffect(() => {
-    const wsUrl = `wss://smartdkdh.onrender.com/ws`;
+    const wsUrl = statusSocketUrl(`wss://smartdkdh.onrender.com/ws`);
     const ws = new WebSocket(wsUrl);
 
     ws.onopen = () => {
@@ -160,10 +162,10 @@ export default function HomeScreen() {
       try {
         const data = JSON.parse(event.data);
         if (data.led_statuses) {
-          setLedStatuses(data.led_statuses);
+          setLedStatuses((prev) => mergeStatuses(prev, data, data.led_statuses));
         }
         if (data.fan_statuses) {
-          setFanStatuses(data.fan_statuses);
+          setFanStatuses((prev) => mergeStatuses(prev, data, data.fan_statuses));
         }
       } catch (error) {
         console.error("Error parsing WebSocket data:", error);
@@ -187,7 +189,7 @@ export default function HomeScreen() {
 
   const fetchLeds = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/led-devices`);
+      const response = await fetch(withUserNo(`${API_BASE_URL}/led-devices`));
 
       if (!response.ok) {
         throw new Error(`LED API error: ${response.status}`);
@@ -218,7 +220,7 @@ export default function HomeScreen() {
 
   const fetchFans = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/fan-devices`);
+      const response = await fetch(withUserNo(`${API_BASE_URL}/fan-devices`));
 
       if (!response.ok) {
         throw new Error(`Fan API error: ${response.status}`);
@@ -18,6 +18,8 @@ import { LineChart } from "react-native-chart-kit";
 import { ActivityLogScreen } from "@/components/ActivityLog";
 import { StatusBar } from "expo-status-bar";
 import { Sensor } from "@/components/Sensor";
+import { withUserNo } from "@/constants/Session";
+import { mergeStatuses, statusSocketUrl } from "@/constants/StatusSocket";
 import { MaterialIcons, Octicons } from "@expo/vector-icons";
 const { width, height } = Dimensions.get("window");
 
@@ -60,7 +62,7 @@ export default function MonitorScreen() {
 
   // WebSocket connection
   useEffect(() => {
-    const wsUrl = `wss://smartdkdh.onrender.com/ws`;
+    const wsUrl = statusSocketUrl(`wss://smartdkdh.onrender.com/ws`);
     const ws = new WebSocket(wsUrl);
 
     ws.onopen = () => {
@@ -72,7 +74,7 @@ export default function MonitorScreen() {
       try {
         const data = JSON.parse(event.data);
         if (data.sensor_values) {
-          setSensorValues(data.sensor_values);
+          setSensorValues((prev) => mergeStatuses(prev, data, data.sensor_values));
 
           // Cập nhật dữ liệu lịch sử cho biểu đồ
           setHistoryData((prevData) => {
@@ -113,7 +115,7 @@ export default function MonitorScreen() {
 
   const fetchDevices = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/sensor-devices`);
+      const response = await fetch(withUserNo(`${API_BASE_URL}/sensor-devices`));
       const data = await response.json();
       const devices = data.devices;
 
@@ -20,6 +20,7 @@ import { ThemedText } from "@/components/ThemedText";
 import { ThemedView } from "@/components/ThemedView";
 import { AvatarInfo } from "@/components/Avatar";
 import { useColorScheme } from "@/hooks/useColorScheme";
+import { setCurrentUserNo } from "@/constants/Session";
 import { SafeAreaView } from "react-native-safe-area-context";
 const { width, height } = Dimensions.get("window");
 import Feather from "@expo/vector-icons/Feather";
@@ -73,6 +74,7 @@ export default function SettingScreen() {
         "user_ada",
         "user_key",
       ]);
+      setCurrentUserNo(null);
 
       router.replace("/login"); // Điều hướng đến layout tabs
     } catch (err: any) {
@@ -11,6 +11,7 @@ import {
 } from "react-native";
 
 import { store } from "@/store";
+import { setCurrentUserNo } from "@/constants/Session";
 import { Provider } from "react-redux";
 
 // Ngăn không cho splash screen tự động ẩn đi
@@ -90,6 +91,7 @@ export default function RootLayout() {
         "user_ada",
         "user_key",
       ]);
+      setCurrentUserNo(null);
       setIsLoggedIn(false);
       router.replace("/login");
     } catch (e) {
@@ -102,6 +104,7 @@ export default function RootLayout() {
       try {
         const userNo = await AsyncStorage.getItem("user_no");
         const hasLoggedIn = userNo !== null;
+        setCurrentUserNo(userNo);
         setIsLoggedIn(hasLoggedIn); // Nếu có user_no thì đã đăng nhập
 
         // Nếu đã đăng nhập, thử kết nối với Adafruit
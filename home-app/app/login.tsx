@@ -20,6 +20,7 @@ import InputUserNameBox from "@/components/InputUserNameBox";
 import InputPasswordBox from "@/components/InputPasswordBox";
 import ButtonAuth from "@/components/ButtonAuth";
 import ButtonLoginGoogle from "@/components/ButtonLoginGoogle";
+import { setCurrentUserNo } from "@/constants/Session";
 const { width, height } = Dimensions.get("window"); 
 
 interface LoadingOverlayProps {
@@ -303,6 +304,7 @@ const LoginScreen: React.FC = () => {
         
         // Lưu user_no, email và password vào AsyncStorage
         await AsyncStorage.setItem("user_no", JSON.stringify(userNo));
+        setCurrentUserNo(userNo);
         await AsyncStorage.setItem("user_name", userData.name);
         await AsyncStorage.setItem("user_ada", userData.username_adafruit);
         await AsyncStorage.setItem("user_key", userData.key_adafruit);
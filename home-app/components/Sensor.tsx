@@ -1,6 +1,8 @@
 import { Feather, Ionicons } from "@expo/vector-icons";
 import { useEffect, useState } from "react";
 import { Text, View, StyleSheet, Dimensions, useColorScheme, Alert } from "react-native";
+import { withUserNo } from "@/constants/Session";
+import { mergeStatuses, statusSocketUrl } from "@/constants/StatusSocket";
 
 const { width, height } = Dimensions.get("window");
 const API_BASE_URL = `https://smartdkdh.onrender.com`;
@@ -33,7 +35,7 @@ export function Sensor() {
       // WebSocket connection
       useEffect(() => {
         // const wsUrl = `ws://${serverIp}:8000/ws`;
-        const wsUrl = `wss://smartdkdh.onrender.com/ws`;
+        const wsUrl = statusSocketUrl(`wss://smartdkdh.onrender.com/ws`);
         const ws = new WebSocket(wsUrl);
     
         ws.onopen = () => {
@@ -46,7 +48,7 @@ export function Sensor() {
             const data = JSON.parse(event.data);
             //console.log("Received sensor data:", data);
             if (data.sensor_values) {
-              setSensorValues(data.sensor_values);
+              setSensorValues((prev) => mergeStatuses(prev, data, data.sensor_values));
     
               // Cập nhật dữ liệu lịch sử cho biểu đồ
               setHistoryData((prevData) => {
@@ -88,7 +90,7 @@ export function Sensor() {
       const fetchDevices = async () => {
         try {
           // const response = await fetch(`http://${serverIp}:8000/sensor-devices`);
-          const response = await fetch(`${API_BASE_URL}/sensor-devices`);
+          const response = await fetch(withUserNo(`${API_BASE_URL}/sensor-devices`));
           const data = await response.json();
           const devices = data.devices;
     
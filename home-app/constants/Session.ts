@@ -0,0 +1,18 @@
+// user_no của người dùng đang đăng nhập, giữ trong bộ nhớ để gắn vào URL gọi backend.
+// Backend chỉ trả về và điều khiển thiết bị của phiên có user_no trùng khớp.
+let currentUserNo: string | null = null;
+
+export const setCurrentUserNo = (userNo: string | number | null) => {
+  currentUserNo = userNo === null ? null : String(userNo).replace(/"/g, "");
+};
+
+export const getCurrentUserNo = () => currentUserNo;
+
+// Thêm query user_no vào URL REST/WebSocket của backend
+export const withUserNo = (url: string) => {
+  if (currentUserNo === null) {
+    return url;
+  }
+  const separator = url.includes("?") ? "&" : "?";
+  return `${url}${separator}user_no=${encodeURIComponent(currentUserNo)}`;
+};
@@ -0,0 +1,13 @@
+import { withUserNo } from "@/constants/Session";
+
+// URL WebSocket trạng thái thiết bị. Với deltas=1, backend gửi snapshot đầy đủ khi kết nối
+// (và khi cần đồng bộ lại), sau đó chỉ gửi các giá trị thay đổi ({ type: "delta", ... }).
+export const statusSocketUrl = (url: string) => withUserNo(`${url}?deltas=1`);
+
+// Gộp một nhóm trạng thái (led_statuses, fan_statuses, sensor_values) của message vào trạng thái hiện có:
+// snapshot thay toàn bộ, delta chỉ cập nhật các feed thay đổi
+export const mergeStatuses = (
+  prev: Record<string, string>,
+  message: { type?: string },
+  values: Record<string, string>
+) => (message.type === "delta" ? { ...prev, ...values } : values);
@@ -1,5 +1,6 @@
 import AsyncStorage from "@react-native-async-storage/async-storage";
 import { createSlice, createAsyncThunk, PayloadAction } from "@reduxjs/toolkit";
+import { withUserNo } from "@/constants/Session";
 
 const apiBaseUrl = "https://smartdkdh.onrender.com";
 
@@ -108,7 +109,7 @@ const logUserActivity = async (
 export const fetchFanDevices = createAsyncThunk(
   "fanDevices/fetchFanDevices",
   async () => {
-    const response = await fetch(`${apiBaseUrl}/fan-devices`);
+    const response = await fetch(withUserNo(`${apiBaseUrl}/fan-devices`));
     const data = await response.json();
     return data.devices as FanDevice[];
   }
@@ -122,7 +123,7 @@ export const toggleFan = createAsyncThunk(
     { rejectWithValue }
   ) => {
     try {
-      const response = await fetch(`${apiBaseUrl}/fan/${id}/${action}`, {
+      const response = await fetch(withUserNo(`${apiBaseUrl}/fan/${id}/${action}`), {
         method: "POST",
       });
 
@@ -181,7 +182,7 @@ export const setFanValue = createAsyncThunk(
   "fanDevices/setFanValue",
   async ({ id, value }: { id: string; value: number }, { rejectWithValue }) => {
     try {
-      const response = await fetch(`${apiBaseUrl}/fan/${id}/${value}`, {
+      const response = await fetch(withUserNo(`${apiBaseUrl}/fan/${id}/${value}`), {
         method: "POST",
       });
 
@@ -1,5 +1,6 @@
 import AsyncStorage from "@react-native-async-storage/async-storage";
 import { createSlice, createAsyncThunk, PayloadAction } from "@reduxjs/toolkit";
+import { withUserNo } from "@/constants/Session";
 
 const apiBaseUrl = 'https://smartdkdh.onrender.com';
 
@@ -113,7 +114,7 @@ const logUserActivity = async (
 export const fetchLedDevices = createAsyncThunk(
   "ledDevices/fetchLedDevices",
   async () => {
-    const response = await fetch(`${apiBaseUrl}/led-devices`);
+    const response = await fetch(withUserNo(`${apiBaseUrl}/led-devices`));
     const data = await response.json();
     return data.devices as LedDevice[];
   }
@@ -130,7 +131,7 @@ export const toggleLed = createAsyncThunk(
     { rejectWithValue }
   ) => {
     try {
-      const response = await fetch(`${apiBaseUrl}/led/${id}/${newStatus}`, {
+      const response = await fetch(withUserNo(`${apiBaseUrl}/led/${id}/${newStatus}`), {
         method: "POST",
         headers: { "Content-Type": "application/json" },
       });
@@ -1,4 +1,5 @@
 import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit';
+import { withUserNo } from '@/constants/Session';
 
 interface SensorValues {
   temperature: string;
@@ -28,7 +29,7 @@ const initialState: SensorState = {
 export const fetchSensorValues = createAsyncThunk(
   'sensors/fetchValues',
   async (apiBaseUrl: string) => {
-    const response = await fetch(`${apiBaseUrl}/sensor-values`);
+    const response = await fetch(withUserNo(`${apiBaseUrl}/sensor-values`));
     const data = await response.json();
     return data.sensor_values;
   }
@@ -1,5 +1,6 @@
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import AsyncStorage from '@react-native-async-storage/async-storage';
+import { setCurrentUserNo } from '@/constants/Session';
 
 interface UserState {
     info: {
@@ -41,6 +42,7 @@ export const fetchUser = createAsyncThunk('user/fetchUser', async (_, { rejectWi
 export const logoutUser = createAsyncThunk('user/logoutUser', async (_, { rejectWithValue }) => {
     try {
         await AsyncStorage.multiRemove(['user_no', 'user_email', 'user_password']);
+        setCurrentUserNo(null);
     } catch (error) {
         return rejectWithValue(error instanceof Error ? error.message : 'Failed to log out user');
     }